@@ -0,0 +1,165 @@
+import math
+from collections import deque
+import numpy as np
+
+
+class RunningStats:
+    """Welford 算法的均值和方差累加器，支持移除最早样本以实现滑动窗口"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x):
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.n -= 1
+        self.mean = (old_mean * (self.n + 1) - x) / self.n
+        self.m2 = max(self.m2 - (x - old_mean) * (x - self.mean), 0.0)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+def _sharpe(mean, std, periods):
+    return mean / std * math.sqrt(periods) if std > 0 else 0.0
+
+
+def _sortino(mean, downside_sq_sum, n, periods):
+    downside = math.sqrt(downside_sq_sum / n) if n else 0.0
+    return mean / downside * math.sqrt(periods) if downside > 0 else 0.0
+
+
+class PerformanceTracker:
+    """逐笔更新的绩效统计，每笔交易 O(1)
+
+    收益率按上一笔后的权益计算；夏普用样本标准差，索提诺用下行偏差
+    sqrt(mean(min(r, 0)^2))；periods_per_year 为1时即为单笔口径。
+    """
+
+    def __init__(self, initial_balance, window=100, periods_per_year=1):
+        self.initial_balance = initial_balance
+        self.window = window
+        self.periods_per_year = periods_per_year
+        self.equity = initial_balance
+        self.peak = initial_balance
+        self.max_drawdown = 0.0
+        self.equity_curve = [initial_balance]
+        self.trades = 0
+        self.wins = 0
+        self.stats = RunningStats()
+        self.downside_sq = 0.0
+        self.rolling = RunningStats()
+        self.rolling_downside_sq = 0.0
+        self._window_returns = deque()
+        self.holding = RunningStats()
+        self.time_in_market = 0.0
+        self.first_entry = None
+        self.last_exit = None
+
+    def update(self, pnl, entry_time=None, exit_time=None):
+        """记录一笔已平仓交易"""
+        ret = pnl / self.equity if self.equity > 0 else 0.0
+        self.equity += pnl
+        self.equity_curve.append(self.equity)
+        self.peak = max(self.peak, self.equity)
+        if self.peak > 0:
+            self.max_drawdown = max(self.max_drawdown, (self.peak - self.equity) / self.peak)
+
+        self.trades += 1
+        self.wins += pnl > 0
+        downside = min(ret, 0.0) ** 2
+        self.stats.add(ret)
+        self.downside_sq += downside
+
+        # 滑动窗口：加入新收益率，超出窗口时移除最早的
+        self._window_returns.append(ret)
+        self.rolling.add(ret)
+        self.rolling_downside_sq += downside
+        if len(self._window_returns) > self.window:
+            old = self._window_returns.popleft()
+            self.rolling.remove(old)
+            self.rolling_downside_sq -= min(old, 0.0) ** 2
+
+        if entry_time is not None and exit_time is not None:
+            self.holding.add(exit_time - entry_time)
+            self.time_in_market += exit_time - entry_time
+            self.first_entry = entry_time if self.first_entry is None else min(self.first_entry, entry_time)
+            self.last_exit = exit_time if self.last_exit is None else max(self.last_exit, exit_time)
+
+    def report(self):
+        periods = self.periods_per_year
+        span = (self.last_exit - self.first_entry) if self.first_entry is not None else 0.0
+        return {
+            'equity': self.equity,
+            'total_return': self.equity / self.initial_balance - 1 if self.initial_balance else 0.0,
+            'max_drawdown': self.max_drawdown,
+            'trades': self.trades,
+            'win_rate': self.wins / self.trades if self.trades else 0.0,
+            'sharpe': _sharpe(self.stats.mean, self.stats.std, periods),
+            'sortino': _sortino(self.stats.mean, self.downside_sq, self.stats.n, periods),
+            'rolling_sharpe': _sharpe(self.rolling.mean, self.rolling.std, periods),
+            'rolling_sortino': _sortino(self.rolling.mean, self.rolling_downside_sq,
+                                        self.rolling.n, periods),
+            'avg_holding_time': self.holding.mean,
+            'exposure': self.time_in_market / span if span > 0 else 0.0
+        }
+
+
+def compute_metrics(pnls, initial_balance, entry_times=None, exit_times=None,
+                    window=100, periods_per_year=1):
+    """批量计算与 PerformanceTracker.report 相同的指标，用于回测"""
+    pnls = np.asarray(pnls, dtype=np.float64)
+    equity = initial_balance + np.concatenate(([0.0], np.cumsum(pnls)))
+    before = equity[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(before > 0, pnls / before, 0.0)
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(peak > 0, (peak - equity) / peak, 0.0)
+
+    n = len(returns)
+    downside_sq = np.minimum(returns, 0.0) ** 2
+    recent = returns[-window:]
+    std = returns.std(ddof=1) if n > 1 else 0.0
+    recent_std = recent.std(ddof=1) if len(recent) > 1 else 0.0
+    mean = returns.mean() if n else 0.0
+    recent_mean = recent.mean() if len(recent) else 0.0
+
+    holding_time = exposure = 0.0
+    if entry_times is not None and exit_times is not None and n:
+        entry_times = np.asarray(entry_times, dtype=np.float64)
+        exit_times = np.asarray(exit_times, dtype=np.float64)
+        durations = exit_times - entry_times
+        holding_time = float(durations.mean())
+        span = exit_times.max() - entry_times.min()
+        exposure = float(durations.sum() / span) if span > 0 else 0.0
+
+    return {
+        'equity': float(equity[-1]),
+        'total_return': float(equity[-1] / initial_balance - 1) if initial_balance else 0.0,
+        'max_drawdown': float(drawdown.max()),
+        'trades': n,
+        'win_rate': float((pnls > 0).mean()) if n else 0.0,
+        'sharpe': _sharpe(float(mean), float(std), periods_per_year),
+        'sortino': _sortino(float(mean), float(downside_sq.sum()), n, periods_per_year),
+        'rolling_sharpe': _sharpe(float(recent_mean), float(recent_std), periods_per_year),
+        'rolling_sortino': _sortino(float(recent_mean), float(downside_sq[-window:].sum()),
+                                    len(recent), periods_per_year),
+        'avg_holding_time': holding_time,
+        'exposure': exposure
+    }
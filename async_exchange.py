@@ -0,0 +1,94 @@
+import asyncio
+import ccxt
+import ccxt.async_support as ccxt_async
+from config import EXCHANGE_CONFIG
+from exchange_interface import build_exchange_config
+from order_executor import RetryPolicy, new_client_order_id, place_order_async
+
+
+class AsyncExchangeInterface:
+    """ExchangeInterface 的异步版本，所有请求共用同一个连接会话并发执行"""
+
+    def __init__(self, exchange_name='okx', simulated=True, proxy=None, use_proxy=True):
+        self.simulated = simulated
+        self.proxy = proxy
+        self.exchange_name = exchange_name
+        self.use_proxy = use_proxy
+        self.retry_policy = RetryPolicy()
+        self.exchange = None
+
+        if exchange_name in EXCHANGE_CONFIG:
+            exchange_class = getattr(ccxt_async, exchange_name)
+            self.exchange = exchange_class(build_exchange_config(exchange_name, proxy, use_proxy))
+            self.exchange.set_sandbox_mode(simulated)
+            if not simulated and use_proxy and proxy:
+                self.configure_proxy(proxy)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def configure_proxy(self, proxy):
+        if proxy.startswith('http'):
+            proxy = proxy.split('//')[1]
+        # 异步版ccxt使用aiohttp，通过aiohttp_proxy设置代理
+        self.exchange.aiohttp_proxy = f'http://{proxy}'
+
+    def set_proxy(self, proxy_settings):
+        self.exchange.proxy = proxy_settings
+
+    async def submit_order(self, symbol, side, amount, price, client_order_id=None):
+        """单次下单请求，不做重试"""
+        params = {'leverage': 1}
+        if client_order_id:
+            params['clientOrderId'] = client_order_id
+        return await self.exchange.create_order(symbol, 'limit', side, amount, price, params=params)
+
+    async def create_order(self, symbol, side, amount, price, client_order_id=None):
+        # 与同步版相同的重试逻辑：退避重试，重试前按客户端订单号确认订单是否已提交
+        return await place_order_async(self, symbol, side, amount, price,
+                                       client_order_id or new_client_order_id(), self.retry_policy)
+
+    async def fetch_order_by_client_id(self, symbol, client_order_id):
+        """按客户端订单号查询订单，不存在时返回None"""
+        try:
+            return await self.exchange.fetch_order(None, symbol, params={'clientOrderId': client_order_id})
+        except ccxt.OrderNotFound:
+            return None
+
+    async def cancel_order_by_client_id(self, symbol, client_order_id):
+        return await self.exchange.cancel_order(None, symbol, params={'clientOrderId': client_order_id})
+
+    async def get_market_data(self, symbol):
+        """并发获取行情和订单簿，耗时只相当于一次往返"""
+        ticker, orderbook = await asyncio.gather(
+            self.exchange.fetch_ticker(symbol),
+            self.exchange.fetch_order_book(symbol)
+        )
+        return {
+            'ticker': ticker,
+            'orderbook': orderbook
+        }
+
+    async def get_market_data_many(self, symbols):
+        """批量获取多个交易对的行情，所有请求同时发出"""
+        results = await asyncio.gather(*(self.get_market_data(symbol) for symbol in symbols))
+        return dict(zip(symbols, results))
+
+    async def get_ohlcv(self, symbol, timeframe='1m', limit=100, since=None):
+        return await self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    async def get_ohlcv_many(self, symbols, timeframe='1m', limit=100):
+        results = await asyncio.gather(*(self.get_ohlcv(symbol, timeframe, limit) for symbol in symbols))
+        return dict(zip(symbols, results))
+
+    async def get_balance(self):
+        balance = await self.exchange.fetch_balance()
+        return balance['USDT']['free']
+
+    async def close(self):
+        """关闭共享的HTTP会话"""
+        if self.exchange is not None:
+            await self.exchange.close()
@@ -0,0 +1,126 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from fund_manager import FundManager
+from analytics import compute_metrics
+from config import TRADE_PARAMS
+
+# 与 TradingStrategy.export_backtest_results 保持一致的CSV列
+BACKTEST_FIELDS = ['timestamp', 'direction', 'size', 'entry_price', 'pnl']
+
+
+def to_ohlcv_array(ohlcv):
+    """把ccxt返回的K线列表转换为 (N, 6) 的float64数组"""
+    data = np.asarray(ohlcv, dtype=np.float64)
+    if data.size == 0:
+        return np.empty((0, 6), dtype=np.float64)
+    return data.reshape(-1, 6)
+
+
+def compute_signals(ohlcv, hold_bars=60, trend_bars=1, liquidation_multiplier=0.02):
+    """向量化计算每笔交易的方向、入场价、出场价和收益率
+
+    每隔 hold_bars 根K线开一次仓，沿用 determine_trend 的规则：
+    收盘价高于 trend_bars 根K线之前的开盘价则做多，否则做空。
+    持仓期间最低/最高价触及爆仓价时按爆仓价出场，否则按到期收盘价出场。
+    """
+    data = to_ohlcv_array(ohlcv)
+    n = len(data)
+    start = max(trend_bars - 1, 0)
+    if n <= start + hold_bars:
+        empty = np.empty(0)
+        return {'index': empty.astype(np.int64), 'timestamp': empty, 'exit_timestamp': empty,
+                'side': empty, 'entry': empty, 'exit': empty, 'returns': empty,
+                'liquidated': empty.astype(bool)}
+
+    entry_idx = np.arange(start, n - hold_bars, hold_bars)
+    opens, highs, lows, closes = data[:, 1], data[:, 2], data[:, 3], data[:, 4]
+
+    entry = closes[entry_idx]
+    side = np.where(entry > opens[entry_idx - start], 1.0, -1.0)
+    liq_price = entry * (1 - side * liquidation_multiplier)
+
+    # 持仓窗口 (i, i + hold_bars] 内的极值
+    window_low = sliding_window_view(lows[1:], hold_bars)[entry_idx].min(axis=1)
+    window_high = sliding_window_view(highs[1:], hold_bars)[entry_idx].max(axis=1)
+    liquidated = np.where(side > 0, window_low <= liq_price, window_high >= liq_price)
+
+    exit_price = np.where(liquidated, liq_price, closes[entry_idx + hold_bars])
+    returns = side * (exit_price / entry - 1)
+
+    return {
+        'index': entry_idx,
+        'timestamp': data[entry_idx, 0] / 1000,
+        'exit_timestamp': data[entry_idx + hold_bars, 0] / 1000,
+        'side': side,
+        'entry': entry,
+        'exit': exit_price,
+        'returns': returns,
+        'liquidated': liquidated
+    }
+
+
+def simulate(returns, fund_manager, risk_percent):
+    """按 FundManager 的仓位和杠杆规则逐笔滚动资金
+
+    仓位依赖上一笔的余额和杠杆，只能顺序计算，这里只做标量运算。
+    返回每笔的仓位、盈亏和平仓后余额。
+    """
+    count = len(returns)
+    sizes = np.zeros(count)
+    pnls = np.zeros(count)
+    balances = np.zeros(count)
+    for i in range(count):
+        if fund_manager.balance <= 0:
+            balances[i:] = fund_manager.balance
+            break
+        size = fund_manager.calculate_position(risk_percent)
+        pnl = size * returns[i]
+        fund_manager.update_balance(pnl)
+        sizes[i] = size
+        pnls[i] = pnl
+        balances[i] = fund_manager.balance
+    return sizes, pnls, balances
+
+
+def summarize(pnls, initial_balance, entry_times=None, exit_times=None):
+    """统计收益率、最大回撤、夏普比率等指标，与实盘的 PerformanceTracker 口径一致"""
+    return compute_metrics(pnls, initial_balance, entry_times, exit_times)
+
+
+class VectorBacktester:
+    """离线回测：用历史K线数组重放 determine_trend 规则和 FundManager 资金管理"""
+
+    def __init__(self, ohlcv, hold_bars=60, trend_bars=1, risk_percent=None,
+                 initial_balance=None, fund_manager=None):
+        self.ohlcv = to_ohlcv_array(ohlcv)
+        self.hold_bars = hold_bars
+        self.trend_bars = trend_bars
+        if fund_manager is None:
+            balance = TRADE_PARAMS['initial_balance'] if initial_balance is None else initial_balance
+            fund_manager = FundManager(balance)
+        self.fund_manager = fund_manager
+        self.risk_percent = fund_manager.risk_percent if risk_percent is None else risk_percent
+        self.initial_balance = fund_manager.balance
+        self.signals = None
+        self.sizes = self.pnls = self.balances = None
+
+    def run(self):
+        """执行回测，返回与 export_backtest_results 相同列的结果列表"""
+        self.signals = compute_signals(self.ohlcv, self.hold_bars, self.trend_bars,
+                                       self.fund_manager.params['liquidation_multiplier'])
+        self.sizes, self.pnls, self.balances = simulate(
+            self.signals['returns'], self.fund_manager, self.risk_percent)
+        return self.to_rows()
+
+    def to_rows(self):
+        directions = np.where(self.signals['side'] > 0, 'long', 'short')
+        return [
+            {'timestamp': ts, 'direction': d, 'size': size, 'entry_price': price, 'pnl': pnl}
+            for ts, d, size, price, pnl in zip(
+                self.signals['timestamp'].tolist(), directions.tolist(), self.sizes.tolist(),
+                self.signals['entry'].tolist(), self.pnls.tolist())
+        ]
+
+    def summary(self):
+        return summarize(self.pnls, self.initial_balance,
+                         self.signals['timestamp'], self.signals['exit_timestamp'])
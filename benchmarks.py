@@ -0,0 +1,288 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from fake_exchange import FakeExchange, generate_ohlcv
+
+# 基准测试套件：全部使用离线替身交易所，结果为JSON，可与上一次结果比较发现性能回退。
+# 吞吐量类指标（*_per_sec）越大越好，延迟类指标（*_ms）越小越好；max_ms 波动大，不参与比较。
+
+
+def _max_rss_kb():
+    """进程峰值内存；resource 只在类 Unix 系统上可用，Windows 返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _latency_summary(samples):
+    samples = np.asarray(samples) * 1000
+    if len(samples) == 0:
+        return {}
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'max_ms': float(samples.max())
+    }
+
+
+def bench_strategy(iterations=2000, latency=0.0, failure_rate=0.0, cached=False):
+    """TradingStrategy.execute_strategy 的吞吐量和单次延迟"""
+    from strategy import TradingStrategy
+    from market_cache import CachedExchange
+    from order_executor import RetryPolicy
+    fake = FakeExchange(generate_ohlcv(iterations + 100), latency=latency,
+                        failure_rate=failure_rate, cursor=99)
+    fake.retry_policy = RetryPolicy(max_retries=3, base_delay=0.0, max_delay=0.0, jitter=0.0)
+    exchange = CachedExchange(fake) if cached else fake
+    with tempfile.TemporaryDirectory() as tmp:
+        strategy = TradingStrategy(exchange, ledger_path=os.path.join(tmp, 'ledger.bin'))
+        # 只开不平，持仓会一直累加；放开杠杆限制，保证每次都走完整的下单路径
+        strategy.risk.limits.update(max_symbol_leverage=float('inf'), max_total_leverage=float('inf'),
+                                    min_liquidation_distance=0.0)
+        samples = []
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fake.advance()
+            t = time.perf_counter()
+            try:
+                strategy.execute_strategy('BTC/USDT')
+            except Exception:
+                errors += 1
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        strategy.trade_history.close()
+        strategy.executor.shutdown()
+    return dict(iterations=iterations, errors=errors, exchange_calls=sum(fake.calls.values()),
+                ops_per_sec=iterations / elapsed, **_latency_summary(samples))
+
+
+def bench_fund_manager(iterations=200000):
+    """FundManager 资金滚动的吞吐量"""
+    from fund_manager import FundManager
+    fund_manager = FundManager(100.0)
+    pnls = np.random.default_rng(0).normal(0, 1, iterations).tolist()
+    start = time.perf_counter()
+    for pnl in pnls:
+        fund_manager.get_trade_params(fund_manager.risk_percent)
+        fund_manager.update_balance(pnl)
+        fund_manager.get_liquidation_price(30000.0, 'long')
+    elapsed = time.perf_counter() - start
+    return {'iterations': iterations, 'ops_per_sec': iterations / elapsed,
+            'final_balance': fund_manager.balance}
+
+
+def bench_plot(frames=30, bars=100):
+    """界面绘图路径：K线缓冲区转 DataFrame、mplfinance 整图重绘和增量绘图"""
+    import mplfinance as mpf
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from chart_renderer import IncrementalCandleChart
+    from ohlcv_buffer import OHLCVBuffer
+    fake = FakeExchange(generate_ohlcv(bars + frames), cursor=bars - 1)
+    buffer = OHLCVBuffer()
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    chart = IncrementalCandleChart(ax)
+    stages = {'dataframe': [], 'mpf_plot': [], 'canvas_draw': [], 'incremental': []}
+    for _ in range(frames):
+        fake.advance()
+        ohlcv = fake.get_ohlcv('BTC/USDT', limit=bars)
+
+        t = time.perf_counter()
+        buffer.update(ohlcv)
+        df = buffer.dataframe()
+        stages['dataframe'].append(time.perf_counter() - t)
+
+        chart.clear()
+        t = time.perf_counter()
+        mpf.plot(df, type='candle', ax=ax, style='charles', volume=chart.volume_ax,
+                 mav=(5, 10), warn_too_much_data=1000)
+        stages['mpf_plot'].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        figure.canvas.draw()
+        stages['canvas_draw'].append(time.perf_counter() - t)
+
+    chart.clear()
+    fake.cursor = bars - 1
+    chart.render(fake.get_ohlcv('BTC/USDT', limit=bars))
+    figure.canvas.draw()
+    for _ in range(frames):
+        fake.advance()
+        t = time.perf_counter()
+        chart.render(fake.get_ohlcv('BTC/USDT', limit=bars))
+        stages['incremental'].append(time.perf_counter() - t)
+
+    result = {'frames': frames, 'bars': bars}
+    for stage, samples in stages.items():
+        result[stage] = dict(per_sec=len(samples) / sum(samples), **_latency_summary(samples))
+    full = np.add(stages['dataframe'], np.add(stages['mpf_plot'], stages['canvas_draw']))
+    result['full_redraw_fps_per_sec'] = len(full) / full.sum()
+    result['incremental_fps_per_sec'] = result['incremental']['per_sec']
+    return result
+
+
+def bench_data_path(steps=2000, bars=100):
+    """DataThread 的数据路径：K线仓库增量同步、读取最近K线、更新指标"""
+    from candle_store import CandleStore
+    from indicators import IndicatorSet
+    fake = FakeExchange(generate_ohlcv(steps + bars), cursor=bars - 1)
+    indicators = IndicatorSet()
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CandleStore(tmp)
+        store.sync(fake, 'BTC/USDT', '1m')
+        for _ in range(steps):
+            fake.advance()
+            t = time.perf_counter()
+            store.sync(fake, 'BTC/USDT', '1m')
+            ohlcv = store.read_array(fake.exchange_name, 'BTC/USDT', '1m', last=bars)
+            indicators.update_ohlcv(ohlcv)
+            samples.append(time.perf_counter() - t)
+        stored = store.count(fake.exchange_name, 'BTC/USDT', '1m')
+    return dict(steps=steps, stored_bars=stored, updates_per_sec=steps / sum(samples),
+                **_latency_summary(samples))
+
+
+def bench_replay(bars=200000):
+    """策略插件回放和离线向量化回测的K线吞吐量"""
+    from strategy_api import EventDispatcher, TrendPlugin
+    from backtest import VectorBacktester
+    ohlcv = generate_ohlcv(bars)
+    start = time.perf_counter()
+    EventDispatcher([TrendPlugin()]).replay('BTC/USDT', ohlcv)
+    plugin_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    VectorBacktester(ohlcv).run()
+    vector_elapsed = time.perf_counter() - start
+    return {'bars': bars, 'plugin_bars_per_sec': bars / plugin_elapsed,
+            'vector_bars_per_sec': bars / vector_elapsed}
+
+
+BENCHMARKS = {
+    'strategy': bench_strategy,
+    'strategy_cached': lambda: bench_strategy(cached=True),
+    'strategy_faulty': lambda: bench_strategy(iterations=500, latency=0.001, failure_rate=0.05),
+    'fund_manager': bench_fund_manager,
+    'plot': bench_plot,
+    'data_path': bench_data_path,
+    'replay': bench_replay,
+}
+
+QUICK = {
+    'strategy': lambda: bench_strategy(200),
+    'strategy_cached': lambda: bench_strategy(200, cached=True),
+    'strategy_faulty': lambda: bench_strategy(100, latency=0.001, failure_rate=0.05),
+    'fund_manager': lambda: bench_fund_manager(20000),
+    'plot': lambda: bench_plot(frames=5),
+    'data_path': lambda: bench_data_path(200),
+    'replay': lambda: bench_replay(20000),
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def _run_one(bench, memory):
+    start = time.perf_counter()
+    result = bench()
+    result['wall_seconds'] = time.perf_counter() - start
+    if memory:
+        tracemalloc.start()
+        bench()
+        result['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def run(names=None, quick=False, memory=True):
+    """运行选中的基准测试
+
+    tracemalloc 会显著拖慢被测代码，所以先计时，再单独跑一遍统计内存峰值。
+    被测代码的打印输出转到 stderr，stdout 只输出JSON结果。
+    """
+    suite = QUICK if quick else BENCHMARKS
+    results = {}
+    with contextlib.redirect_stdout(sys.stderr):
+        for name in names or suite:
+            results[name] = _run_one(suite[name], memory)
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.time(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'quick': quick,
+            'max_rss_kb': _max_rss_kb()
+        },
+        'results': results
+    }
+
+
+def _flatten(result, prefix=''):
+    for key, value in result.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{key}.')
+        elif isinstance(value, (int, float)):
+            yield f'{prefix}{key}', value
+
+
+def compare(current, baseline, tolerance=0.2):
+    """与基线比较，吞吐量下降或延迟上升超过 tolerance 的指标视为回退"""
+    regressions = []
+    for name, result in current['results'].items():
+        base = dict(_flatten(baseline.get('results', {}).get(name, {})))
+        for key, value in _flatten(result):
+            old = base.get(key)
+            if not old:
+                continue
+            change = value / old - 1
+            if key.endswith('per_sec') and change < -tolerance:
+                regressions.append({'metric': f'{name}.{key}', 'baseline': old, 'current': value,
+                                    'change': change})
+            elif key.endswith('_ms') and not key.endswith('max_ms') and change > tolerance:
+                regressions.append({'metric': f'{name}.{key}', 'baseline': old, 'current': value,
+                                    'change': change})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='离线基准测试')
+    parser.add_argument('--only', help='逗号分隔的测试名: ' + ','.join(BENCHMARKS))
+    parser.add_argument('--quick', action='store_true', help='缩小规模，用于快速检查')
+    parser.add_argument('--output', help='结果保存路径（JSON）')
+    parser.add_argument('--baseline', help='基线结果文件，有回退时以非零状态退出')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--no-memory', action='store_true', help='跳过内存统计（省一半时间）')
+    args = parser.parse_args()
+
+    report = run(args.only.split(',') if args.only else None, args.quick, not args.no_memory)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+    if report.get('regressions'):
+        sys.exit(1)
@@ -0,0 +1,227 @@
+import os
+import shutil
+import numpy as np
+import ccxt
+
+# 列式存储：每列一个二进制文件，时间戳为int64毫秒，其余为float64
+# 重写整个序列时先写到新的代目录 gN，再原子替换 CURRENT 指向它；没有 CURRENT 时列文件直接在序列目录下
+CURRENT = 'CURRENT'
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+DTYPES = {'timestamp': np.int64}
+
+
+def timeframe_ms(timeframe):
+    """K线周期对应的毫秒数"""
+    return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+
+class CandleStore:
+    """本地K线仓库，按 (交易所, 交易对, 周期) 分目录保存，读取时使用内存映射
+
+    追加和覆盖最后一根直接写当前代的列文件；补缺口需要重写整个序列时写入新的一代，
+    写完后原子切换，读取方不会看到各列长度不一致的中间状态。
+    """
+
+    def __init__(self, root='data/candles', page_limit=100):
+        self.root = root
+        self.page_limit = page_limit
+
+    def _path(self, exchange, symbol, timeframe):
+        safe_symbol = symbol.replace('/', '-').replace(':', '_')
+        return os.path.join(self.root, exchange, safe_symbol, timeframe)
+
+    def _column_file(self, directory, column):
+        return os.path.join(directory, f'{column}.bin')
+
+    def _generation(self, path):
+        """当前代的数据目录"""
+        try:
+            with open(os.path.join(path, CURRENT)) as f:
+                return os.path.join(path, f.read().strip())
+        except FileNotFoundError:
+            return path
+
+    def _dtype(self, column):
+        return np.dtype(DTYPES.get(column, np.float64))
+
+    def count(self, exchange, symbol, timeframe):
+        """已存储的K线数量，各列长度不一致时以最短列为准（写入中途崩溃）"""
+        path = self._generation(self._path(exchange, symbol, timeframe))
+        sizes = []
+        for column in COLUMNS:
+            file = self._column_file(path, column)
+            size = os.path.getsize(file) if os.path.exists(file) else 0
+            sizes.append(size // self._dtype(column).itemsize)
+        return min(sizes)
+
+    def read(self, exchange, symbol, timeframe):
+        """返回各列的只读内存映射数组，不会把整段历史加载到内存"""
+        path = self._generation(self._path(exchange, symbol, timeframe))
+        n = self.count(exchange, symbol, timeframe)
+        columns = {}
+        for column in COLUMNS:
+            dtype = self._dtype(column)
+            if n == 0:
+                columns[column] = np.empty(0, dtype=dtype)
+            else:
+                columns[column] = np.memmap(self._column_file(path, column), dtype=dtype,
+                                            mode='r', shape=(n,))
+        return columns
+
+    def read_array(self, exchange, symbol, timeframe, last=None):
+        """以 (N, 6) 数组返回K线，与 get_ohlcv 的行格式一致"""
+        columns = self.read(exchange, symbol, timeframe)
+        start = 0 if last is None else max(len(columns['timestamp']) - last, 0)
+        return np.column_stack([columns[c][start:].astype(np.float64) for c in COLUMNS])
+
+    def last_timestamp(self, exchange, symbol, timeframe):
+        timestamps = self.read(exchange, symbol, timeframe)['timestamp']
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def write(self, exchange, symbol, timeframe, ohlcv):
+        """合并写入K线，返回新增的K线数量
+
+        新K线直接追加；与最后一根时间戳相同的覆盖最后一根（未收盘K线）；
+        比最后一根更早的K线只在补缺口时出现，此时重写整个序列。
+        """
+        rows = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(rows) == 0:
+            return 0
+        rows = rows[np.argsort(rows[:, 0], kind='stable')]
+        path = self._path(exchange, symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+
+        stored = self.read(exchange, symbol, timeframe)
+        n = len(stored['timestamp'])
+        last = int(stored['timestamp'][-1]) if n else None
+        incoming_ts = rows[:, 0].astype(np.int64)
+
+        if last is not None and incoming_ts[0] < last:
+            pos = np.searchsorted(stored['timestamp'], incoming_ts)
+            found = (pos < n) & (stored['timestamp'][np.minimum(pos, n - 1)] == incoming_ts)
+            if not found.all():
+                return self._rewrite(path, stored, rows)
+
+        if last is not None:
+            current = rows[incoming_ts == last]
+            if len(current):
+                self._overwrite_last(path, n, current[-1])
+            rows = rows[incoming_ts > last]
+
+        # 同一批数据中可能有重复时间戳，保留最后一条
+        _, keep = np.unique(rows[::-1, 0], return_index=True)
+        rows = rows[::-1][keep]
+        self._append(path, rows, n)
+        return len(rows)
+
+    def _append(self, path, rows, n):
+        path = self._generation(path)
+        for i, column in enumerate(COLUMNS):
+            file = self._column_file(path, column)
+            dtype = self._dtype(column)
+            with open(file, 'ab') as f:
+                # 截掉崩溃残留的多余数据，保证各列对齐
+                f.truncate(n * dtype.itemsize)
+                f.write(rows[:, i].astype(dtype).tobytes())
+
+    def _overwrite_last(self, path, n, row):
+        path = self._generation(path)
+        for i, column in enumerate(COLUMNS):
+            dtype = self._dtype(column)
+            with open(self._column_file(path, column), 'r+b') as f:
+                f.seek((n - 1) * dtype.itemsize)
+                f.write(np.asarray([row[i]]).astype(dtype).tobytes())
+
+    def _rewrite(self, path, stored, rows):
+        old = np.column_stack([stored[c].astype(np.float64) for c in COLUMNS])
+        merged = np.concatenate((old, rows))
+        # 新数据在后，倒序后取第一次出现即保留新数据
+        _, keep = np.unique(merged[::-1, 0], return_index=True)
+        merged = merged[::-1][keep]
+        # 所有列写进新的代目录后，只用一次 rename 切换 CURRENT，崩溃时要么全是旧数据要么全是新数据
+        old_dir = self._generation(path)
+        name = 'g1' if old_dir == path else f'g{int(os.path.basename(old_dir)[1:]) + 1}'
+        new_dir = os.path.join(path, name)
+        os.makedirs(new_dir, exist_ok=True)
+        for i, column in enumerate(COLUMNS):
+            with open(self._column_file(new_dir, column), 'wb') as f:
+                f.write(merged[:, i].astype(self._dtype(column)).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        tmp = os.path.join(path, CURRENT + '.tmp')
+        with open(tmp, 'w') as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(path, CURRENT))
+        self._fsync_dir(path)
+        self._remove_generation(path, old_dir)
+        return len(merged) - len(old)
+
+    def _fsync_dir(self, path):
+        if os.name != 'nt':
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _remove_generation(self, path, old_dir):
+        # 旧代可能还被读取方内存映射着（Windows 上删不掉），删除失败留到下次重写
+        if old_dir != path:
+            shutil.rmtree(old_dir, ignore_errors=True)
+            return
+        for column in COLUMNS:
+            try:
+                os.remove(self._column_file(path, column))
+            except OSError:
+                pass
+
+    def sync(self, exchange_interface, symbol, timeframe, since=None):
+        """增量同步：只拉取最后一根已存K线之后的数据，返回新增数量"""
+        name = exchange_interface.exchange_name
+        last = self.last_timestamp(name, symbol, timeframe)
+        if last is None and since is None:
+            ohlcv = exchange_interface.get_ohlcv(symbol, timeframe, limit=self.page_limit)
+            return self.write(name, symbol, timeframe, ohlcv)
+        start = last if last is not None else since
+        return self._fetch_range(exchange_interface, symbol, timeframe, start, None)
+
+    def backfill(self, exchange_interface, symbol, timeframe, start=None):
+        """分页补齐从 start 开始到现在的历史以及已存数据中的缺口"""
+        name = exchange_interface.exchange_name
+        step = timeframe_ms(timeframe)
+        timestamps = np.asarray(self.read(name, symbol, timeframe)['timestamp'])
+        added = 0
+        if len(timestamps) == 0:
+            if start is None:
+                return self.sync(exchange_interface, symbol, timeframe)
+            return self._fetch_range(exchange_interface, symbol, timeframe, start, None)
+
+        if start is not None and start < timestamps[0]:
+            added += self._fetch_range(exchange_interface, symbol, timeframe,
+                                       start, int(timestamps[0]))
+        gaps = np.nonzero(np.diff(timestamps) > step)[0]
+        for i in gaps:
+            added += self._fetch_range(exchange_interface, symbol, timeframe,
+                                       int(timestamps[i]) + step, int(timestamps[i + 1]))
+        added += self.sync(exchange_interface, symbol, timeframe)
+        return added
+
+    def _fetch_range(self, exchange_interface, symbol, timeframe, since, until):
+        """从 since 开始分页拉取，直到 until（不含）或没有更多数据"""
+        name = exchange_interface.exchange_name
+        added = 0
+        while True:
+            ohlcv = exchange_interface.get_ohlcv(symbol, timeframe, limit=self.page_limit, since=since)
+            if until is not None:
+                ohlcv = [bar for bar in ohlcv if bar[0] < until]
+            if not ohlcv:
+                break
+            added += self.write(name, symbol, timeframe, ohlcv)
+            next_since = int(ohlcv[-1][0]) + 1
+            # 交易所本身缺数据时时间戳不再前进，直接结束
+            if next_since <= since or len(ohlcv) < self.page_limit:
+                break
+            since = next_since
+        return added
@@ -0,0 +1,281 @@
+import time
+import numpy as np
+from matplotlib.collections import PolyCollection, LineCollection
+from matplotlib.ticker import FuncFormatter
+from matplotlib.colors import to_rgba
+
+UP_COLOR = '#26a69a'
+DOWN_COLOR = '#ef5350'
+MA_COLORS = ('#ff9800', '#2196f3', '#9c27b0', '#795548')
+
+
+def _body_verts(x, opens, closes, width):
+    """K线实体的四个顶点，形状 (N, 4, 2)"""
+    left, right = x - width / 2, x + width / 2
+    return np.stack([np.column_stack([left, opens]), np.column_stack([left, closes]),
+                     np.column_stack([right, closes]), np.column_stack([right, opens])], axis=1)
+
+
+def _wick_segments(x, lows, highs):
+    return np.stack([np.column_stack([x, lows]), np.column_stack([x, highs])], axis=1)
+
+
+class IncrementalCandleChart:
+    """增量K线图：图元常驻，最新K线变化时只重绘最后一根（blit），新增K线时才整图重绘
+
+    历史K线和最新K线分成两组图元，最新K线和均线设为 animated，
+    由 blit 在缓存的背景上单独绘制。传入 indicators（indicators.IndicatorSet）时
+    均线直接取其中与策略共用的计算结果，否则通过收盘价累加和增量计算。
+    """
+
+    def __init__(self, ax, ma_periods=(5, 10), volume=True, max_bars=100, width=0.6,
+                 indicators=None):
+        self.ax = ax
+        self.indicators = indicators
+        self.canvas = ax.figure.canvas
+        self.ma_periods = tuple(ma_periods)
+        self.show_volume = volume
+        self.max_bars = max_bars
+        self.width = width
+        self.volume_ax = ax.twinx() if volume else None
+        self.background = None
+        self.full_draws = 0
+        self.blits = 0
+        self._capacity = 0
+        self.n = 0
+        self.data = np.empty((0, 6))
+        self._csum = np.zeros(1)
+        self._create_artists()
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _create_artists(self):
+        ax = self.ax
+        self.bodies = PolyCollection([], linewidths=0.5)
+        self.wicks = LineCollection([], linewidths=0.8)
+        ax.add_collection(self.wicks)
+        ax.add_collection(self.bodies)
+        self.last_body = PolyCollection([], linewidths=0.5, animated=True)
+        self.last_wick = LineCollection([], linewidths=0.8, animated=True)
+        ax.add_collection(self.last_wick)
+        ax.add_collection(self.last_body)
+        self.ma_lines = [ax.plot([], [], lw=1, color=MA_COLORS[i % len(MA_COLORS)],
+                                 label=f'MA{p}', animated=True)[0]
+                         for i, p in enumerate(self.ma_periods)]
+        self.animated = [self.last_wick, self.last_body] + self.ma_lines
+        if self.volume_ax is not None:
+            self.volumes = PolyCollection([], alpha=0.4)
+            self.last_volume = PolyCollection([], alpha=0.4, animated=True)
+            self.volume_ax.add_collection(self.volumes)
+            self.volume_ax.add_collection(self.last_volume)
+            self.volume_ax.set_yticks([])
+            self.animated.insert(0, self.last_volume)
+        ax.xaxis.set_major_formatter(FuncFormatter(self._format_time))
+
+    def _format_time(self, value, pos=None):
+        i = int(round(value))
+        if 0 <= i < self.n:
+            return time.strftime('%H:%M', time.localtime(self.data[i, 0] / 1000))
+        return ''
+
+    def clear(self):
+        """坐标轴被外部清空后调用，下次 render 时重建图元"""
+        self.ax.clear()
+        if self.volume_ax is not None:
+            self.volume_ax.clear()
+        self.n = 0
+        self.background = None
+        self._create_artists()
+
+    # ---------- 数据维护 ----------
+
+    def _reserve(self, n):
+        if n <= self._capacity:
+            return
+        capacity = max(n, self._capacity * 2, 256)
+        data = np.empty((capacity, 6))
+        data[:self.n] = self.data[:self.n]
+        csum = np.zeros(capacity + 1)
+        csum[:self.n + 1] = self._csum[:self.n + 1]
+        self.data, self._csum, self._capacity = data, csum, capacity
+
+    def _set_bar(self, i, bar):
+        self.data[i] = bar
+        self._csum[i + 1] = self._csum[i] + bar[4]
+
+    def moving_average(self, period, start=0):
+        """第 start 根到最后一根K线的均线值，不足周期的位置为 nan"""
+        name = f'sma{period}'
+        if self.indicators is not None and name in self.indicators.values:
+            return self.indicators.lookup(name, self.data[start:self.n, 0])
+        idx = np.arange(start, self.n)
+        values = np.full(len(idx), np.nan)
+        valid = idx >= period - 1
+        i = idx[valid]
+        values[valid] = (self._csum[i + 1] - self._csum[i + 1 - period]) / period
+        return values
+
+    def render(self, ohlcv):
+        """根据新数据决定增量更新或整图重绘，返回 'update'、'append' 或 'reset'"""
+        bars = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(bars) == 0:
+            return None
+        last_ts = self.data[self.n - 1, 0] if self.n else None
+
+        if self.n and bars[-1, 0] == last_ts and (len(bars) < 2 or self.n < 2
+                                                  or bars[-2, 0] == self.data[self.n - 2, 0]):
+            self.update_last(bars[-1])
+            return 'update'
+        if self.n and len(bars) >= 2 and bars[-2, 0] == last_ts:
+            self._set_bar(self.n - 1, bars[-2])
+            self.append(bars[-1])
+            return 'append'
+        self.reset(bars)
+        return 'reset'
+
+    def reset(self, bars):
+        self.n = 0
+        self._reserve(len(bars))
+        self.data[:len(bars)] = bars
+        self._csum[0] = 0
+        self._csum[1:len(bars) + 1] = np.cumsum(bars[:, 4])
+        self.n = len(bars)
+        self.full_redraw()
+
+    def append(self, bar):
+        self._reserve(self.n + 1)
+        self._set_bar(self.n, bar)
+        self.n += 1
+        self.full_redraw()
+
+    def update_last(self, bar):
+        self._set_bar(self.n - 1, bar)
+        low, high = self.ax.get_ylim()
+        if bar[3] < low or bar[2] > high:
+            # 超出当前坐标范围需要重新计算刻度
+            self.full_redraw()
+        else:
+            self._update_last_artists()
+            self.blit()
+
+    # ---------- 绘制 ----------
+
+    def _visible_range(self):
+        start = max(self.n - self.max_bars, 0) if self.max_bars else 0
+        return start, self.n - 1
+
+    def _colors(self, opens, closes):
+        return np.where((closes >= opens)[:, None], np.array([to_rgba(UP_COLOR)]),
+                        np.array([to_rgba(DOWN_COLOR)]))
+
+    def _update_last_artists(self):
+        i = self.n - 1
+        _, o, h, l, c, v = self.data[i]
+        x = np.array([float(i)])
+        color = UP_COLOR if c >= o else DOWN_COLOR
+        self.last_body.set_verts(_body_verts(x, np.array([o]), np.array([c]), self.width))
+        self.last_body.set_facecolor(color)
+        self.last_body.set_edgecolor(color)
+        self.last_wick.set_segments(_wick_segments(x, np.array([l]), np.array([h])))
+        self.last_wick.set_color(color)
+        if self.volume_ax is not None:
+            self.last_volume.set_verts(_body_verts(x, np.zeros(1), np.array([v]), self.width))
+            self.last_volume.set_facecolor(color)
+        start, _ = self._visible_range()
+        xs = np.arange(start, self.n)
+        for period, line in zip(self.ma_periods, self.ma_lines):
+            line.set_data(xs, self.moving_average(period, start))
+
+    def full_redraw(self):
+        start, last = self._visible_range()
+        hist = self.data[start:last]
+        x = np.arange(start, last, dtype=np.float64)
+        colors = self._colors(hist[:, 1], hist[:, 4])
+        self.bodies.set_verts(_body_verts(x, hist[:, 1], hist[:, 4], self.width))
+        self.bodies.set_facecolor(colors)
+        self.bodies.set_edgecolor(colors)
+        self.wicks.set_segments(_wick_segments(x, hist[:, 3], hist[:, 2]))
+        self.wicks.set_color(colors)
+        if self.volume_ax is not None:
+            self.volumes.set_verts(_body_verts(x, np.zeros(len(hist)), hist[:, 5], self.width))
+            self.volumes.set_facecolor(colors)
+            max_volume = self.data[start:self.n, 5].max()
+            # 成交量只占下方20%的高度
+            self.volume_ax.set_ylim(0, max_volume * 5 if max_volume > 0 else 1)
+        self._update_last_artists()
+
+        visible = self.data[start:self.n]
+        low, high = visible[:, 3].min(), visible[:, 2].max()
+        pad = (high - low) * 0.05 or high * 0.001 or 1
+        self.ax.set_xlim(start - 1, self.n)
+        self.ax.set_ylim(low - pad, high + pad)
+        self.full_draws += 1
+        self.canvas.draw()
+
+    def _on_draw(self, event):
+        # 整图重绘后缓存不含动态图元的背景，再补画动态图元
+        self.background = self.canvas.copy_from_bbox(self.ax.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self.animated:
+            artist.axes.draw_artist(artist)
+
+    def blit(self):
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_animated()
+        self.canvas.blit(self.ax.figure.bbox)
+        self.blits += 1
+
+
+def benchmark(bar_counts=(100, 1000, 10000), frames=50):
+    """对比整图重绘和增量更新的帧率，返回每种K线数量下的结果"""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    rng = np.random.default_rng(0)
+    results = []
+    for count in bar_counts:
+        closes = 100 + np.cumsum(rng.normal(0, 0.1, count + frames))
+        opens = np.r_[closes[0], closes[:-1]]
+        bars = np.column_stack([np.arange(len(closes)) * 60000.0, opens,
+                                np.maximum(opens, closes) + 0.05, np.minimum(opens, closes) - 0.05,
+                                closes, rng.uniform(1, 10, len(closes))])
+
+        fig = Figure(figsize=(12, 8))
+        FigureCanvasAgg(fig)
+        chart = IncrementalCandleChart(fig.add_subplot(111), max_bars=count)
+        chart.render(bars[:count])
+
+        # 整图重绘：每帧重新设置全部数据
+        start = time.perf_counter()
+        for i in range(frames):
+            chart.reset(bars[i + 1:count + i + 1])
+        full = (time.perf_counter() - start) / frames
+
+        # 增量更新：最后一根K线价格在当前范围内变化
+        chart.reset(bars[:count])
+        last = bars[count - 1].copy()
+        start = time.perf_counter()
+        for i in range(frames):
+            last[4] = last[1] + (i % 3 - 1) * 0.01
+            chart.update_last(last)
+        incremental = (time.perf_counter() - start) / frames
+
+        results.append({
+            'bars': count,
+            'full_redraw_ms': full * 1000,
+            'full_redraw_fps': 1 / full,
+            'incremental_ms': incremental * 1000,
+            'incremental_fps': 1 / incremental
+        })
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
@@ -24,5 +24,88 @@ EXCHANGE_CONFIG = {
 TRADE_PARAMS = {
     'risk_percent': 2.0,  # 风险百分比
     'profit_target': 50.0,  # 盈利目标百分比
-    'initial_balance': 100.0  # 初始资金
+    'initial_balance': 100.0,  # 初始资金
+    'trend_ma': None,  # 均线趋势过滤，例如 (5, 10)：短均线在长均线之上做多，为空时用开盘价判断
+    'book_max_age': 5.0  # 推送维护的订单簿超过该秒数没有更新时改用REST快照
+}
+
+# 资金管理参数
+FUND_PARAMS = {
+    'win_threshold': 0.5,  # 单笔盈利达到余额比例时加杠杆
+    'reinvest_risk': 5.0,  # 加杠杆后的风险百分比
+    'drawdown_threshold': 0.3,  # 亏损后余额低于该比例时全仓
+    'reset_threshold': 0.1,  # 余额低于该比例时强制恢复初始仓位
+    'reset_risk': 2.0,  # 强制平仓后的风险百分比
+    'liquidation_multiplier': 0.02  # 爆仓波动比例
+}
+
+# 交易记录持久化
+LEDGER_CONFIG = {
+    'path': 'data/ledger/trade_history_{name}.bin',  # {name} 为交易所或进程名，每个写入方一个文件
+    'fsync_every': 32,  # 每多少笔交易fsync一次
+    'fsync_interval': 1.0  # 距上次fsync最长秒数
+}
+
+# 延迟统计和采样分析
+METRICS_CONFIG = {
+    'enabled': os.getenv('OUYI_METRICS', '1') != '0',  # 计时钩子开关
+    'profile': os.getenv('OUYI_PROFILE', '0') == '1',  # 启动时打开采样分析
+    'profile_interval': 0.005,  # 采样间隔秒数
+    'export_path': 'metrics'  # 导出文件名前缀（.json 和 .prom）
+}
+# 无界面守护进程，界面通过本地socket连接查看
+DAEMON_CONFIG = {
+    'host': '127.0.0.1',  # 只监听本机
+    'port': 8765,
+    'interval': 3.0,  # K线轮询间隔秒数
+    'limit': 100,  # 推送给界面的K线数量
+    'viewer_queue': 8  # 每个界面最多积压的消息数，超出时丢弃最旧的
+}
+# 组合风控限额，下单前检查
+RISK_LIMITS = {
+    'max_order_notional': 10000.0,  # 单笔最大名义价值（计价货币）
+    'max_symbol_leverage': 5.0,  # 单个交易对名义价值 / 权益
+    'max_total_leverage': 10.0,  # 全部持仓名义价值 / 权益
+    'maintenance_margin_rate': 0.005,  # 维持保证金率，用于计算强平价
+    'min_liquidation_distance': 0.01,  # 下单后强平价距现价的最小比例
+    'max_drawdown': 0.5  # 权益从高点回撤超过该比例时停止开仓
+}
+
+# 多周期K线：只拉取基础周期，其余周期本地合成
+RESAMPLE_CONFIG = {
+    'base_timeframe': '1m',
+    'timeframes': ['1m', '3m', '5m', '15m', '1h', '4h', '1d'],
+    'utc_offset_hours': 0,  # 日线等周期按该时区的零点对齐，例如北京时间为 8
+    'max_bars': 1000  # 每个周期保留的K线数量
+}
+
+# 历史K线批量下载
+HISTORY_CONFIG = {
+    'path': 'data/history',
+    'page_limit': 100,  # 每次请求的K线数量
+    'chunk_pages': 20,  # 每段的页数，按段并发和断点续传
+    'max_workers': 4,
+    'max_retries': 5
+}
+
+# 策略状态快照，用于崩溃后热启动
+SNAPSHOT_CONFIG = {
+    'path': 'state/strategy.snap',
+    'interval': 30.0  # 定期保存的间隔（秒）
+}
+
+# 共享内存行情总线：一个发布进程拉取行情，本机多个策略进程和界面共用
+BUS_CONFIG = {
+    'name': 'ouyi_market',  # 共享内存名称
+    'symbols': ['BTC/USDT'],
+    'timeframes': ['1m', '5m', '15m', '1h'],
+    'depth': 20,  # 盘口档数
+    'capacity': 1000,  # 每个周期保留的K线数量
+    'interval': 1.0,  # 发布进程拉取间隔（秒）
+    'poll_limit': 10,  # 首次之后每轮拉取的基础K线数量
+    'max_initial_bars': 5000,  # 首次拉取的基础K线上限
+    'poll_interval': 0.0005,  # 读取方等待新数据时的轮询间隔（秒）
+    'spin': 100,  # 读到写入中的数据时先重试多少次再让出CPU
+    'read_timeout': 1.0,  # 写入一直没完成时多久报错（秒）
+    'max_age': 10.0  # 超过多少秒没有发布视为发布进程已停止，读取方重新挂载或改用交易所
 }
\ No newline at end of file
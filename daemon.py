@@ -0,0 +1,304 @@
+import time
+_STARTED = time.perf_counter()  # 在其他导入之前计时，启动耗时包含模块加载
+import argparse
+import importlib
+import json
+import logging
+import queue
+import signal
+import socket
+import threading
+from strategy import TradingStrategy
+from exchange_interface import ExchangeInterface
+from market_cache import CachedExchange
+from trade_ledger import ledger_path
+from config import DAEMON_CONFIG
+
+# 无界面交易守护进程：不加载 PyQt5、matplotlib、mplfinance 和 pandas，
+# 界面可以通过本地socket连接，作为可选的查看端。
+
+PLUGIN_ALIASES = {'trend': 'strategy_api:TrendPlugin'}
+
+
+class _Viewer:
+    """一个已连接的界面：消息先进入自己的队列，由单独的线程发送，慢的界面不会拖住发布方"""
+
+    def __init__(self, conn, addr, maxsize, on_closed):
+        self.conn = conn
+        self.addr = addr
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.on_closed = on_closed
+        self.thread = threading.Thread(target=self._send_loop, name=f'viewer-{addr[1]}', daemon=True)
+        self.thread.start()
+
+    def put(self, payload):
+        # 每条消息都是完整快照，队列满时丢弃最旧的，只保证最后一条送到
+        while True:
+            try:
+                self.queue.put_nowait(payload)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _send_loop(self):
+        while True:
+            payload = self.queue.get()
+            if payload is None:
+                break
+            try:
+                self.conn.sendall(payload)
+            except OSError:
+                break
+        self.conn.close()
+        self.on_closed(self)
+
+    def close(self):
+        self.put(None)
+
+
+class ViewerServer:
+    """本地socket推送服务，每行一条JSON消息；新连接先收到最近一次的快照
+
+    publish 只把消息放进各界面的队列，不做网络IO；界面读得慢时丢弃它积压的旧消息。
+    """
+
+    def __init__(self, host=None, port=None, queue_size=None):
+        self.host = host or DAEMON_CONFIG['host']
+        self.port = DAEMON_CONFIG['port'] if port is None else port
+        self.queue_size = queue_size or DAEMON_CONFIG['viewer_queue']
+        self.clients = []
+        self.latest = None
+        self.running = False
+        self.logger = logging.getLogger('守护进程')
+        self._lock = threading.Lock()
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen()
+        self._sock.settimeout(0.5)
+        self.port = self._sock.getsockname()[1]
+        self.running = True
+        self._thread = threading.Thread(target=self._accept_loop, name='viewer-server', daemon=True)
+        self._thread.start()
+        return self.port
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, addr = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.settimeout(None)
+            self.logger.info(f'界面已连接: {addr}')
+            with self._lock:
+                viewer = _Viewer(conn, addr, self.queue_size, self._remove)
+                self.clients.append(viewer)
+                if self.latest is not None:
+                    viewer.put(self.latest)
+
+    def _remove(self, viewer):
+        with self._lock:
+            if viewer in self.clients:
+                self.clients.remove(viewer)
+        if viewer.dropped:
+            self.logger.info(f'界面 {viewer.addr} 已断开，丢弃过 {viewer.dropped} 条积压消息')
+
+    def publish(self, message):
+        payload = (json.dumps(message, ensure_ascii=False) + '\n').encode()
+        with self._lock:
+            self.latest = payload
+            for viewer in self.clients:
+                viewer.put(payload)
+
+    def stop(self):
+        self.running = False
+        if self._sock is not None:
+            self._sock.close()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            clients = list(self.clients)
+        for viewer in clients:
+            # 关闭连接让阻塞中的发送立即返回
+            try:
+                viewer.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            viewer.close()
+        for viewer in clients:
+            viewer.thread.join()
+
+
+def load_plugin(spec):
+    """按 '模块:类名' 加载策略插件，也可以用 PLUGIN_ALIASES 中的简称"""
+    module_name, class_name = PLUGIN_ALIASES.get(spec, spec).split(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class TradingDaemon:
+    """定时拉取K线，更新指标并驱动策略插件；可选按固定间隔执行 execute_strategy"""
+
+    def __init__(self, exchange_name='okx', symbols=('BTC/USDT',), timeframe='1m', interval=None,
+                 simulated=True, proxy=None, plugins=(), paper=True, execute_every=None,
+                 viewer=True, host=None, port=None, params_file=None, exchange=None, snapshot=None):
+        self.symbols = list(symbols)
+        self.timeframe = timeframe
+        self.interval = DAEMON_CONFIG['interval'] if interval is None else interval
+        self.limit = DAEMON_CONFIG['limit']
+        self.execute_every = execute_every
+        self.logger = logging.getLogger('守护进程')
+        self.stop_event = threading.Event()
+
+        exchange = exchange or CachedExchange(ExchangeInterface(exchange_name, simulated=simulated,
+                                                                proxy=proxy, use_proxy=proxy is not None))
+        # 每个守护进程按交易所单独一个交易记录文件
+        self.strategy = TradingStrategy(exchange, ledger_path=ledger_path(f'daemon_{exchange_name}'))
+        if params_file:
+            self.strategy.fund_manager.load_params(params_file)
+        for plugin in plugins:
+            self.strategy.add_plugin(load_plugin(plugin) if isinstance(plugin, str) else plugin, paper=paper)
+        self.server = ViewerServer(host, port) if viewer else None
+        self.snapshots = None
+        if snapshot:
+            from state_snapshot import SnapshotManager
+            self.snapshots = SnapshotManager(self.strategy, None if snapshot is True else snapshot)
+        self.cycles = 0
+        self.errors = 0
+
+    @property
+    def fund_manager(self):
+        return self.strategy.fund_manager
+
+    def run_once(self):
+        """拉取一次所有交易对的K线并分发，返回推送给界面的快照"""
+        exchange = self.strategy.exchange
+        snapshot = None
+        for symbol in self.symbols:
+            ohlcv = exchange.get_ohlcv(symbol, self.timeframe, limit=self.limit)
+            self.strategy.on_market_data(symbol, ohlcv)
+            snapshot = {
+                'type': 'update',
+                'balance': self.fund_manager.balance,
+                'ohlcv': ohlcv,
+                'timeframe': self.timeframe,
+                'symbol': symbol
+            }
+            if self.server is not None:
+                self.server.publish(snapshot)
+        self.cycles += 1
+        return snapshot
+
+    def run(self):
+        if self.server is not None:
+            port = self.server.start()
+            self.logger.info(f'界面可连接 {self.server.host}:{port}')
+        if self.snapshots is not None:
+            try:
+                self.snapshots.warm_start(self.timeframe)
+            except Exception as e:
+                self.logger.error(f'快照热启动失败，按冷启动运行: {e}')
+        last_execute = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    self.run_once()
+                    if self.execute_every and started - last_execute >= self.execute_every:
+                        last_execute = started
+                        for symbol in self.symbols:
+                            self.strategy.execute_strategy(symbol)
+                    if self.snapshots is not None:
+                        self.snapshots.maybe_save()
+                except Exception as e:
+                    self.errors += 1
+                    self.logger.error(f'策略循环出错: {e}')
+                self.stop_event.wait(max(self.interval - (time.monotonic() - started), 0))
+        finally:
+            self.shutdown()
+
+    def stop(self, *args):
+        """信号处理函数，也可以从其他线程调用"""
+        self.logger.info('收到停止信号，正在退出')
+        self.stop_event.set()
+
+    def shutdown(self):
+        # 等待在途订单处理完，再刷盘交易记录
+        if self.server is not None:
+            self.server.stop()
+        self.strategy.executor.shutdown(wait=True)
+        if self.snapshots is not None:
+            self.snapshots.save()
+        self.strategy.trade_history.close()
+        self.logger.info(f'已退出，共运行 {self.cycles} 轮，错误 {self.errors} 次')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='无界面交易守护进程')
+    parser.add_argument('--exchange', default='okx')
+    parser.add_argument('--symbols', default='BTC/USDT', help='逗号分隔')
+    parser.add_argument('--timeframe', default='1m')
+    parser.add_argument('--interval', type=float, default=None)
+    parser.add_argument('--live', action='store_true', help='实盘模式（默认模拟盘）')
+    parser.add_argument('--proxy', default=None)
+    parser.add_argument('--plugin', action='append', default=[], help="例如 trend 或 '模块:类名'")
+    parser.add_argument('--live-orders', action='store_true', help='插件下单走实盘执行引擎，默认模拟成交')
+    parser.add_argument('--execute-every', type=float, default=None,
+                        help='每隔多少秒执行一次 execute_strategy，默认不执行')
+    parser.add_argument('--params', default=None, help='FundManager.load_params 读取的参数文件')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--no-viewer', action='store_true')
+    parser.add_argument('--record', default=None, help='把所有交易所请求和响应录制到该文件')
+    parser.add_argument('--replay', default=None, help='回放录制文件，不连接交易所')
+    parser.add_argument('--bus', nargs='?', const='', default=None,
+                        help='从共享内存行情总线读取行情（market_bus.py 发布），可指定总线名称')
+    parser.add_argument('--snapshot', nargs='?', const=True, default=None,
+                        help='定期保存状态快照并在启动时热启动，可指定快照路径')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，0 为不等待')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    exchange = recorder = None
+    if args.replay:
+        from session_recorder import ReplayExchange
+        exchange = CachedExchange(ReplayExchange(args.replay, speed=args.speed or None))
+    elif args.record:
+        from session_recorder import RecordingExchange
+        recorder = RecordingExchange(ExchangeInterface(args.exchange, simulated=not args.live, proxy=args.proxy,
+                                                       use_proxy=args.proxy is not None), args.record)
+        exchange = CachedExchange(recorder)
+    if args.bus is not None:
+        # 行情读共享内存，下单等其他请求仍走交易所接口
+        from market_bus import BusExchange, MarketBusReader
+        exchange = BusExchange(MarketBusReader(args.bus or None), exchange or CachedExchange(
+            ExchangeInterface(args.exchange, simulated=not args.live, proxy=args.proxy,
+                              use_proxy=args.proxy is not None)))
+    daemon = TradingDaemon(args.exchange, args.symbols.split(','), args.timeframe, args.interval,
+                           simulated=not args.live, proxy=args.proxy, plugins=args.plugin,
+                           paper=not args.live_orders, execute_every=args.execute_every,
+                           viewer=not args.no_viewer, host=args.host, port=args.port,
+                           params_file=args.params, exchange=exchange, snapshot=args.snapshot)
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    logging.getLogger('守护进程').info(f'启动耗时 {(time.perf_counter() - _STARTED) * 1000:.0f}ms')
+    try:
+        daemon.run()
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,21 @@
 import ccxt
 from config import EXCHANGE_CONFIG
-import time
+from order_executor import RetryPolicy, new_client_order_id, place_order
+from instrumentation import timed
+
+def build_exchange_config(exchange_name, proxy=None, use_proxy=True):
+    """生成创建ccxt交易所实例的配置，同步和异步客户端共用"""
+    config = EXCHANGE_CONFIG[exchange_name]
+    proxy_settings = proxy or config['proxy'] if use_proxy else None
+    options = {'adjustForTimeDifference': True}
+    if exchange_name == 'okx':
+        options['defaultType'] = 'swap'
+    return {
+        'apiKey': config['apiKey'],
+        'secret': config['secret'],
+        'proxy': proxy_settings,
+        'options': options
+    }
 
 class ExchangeInterface:
     def __init__(self, exchange_name='okx', simulated=True, proxy=None, use_proxy=True):
@@ -8,31 +23,12 @@ class ExchangeInterface:
         self.proxy = proxy
         self.exchange_name = exchange_name
         self.use_proxy = use_proxy
+        self.retry_policy = RetryPolicy()
         
         # 根据交易所名称创建对应的交易所实例
         if exchange_name in EXCHANGE_CONFIG:
-            config = EXCHANGE_CONFIG[exchange_name]
-            proxy_settings = proxy or config['proxy'] if use_proxy else None
-            
-            if exchange_name == 'okx':
-                self.exchange = ccxt.okx({
-                    'apiKey': config['apiKey'],
-                    'secret': config['secret'],
-                    'proxy': proxy_settings,
-                    'options': {
-                        'defaultType': 'swap',
-                        'adjustForTimeDifference': True
-                    }
-                })
-            elif exchange_name == 'binance':
-                self.exchange = ccxt.binance({
-                    'apiKey': config['apiKey'],
-                    'secret': config['secret'],
-                    'proxy': proxy_settings,
-                    'options': {
-                        'adjustForTimeDifference': True
-                    }
-                })
+            exchange_class = getattr(ccxt, exchange_name)
+            self.exchange = exchange_class(build_exchange_config(exchange_name, proxy, use_proxy))
             
             self.exchange.set_sandbox_mode(simulated)
             if not simulated and use_proxy and proxy:
@@ -46,32 +42,62 @@ class ExchangeInterface:
             'https': f'http://{proxy}'
         }
     
-    def create_order(self, symbol, side, amount, price):
+    @timed('exchange')
+    def submit_order(self, symbol, side, amount, price, client_order_id=None):
+        """单次下单请求，不做重试"""
+        params = {'leverage': 1}
+        if client_order_id:
+            params['clientOrderId'] = client_order_id
+        return self.exchange.create_order(
+            symbol,
+            'limit',
+            side,
+            amount,
+            price,
+            params=params
+        )
+
+    @timed('exchange')
+    def create_order(self, symbol, side, amount, price, client_order_id=None):
+        # 网络错误时有限次退避重试，重试前按客户端订单号确认订单是否已提交
+        return place_order(self, symbol, side, amount, price,
+                           client_order_id or new_client_order_id(), self.retry_policy)
+
+    @timed('exchange')
+    def fetch_order_by_client_id(self, symbol, client_order_id):
+        """按客户端订单号查询订单，不存在时返回None"""
         try:
-            return self.exchange.create_order(
-                symbol,
-                'limit',
-                side,
-                amount,
-                price,
-                params={'leverage': 1}
-            )
-        except ccxt.NetworkError as e:
-            print(f'网络错误: {e}')
-            time.sleep(5)
-            return self.create_order(symbol, side, amount, price)
+            return self.exchange.fetch_order(None, symbol, params={'clientOrderId': client_order_id})
+        except ccxt.OrderNotFound:
+            return None
+
+    @timed('exchange')
+    def cancel_order_by_client_id(self, symbol, client_order_id):
+        """按客户端订单号撤单，订单已成交或已撤销时抛出 ccxt.InvalidOrder"""
+        return self.exchange.cancel_order(None, symbol, params={'clientOrderId': client_order_id})
     
+    @timed('exchange')
+    def get_ticker(self, symbol):
+        return self.exchange.fetch_ticker(symbol)
+
+    @timed('exchange')
+    def get_order_book(self, symbol):
+        return self.exchange.fetch_order_book(symbol)
+
+    @timed('exchange')
     def get_market_data(self, symbol):
         return {
-            'ticker': self.exchange.fetch_ticker(symbol),
-            'orderbook': self.exchange.fetch_order_book(symbol)
+            'ticker': self.get_ticker(symbol),
+            'orderbook': self.get_order_book(symbol)
         }
     
     def set_proxy(self, proxy_settings):
         self.exchange.proxy = proxy_settings
 
-    def get_ohlcv(self, symbol, timeframe='1m', limit=100):
-        return self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+    @timed('exchange')
+    def get_ohlcv(self, symbol, timeframe='1m', limit=100, since=None):
+        return self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
 
+    @timed('exchange')
     def get_balance(self):
         return self.exchange.fetch_balance()['USDT']['free']
\ No newline at end of file
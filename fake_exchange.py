@@ -0,0 +1,170 @@
+import random
+import threading
+import time
+import ccxt
+import numpy as np
+from candle_store import timeframe_ms
+from order_executor import RetryPolicy, new_client_order_id, place_order
+from resampler import resample
+
+
+def generate_ohlcv(bars=10000, start=1700000000000, timeframe='1m', price=30000.0,
+                   volatility=0.001, seed=0):
+    """生成确定性的随机游走K线，相同参数总是得到相同数据"""
+    rng = np.random.default_rng(seed)
+    step = timeframe_ms(timeframe)
+    returns = rng.normal(0, volatility, bars)
+    close = price * np.exp(np.cumsum(returns))
+    opens = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0, volatility / 2, bars)) * close
+    high = np.maximum(opens, close) + spread
+    low = np.minimum(opens, close) - spread
+    volume = rng.uniform(1, 100, bars)
+    timestamps = start + np.arange(bars, dtype=np.float64) * step
+    return np.column_stack([timestamps, opens, high, low, close, volume])
+
+
+class FakeExchange:
+    """离线替身交易所，实现 ExchangeInterface 的接口，行情来自录制或生成的K线
+
+    cursor 为当前K线位置，advance 推进时间；延迟和失败率可配置，
+    gap_rate 为随机缺失K线的比例，模拟交易所本身的数据缺口。
+    随机数使用固定种子，同样的调用顺序得到同样的结果。
+    """
+
+    def __init__(self, ohlcv=None, timeframe='1m', exchange_name='fake', latency=0.0,
+                 failure_rate=0.0, seed=0, balance=10000.0, depth=20, tick=0.1, cursor=None,
+                 gap_rate=0.0):
+        self.ohlcv = generate_ohlcv(seed=seed, timeframe=timeframe) if ohlcv is None \
+            else np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if gap_rate:
+            self.ohlcv = self.ohlcv[np.random.default_rng(seed + 1).random(len(self.ohlcv)) >= gap_rate]
+        self.timeframe = timeframe
+        self.exchange_name = exchange_name
+        self.simulated = True
+        self.proxy = None
+        self.use_proxy = False
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.depth = depth
+        self.tick = tick
+        self.balance = {'USDT': {'free': balance, 'used': 0.0, 'total': balance}}
+        self.cursor = len(self.ohlcv) - 1 if cursor is None else cursor
+        self.orders = {}
+        self.calls = {}
+        self.failures = 0
+        self.retry_policy = RetryPolicy()
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # 调度器按 exchange.rateLimit 换算限流速率
+        self.exchange = type('FakeCcxt', (), {'rateLimit': 1, 'proxies': {}})()
+
+    @classmethod
+    def from_store(cls, store, exchange_name, symbol, timeframe, **kwargs):
+        """用本地K线仓库中录制的数据作为行情"""
+        return cls(store.read_array(exchange_name, symbol, timeframe), timeframe,
+                   exchange_name=exchange_name, **kwargs)
+
+    def _network(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            failed = self.rng.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            self.failures += 1
+            raise ccxt.NetworkError(f'模拟网络错误: {method}')
+
+    def advance(self, bars=1):
+        """推进行情时间，返回是否还有数据"""
+        self.cursor = min(self.cursor + bars, len(self.ohlcv) - 1)
+        return self.cursor < len(self.ohlcv) - 1
+
+    @property
+    def current_bar(self):
+        return self.ohlcv[self.cursor]
+
+    # ---------- ExchangeInterface 接口 ----------
+
+    def configure_proxy(self, proxy):
+        self.proxy = proxy
+
+    def set_proxy(self, proxy_settings):
+        self.proxy = proxy_settings
+
+    def get_ticker(self, symbol):
+        self._network('get_ticker')
+        return self._ticker(symbol)
+
+    def _ticker(self, symbol):
+        ts, o, h, l, c, v = self.current_bar.tolist()
+        return {'symbol': symbol, 'timestamp': int(ts), 'open': o, 'high': h, 'low': l,
+                'last': c, 'close': c, 'bid': c - self.tick, 'ask': c + self.tick,
+                'baseVolume': v}
+
+    def get_order_book(self, symbol):
+        self._network('get_order_book')
+        close = float(self.current_bar[4])
+        offsets = self.tick * np.arange(1, self.depth + 1)
+        sizes = 1.0 + (np.arange(self.depth) % 5)
+        return {'symbol': symbol, 'timestamp': int(self.current_bar[0]), 'nonce': self.cursor,
+                'bids': np.column_stack([close - offsets, sizes]).tolist(),
+                'asks': np.column_stack([close + offsets, sizes]).tolist()}
+
+    def get_market_data(self, symbol):
+        return {
+            'ticker': self.get_ticker(symbol),
+            'orderbook': self.get_order_book(symbol)
+        }
+
+    def get_ohlcv(self, symbol, timeframe='1m', limit=100, since=None):
+        self._network('get_ohlcv')
+        data = self.ohlcv[:self.cursor + 1]
+        factor = timeframe_ms(timeframe) // timeframe_ms(self.timeframe)
+        if factor > 1:
+            data = resample(data, timeframe)
+        if since is not None:
+            start = int(np.searchsorted(data[:, 0], since))
+            data = data[start:start + limit]
+        else:
+            data = data[-limit:]
+        return data.tolist()
+
+    def get_balance(self):
+        """与 ExchangeInterface 相同，返回可用的 USDT 余额"""
+        self._network('get_balance')
+        return self.balance['USDT']['free']
+
+    def submit_order(self, symbol, side, amount, price, client_order_id=None):
+        self._network('submit_order')
+        with self._lock:
+            if client_order_id in self.orders:
+                raise ccxt.InvalidOrder(f'重复的客户端订单号 {client_order_id}')
+            # 限价单按当前K线价格立即全部成交
+            order = {'id': str(len(self.orders) + 1), 'clientOrderId': client_order_id,
+                     'symbol': symbol, 'side': side, 'amount': amount, 'price': price,
+                     'average': price, 'filled': amount, 'status': 'closed',
+                     'timestamp': int(self.current_bar[0])}
+            self.orders[client_order_id] = order
+        return dict(order)
+
+    def create_order(self, symbol, side, amount, price, client_order_id=None):
+        return place_order(self, symbol, side, amount, price,
+                           client_order_id or new_client_order_id(), self.retry_policy)
+
+    def fetch_order_by_client_id(self, symbol, client_order_id):
+        self._network('fetch_order')
+        order = self.orders.get(client_order_id)
+        return dict(order) if order else None
+
+    def cancel_order_by_client_id(self, symbol, client_order_id):
+        self._network('cancel_order')
+        with self._lock:
+            order = self.orders.get(client_order_id)
+            if order is None:
+                raise ccxt.OrderNotFound(client_order_id)
+            if order['status'] != 'open':
+                raise ccxt.InvalidOrder(f'订单 {client_order_id} 已结束')
+            order['status'] = 'canceled'
+            return dict(order)
+
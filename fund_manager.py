@@ -1,8 +1,12 @@
+from config import FUND_PARAMS, TRADE_PARAMS
+
 class FundManager:
-    def __init__(self, initial_balance):
+    def __init__(self, initial_balance, params=None):
         self.balance = initial_balance
         self.position_size = 0.0
         self.leverage = 1
+        self.risk_percent = TRADE_PARAMS['risk_percent']
+        self.params = dict(FUND_PARAMS, **(params or {}))
         
     def calculate_position(self, risk_percent):
         """根据风险百分比计算仓位大小"""
@@ -14,29 +18,37 @@ class FundManager:
         
         if profit > 0:
             # 盈利达到50%时自动加仓
-            if profit / initial_balance >= 0.5:
+            if profit / initial_balance >= self.params['win_threshold']:
                 self.leverage += 1
-                self.position_size = self.calculate_position(5)  # 默认5%风险
+                self.position_size = self.calculate_position(self.params['reinvest_risk'])  # 默认5%风险
         else:
             # 亏损后重置杠杆并全仓
             self.leverage = 1
-            if self.balance <= initial_balance * 0.3:  # 爆仓阈值30%
+            if self.balance <= initial_balance * self.params['drawdown_threshold']:  # 爆仓阈值30%
                 self.position_size = self.balance
         
         # 强制平仓后恢复初始仓位
-        if self.balance <= initial_balance * 0.1:
+        if self.balance <= initial_balance * self.params['reset_threshold']:
             self.leverage = 1
-            self.position_size = self.calculate_position(2)
+            self.position_size = self.calculate_position(self.params['reset_risk'])
         
     def get_liquidation_price(self, entry_price, position_side):
         """计算爆仓价格"""
-        # 2% 波动爆仓
-        multiplier = 0.02
+        # 默认2% 波动爆仓
+        multiplier = self.params['liquidation_multiplier']
         if position_side == 'long':
             return entry_price * (1 - multiplier)
         else:
             return entry_price * (1 + multiplier)
 
+    def copy(self):
+        """独立的副本，回测在副本上模拟，不改动实盘资金"""
+        fund_manager = FundManager(self.balance, dict(self.params))
+        fund_manager.position_size = self.position_size
+        fund_manager.leverage = self.leverage
+        fund_manager.risk_percent = self.risk_percent
+        return fund_manager
+
     def get_trade_params(self, risk_percent):
         return {
             'position_size': self.calculate_position(risk_percent),
@@ -46,20 +58,33 @@ class FundManager:
     
     def save_params(self, filename='strategy_params.json'):
         import json
+        import os
         params = {
             'initial_balance': self.balance,
             'leverage': self.leverage,
-            'risk_percent': 5  # 默认风险百分比
+            'risk_percent': self.risk_percent,
+            'position_size': self.position_size,
+            'fund_params': self.params
         }
-        with open(filename, 'w') as f:
+        # 先写临时文件再替换，保存中途崩溃不会留下半个文件
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
             json.dump(params, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
 
     def load_params(self, filename='strategy_params.json'):
         import json
         try:
             with open(filename) as f:
                 params = json.load(f)
-                self.balance = params['initial_balance']
-                self.leverage = params['leverage']
+                # 参数优化结果文件只有风险比例和资金管理参数，不带余额和杠杆
+                self.balance = params.get('initial_balance', self.balance)
+                self.leverage = params.get('leverage', self.leverage)
+                if 'risk_percent' in params:
+                    self.risk_percent = params['risk_percent']
+                self.position_size = params.get('position_size', self.position_size)
+                self.params.update(params.get('fund_params', {}))
         except FileNotFoundError:
             print("参数文件不存在，使用默认配置")
\ No newline at end of file
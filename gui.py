@@ -1,5 +1,9 @@
 import sys
+import time
+import json
+import socket
 import logging
+import threading
 import matplotlib
 matplotlib.use('Qt5Agg')
 matplotlib.rcParams['font.family'] = ['Microsoft YaHei', 'SimHei', 'sans-serif']    # 设置字体，防止中文显示为方块  
@@ -11,13 +15,44 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from strategy import TradingStrategy
 from exchange_interface import ExchangeInterface
+from candle_store import CandleStore, timeframe_ms
+from market_cache import CachedExchange
+from trade_ledger import LedgerInUse, ledger_path
+from stream_feed import StreamFeed
+from history_downloader import HistoryDownloader
+from chart_renderer import IncrementalCandleChart
+from ohlcv_buffer import OHLCVBuffer
+from resampler import MultiTimeframeCandles, resample
+from instrumentation import REGISTRY, timed, timer
+from config import BUS_CONFIG, DAEMON_CONFIG
+import asyncio
+import numpy as np
 import mplfinance as mpf
 import pandas as pd
 
+# 界面显示的K线周期，不超过 LOCAL_TIMEFRAME 的由1分钟K线本地合成
+TIMEFRAME_NAMES = {
+    '1分钟': '1m',
+    '3分钟': '3m',
+    '5分钟': '5m',
+    '15分钟': '15m',
+    '1小时': '1h',
+    '4小时': '4h',
+    '1天': '1d'
+}
+TIMEFRAME_DISPLAY = {v: k for k, v in TIMEFRAME_NAMES.items()}
+# 1分钟K线只保留合成 limit 根该周期所需的历史；更大的周期首次显示时向交易所拉取一次，之后由它续上
+LOCAL_TIMEFRAME = '1h'
+
 class TradingGUI(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.strategy = TradingStrategy()
+        try:
+            self.strategy = TradingStrategy(ledger_path=ledger_path('gui'))
+        except LedgerInUse:
+            # 已经有另一个界面在写交易记录，这个界面的记录只保存在内存中
+            logging.getLogger('K线数据').warning('交易记录文件已被其他界面使用，本次只保存在内存中')
+            self.strategy = TradingStrategy()
         self.initUI()
         
         # 数据更新线程
@@ -48,21 +83,21 @@ class TradingGUI(QMainWindow):
                 return
             
             # 获取当前选择的K线周期
-            timeframe_map = {
-                '1分钟': '1m',
-                '3分钟': '3m',
-                '5分钟': '5m',
-                '15分钟': '15m'
-            }
             selected_timeframe = self.timeframe_combo.currentText()
-            timeframe = timeframe_map.get(selected_timeframe, '1m')
+            timeframe = TIMEFRAME_NAMES.get(selected_timeframe, '1m')
             
             # 如果线程已经在运行，先停止它
             if hasattr(self.data_thread, 'running') and self.data_thread.running:
                 self.data_thread.stop()
             
-            # 重新初始化数据线程
-            self.data_thread = DataThread(self.strategy)
+            # 重新初始化数据线程，默认使用WebSocket推送；连接守护进程时只做查看
+            if self.attach_checkbox.isChecked():
+                thread_class = DaemonViewerThread
+            elif self.bus_checkbox.isChecked():
+                thread_class = BusDataThread
+            else:
+                thread_class = StreamDataThread if self.stream_checkbox.isChecked() else DataThread
+            self.data_thread = thread_class(self.strategy)
             self.data_thread.update_signal.connect(self.update_gui)
             self.data_thread.error_occurred.connect(self.show_error)
             self.data_thread.timeframe = timeframe
@@ -113,6 +148,12 @@ class TradingGUI(QMainWindow):
         
         # 交易模式选择
         self.mode_switch = QCheckBox('实盘模式')
+        self.stream_checkbox = QCheckBox('WebSocket实时推送')
+        self.stream_checkbox.setChecked(True)
+        self.incremental_checkbox = QCheckBox('增量绘图')
+        self.incremental_checkbox.setChecked(True)
+        self.attach_checkbox = QCheckBox('连接守护进程')
+        self.bus_checkbox = QCheckBox('读取共享行情总线')
         self.start_btn = QPushButton('开始交易')
         self.start_btn.clicked.connect(self.toggle_trading)
 
@@ -121,6 +162,10 @@ class TradingGUI(QMainWindow):
         control_layout.addWidget(QLabel('风险比例(%):'))
         control_layout.addWidget(self.risk_input)
         control_layout.addWidget(self.mode_switch)
+        control_layout.addWidget(self.stream_checkbox)
+        control_layout.addWidget(self.incremental_checkbox)
+        control_layout.addWidget(self.attach_checkbox)
+        control_layout.addWidget(self.bus_checkbox)
         control_layout.addWidget(self.start_btn)
         
         # 添加参数管理按钮
@@ -135,6 +180,15 @@ class TradingGUI(QMainWindow):
         self.fetch_btn = QPushButton('获取行情')
         self.fetch_btn.clicked.connect(self.fetch_market_data)
         control_layout.addWidget(self.fetch_btn)
+
+        # 延迟统计导出和采样分析开关
+        self.metrics_btn = QPushButton('导出延迟统计')
+        self.metrics_btn.clicked.connect(self.export_metrics)
+        self.profile_checkbox = QCheckBox('采样分析')
+        self.profile_checkbox.setChecked(REGISTRY.profiler is not None)
+        self.profile_checkbox.stateChanged.connect(self.toggle_profiler)
+        control_layout.addWidget(self.metrics_btn)
+        control_layout.addWidget(self.profile_checkbox)
         
         # 添加K线周期选择和获取按钮
         kline_frame = QFrame()
@@ -143,7 +197,7 @@ class TradingGUI(QMainWindow):
         kline_frame.setLayout(kline_layout)
         
         self.timeframe_combo = QComboBox()
-        self.timeframe_combo.addItems(['1分钟', '3分钟', '5分钟', '15分钟'])
+        self.timeframe_combo.addItems(list(TIMEFRAME_NAMES))
         self.fetch_kline_btn = QPushButton('获取K线')
         self.fetch_kline_btn.clicked.connect(self.fetch_kline)
         
@@ -160,6 +214,9 @@ class TradingGUI(QMainWindow):
         self.figure = Figure()
         self.canvas = FigureCanvas(self.figure)
         self.ax = self.figure.add_subplot(111)
+        self.chart = IncrementalCandleChart(self.ax)
+        # 绘图用的K线缓冲区，刷新时原地更新
+        self.ohlcv_buffer = OHLCVBuffer()
         
         layout.addWidget(control_panel)
         layout.addWidget(self.canvas)
@@ -180,12 +237,13 @@ class TradingGUI(QMainWindow):
         self.on_proxy_state_changed()
 
     def on_exchange_changed(self, exchange_name):
-        self.strategy.exchange = ExchangeInterface(
+        # 策略和界面共用同一个带缓存的交易所接口，避免重复请求触发限频
+        self.strategy.exchange = CachedExchange(ExchangeInterface(
             exchange_name=exchange_name,
             simulated=not self.mode_switch.isChecked(),
             proxy=self.proxy_input.text() if self.use_proxy_checkbox.isChecked() else None,
             use_proxy=self.use_proxy_checkbox.isChecked()
-        )
+        ))
 
     def on_proxy_state_changed(self):
         proxy = self.proxy_input.text() if self.use_proxy_checkbox.isChecked() else None
@@ -194,15 +252,38 @@ class TradingGUI(QMainWindow):
 
     def show_error(self, message):
         QMessageBox.critical(self, '错误', message)
+
+    def export_metrics(self):
+        json_file, prom_file = REGISTRY.export()
+        self.logger.info(f'延迟统计已导出: {json_file} {prom_file}')
+        QMessageBox.information(self, '导出成功', f'延迟统计已保存到 {json_file} 和 {prom_file}')
+
+    def toggle_profiler(self):
+        if self.profile_checkbox.isChecked():
+            REGISTRY.start_profiler()
+        else:
+            REGISTRY.stop_profiler()
     
+    @timed('gui')
     def update_gui(self, data):
         self.balance_input.setText(str(round(data['balance'], 2)))
         
+        # 获取当前周期和交易对
+        timeframe = data.get('timeframe', '1m')
+        symbol = data.get('symbol', 'BTC/USDT')
+        
+        # 转换周期显示格式
+        timeframe_display = TIMEFRAME_DISPLAY.get(timeframe, timeframe)
+        
+        if self.incremental_checkbox.isChecked():
+            self.render_incremental(data['ohlcv'], symbol, timeframe_display, data.get('window'))
+            return
+        
         # 转换K线数据格式
-        df = pd.DataFrame(data['ohlcv'], 
-                         columns=['time', 'open', 'high', 'low', 'close', 'volume'])
-        df['time'] = pd.to_datetime(df['time'], unit='ms')
-        df.set_index('time', inplace=True)
+        with timer('gui', stage='dataframe'):
+            # 只改写变化的K线，DataFrame 直接引用缓冲区
+            self.ohlcv_buffer.update(data['ohlcv'], key=(symbol, timeframe_display))
+            df = self.ohlcv_buffer.dataframe(last=data.get('window'))
         
         # 检查数据是否为空
         if df.empty:
@@ -210,27 +291,16 @@ class TradingGUI(QMainWindow):
             return
             
         # 清空图表并绘制K线
-        self.ax.clear()
-        
-        # 获取当前周期和交易对
-        timeframe = data.get('timeframe', '1m')
-        symbol = data.get('symbol', 'BTC/USDT')
-        
-        # 转换周期显示格式
-        timeframe_display = {
-            '1m': '1分钟',
-            '3m': '3分钟',
-            '5m': '5分钟',
-            '15m': '15分钟'
-        }.get(timeframe, timeframe)
+        self.chart.clear()
         
         try:
             # 使用mplfinance绘制K线图
-            mpf.plot(df, type='candle', ax=self.ax, style='charles',
-                    ylabel='价格',
-                    volume=True,  # 显示成交量
-                    mav=(5, 10),  # 添加5日和10日移动平均线
-                    warn_too_much_data=1000)
+            with timer('gui', stage='mpf_plot'):
+                mpf.plot(df, type='candle', ax=self.ax, style='charles',
+                        ylabel='价格',
+                        volume=self.chart.volume_ax or False,  # 外部坐标轴模式下成交量需要单独的坐标轴
+                        mav=(5, 10),  # 添加5日和10日移动平均线
+                        warn_too_much_data=1000)
             
             # 手动设置标题，包含更新时间和周期
             current_time = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -240,7 +310,8 @@ class TradingGUI(QMainWindow):
             self.ax.grid(True, alpha=0.3)
             
             # 强制重绘画布，使用更高效的方式
-            self.canvas.draw()
+            with timer('gui', stage='canvas_draw'):
+                self.canvas.draw()
             
             # 记录日志
             self.logger.info(f'K线图已更新: {symbol} {timeframe_display} 数据点数: {len(df)}')
@@ -249,6 +320,33 @@ class TradingGUI(QMainWindow):
             self.logger.error(f'绘制K线图失败: {str(e)}')
             return
 
+    def render_incremental(self, ohlcv, symbol, timeframe_display, window=None):
+        """增量绘图：最新K线变化时只重绘最后一根，新K线出现时才整图重绘
+
+        推送模式下 ohlcv 只含变化的K线，按 window 从缓冲区取出完整的显示窗口。
+        """
+        if len(ohlcv) == 0:
+            self.logger.error("获取的K线数据为空")
+            return
+        try:
+            if self.chart.n == 0:
+                # 图表被mplfinance清空过，重建常驻图元
+                self.chart.clear()
+                self.ax.grid(True, alpha=0.3)
+                self.ax.set_ylabel('价格')
+            current_time = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.ax.set_title(f'{self.exchange_combo.currentText().upper()} {symbol} {timeframe_display}K线 (更新: {current_time})')
+            # 均线取策略已算好的指标，图表与策略用同一份数据
+            self.chart.indicators = self.strategy.indicators.get(symbol)
+            with timer('gui', stage='incremental_render'):
+                self.ohlcv_buffer.update(ohlcv, key=(symbol, timeframe_display))
+                bars = self.ohlcv_buffer.array(last=window or len(ohlcv))
+                mode = self.chart.render(bars)
+            if mode != 'update':
+                self.logger.info(f'K线图已更新: {symbol} {timeframe_display} 数据点数: {len(bars)}')
+        except Exception as e:
+            self.logger.error(f'绘制K线图失败: {str(e)}')
+
     def fetch_market_data(self):
         try:
             # 获取市场数据
@@ -261,14 +359,8 @@ class TradingGUI(QMainWindow):
             # 如果数据线程未运行，则手动获取一次K线数据并更新图表
             if not hasattr(self.data_thread, 'running') or not self.data_thread.running:
                 # 获取K线数据
-                timeframe_map = {
-                    '1分钟': '1m',
-                    '3分钟': '3m',
-                    '5分钟': '5m',
-                    '15分钟': '15m'
-                }
                 selected_timeframe = self.timeframe_combo.currentText()
-                timeframe = timeframe_map.get(selected_timeframe, '1m')
+                timeframe = TIMEFRAME_NAMES.get(selected_timeframe, '1m')
                 
                 ohlcv = self.strategy.exchange.get_ohlcv('BTC/USDT', timeframe)
                 
@@ -289,28 +381,28 @@ class TradingGUI(QMainWindow):
     def fetch_kline(self):
         try:
             # 获取选择的时间周期
-            timeframe_map = {
-                '1分钟': '1m',
-                '3分钟': '3m',
-                '5分钟': '5m',
-                '15分钟': '15m'
-            }
             selected_timeframe = self.timeframe_combo.currentText()
-            timeframe = timeframe_map.get(selected_timeframe, '1m')
+            timeframe = TIMEFRAME_NAMES.get(selected_timeframe, '1m')
             
             # 更新数据线程的时间周期
             if hasattr(self.data_thread, 'timeframe'):
                 self.data_thread.update_timeframe(timeframe)
                 self.logger.info(f'已更新K线周期为: {selected_timeframe}')
             
-            # 获取K线数据
-            ohlcv = self.strategy.exchange.get_ohlcv('BTC/USDT', timeframe)
+            # 数据线程已有1分钟K线时直接本地合成，不再请求交易所
+            ohlcv = self.data_thread.candles_for(timeframe) if hasattr(self.data_thread, 'candles_for') else None
+            if not ohlcv:
+                ohlcv = self.strategy.exchange.get_ohlcv('BTC/USDT', timeframe)
+            
+            if self.incremental_checkbox.isChecked():
+                # 切换周期后数据整体变化，render 会自动整图重绘
+                self.render_incremental(ohlcv, 'BTC/USDT', selected_timeframe)
+                QMessageBox.information(self, '获取成功', f'成功获取{selected_timeframe}K线数据')
+                return
             
             # 转换数据格式
-            df = pd.DataFrame(ohlcv, 
-                             columns=['time', 'open', 'high', 'low', 'close', 'volume'])
-            df['time'] = pd.to_datetime(df['time'], unit='ms')
-            df.set_index('time', inplace=True)
+            self.ohlcv_buffer.update(ohlcv, key=('BTC/USDT', selected_timeframe))
+            df = self.ohlcv_buffer.dataframe()
             
             # 检查数据是否为空
             if df.empty:
@@ -318,7 +410,7 @@ class TradingGUI(QMainWindow):
                 return
                 
             # 清空图表并绘制K线
-            self.ax.clear()
+            self.chart.clear()
             
             # 使用mplfinance绘制K线图
             mpf.plot(df, type='candle', ax=self.ax, style='charles',
@@ -355,15 +447,41 @@ class DataThread(QThread):
         self.retry_count = 0
         self.timeframe = '1m'  # 默认1分钟K线
         self.symbol = 'BTC/USDT'  # 默认交易对
+        self.candle_store = CandleStore()  # 本地K线仓库，只增量拉取新K线
+        self.limit = 100
+        # 只拉取1分钟K线，不超过 LOCAL_TIMEFRAME 的周期本地合成，切换周期不需要请求交易所
+        local = [tf for tf in TIMEFRAME_NAMES.values() if timeframe_ms(tf) <= timeframe_ms(LOCAL_TIMEFRAME)]
+        self.candles = MultiTimeframeCandles(local)
+        self.candles_lock = threading.Lock()
+        self.base_timeframe = self.candles.base_timeframe
+        # 保留足够合成 limit 根 LOCAL_TIMEFRAME K线的历史（1小时为6000根），首次启动约60次请求
+        self.base_limit = self.candles.base_bars_needed(LOCAL_TIMEFRAME, self.limit)
+        self.history_loaded = False
+        # 4小时、日线等直接从交易所拉取的K线：(交易所, 交易对, 周期) -> (N, 6) 数组
+        self.direct = {}
 
     def run(self):
         last_timestamp = None
         last_timeframe = None
+        last_base = None
         while self.running:
             try:
                 # 应用最新代理设置
                 self.strategy.exchange.set_proxy(self.strategy.exchange.proxy)
-                ohlcv = self.strategy.exchange.get_ohlcv(self.symbol, self.timeframe)
+                exchange = self.strategy.exchange
+                started = time.perf_counter()
+                base = self.sync_base(exchange)
+                self.sync_direct(exchange, self.timeframe)
+                with self.candles_lock:
+                    self.candles.update_ohlcv(base)
+                    ohlcv = self.display_candles(self.timeframe)
+                    strategy_ohlcv = self.strategy_candles()
+                fetch_ms = (time.perf_counter() - started) * 1000
+                REGISTRY.record('data_thread', fetch_ms / 1000, stage='fetch_candles')
+                # 策略只看1分钟K线，切换显示周期不会影响指标、风控和插件
+                if strategy_ohlcv and strategy_ohlcv[-1] != last_base:
+                    last_base = strategy_ohlcv[-1]
+                    self.strategy.on_market_data(self.symbol, strategy_ohlcv)
                 
                 # 检查是否有新数据或者周期已更改
                 current_timestamp = ohlcv[-1][0] if ohlcv and len(ohlcv) > 0 else None
@@ -374,7 +492,8 @@ class DataThread(QThread):
                     last_timestamp = current_timestamp
                     last_timeframe = self.timeframe
                     self.retry_count = 0
-                    self.logger.info(f'获取K线数据成功 时间戳: {current_timestamp} 周期: {self.timeframe}')
+                    self.logger.info(f'获取K线数据成功 时间戳: {current_timestamp} 周期: {self.timeframe} '
+                                     f'耗时: {fetch_ms:.1f}ms')
                     
                     data = {
                         'balance': self.strategy.fund_manager.balance,
@@ -400,13 +519,349 @@ class DataThread(QThread):
         self.running = False
         self.wait()
         
+    def sync_base(self, exchange):
+        """增量同步1分钟K线并返回最近 base_limit 根
+
+        本地历史不够时先用 HistoryDownloader 分段并发补齐（断点续传，不经过行情缓存），
+        每个线程只补一次：交易所本身缺失的K线补不回来，不能每轮都重新下载。
+        """
+        name = exchange.exchange_name
+        if not self.history_loaded and \
+                self.candle_store.count(name, self.symbol, self.base_timeframe) < self.base_limit:
+            step = self.candles.base_ms
+            end = int(time.time() * 1000) // step * step
+            downloader = HistoryDownloader(getattr(exchange, 'inner', exchange))
+            path, stats = downloader.download(self.symbol, self.base_timeframe, end - self.base_limit * step, end)
+            downloader.to_store(self.candle_store, self.symbol, self.base_timeframe, path)
+            self.logger.info(f'已补齐 {stats["bars"]} 根{self.base_timeframe}历史K线，缺口 {len(stats["gaps"])} 段')
+        self.history_loaded = True
+        self.candle_store.sync(exchange, self.symbol, self.base_timeframe)
+        return self.candle_store.read_array(name, self.symbol, self.base_timeframe, last=self.base_limit)
+
+    def sync_direct(self, exchange, timeframe):
+        """大于 LOCAL_TIMEFRAME 的周期在第一次显示时从交易所增量同步到本地仓库，之后不再请求"""
+        key = (exchange.exchange_name, self.symbol, timeframe)
+        if timeframe in self.candles.series or key in self.direct:
+            return
+        self.candle_store.sync(exchange, self.symbol, timeframe)
+        ohlcv = self.candle_store.read_array(exchange.exchange_name, self.symbol, timeframe, last=self.limit)
+        with self.candles_lock:
+            self.direct[key] = ohlcv
+
+    def display_candles(self, timeframe, limit=None):
+        """显示用的 timeframe 周期K线，调用方持有 candles_lock
+
+        本地合成的周期直接取视图；直接拉取的周期从拉取时最后一根（当时未收盘）开始，
+        用本地的 LOCAL_TIMEFRAME K线重新合成，之后的新K线也由它续上。
+        """
+        limit = limit or self.limit
+        if timeframe in self.candles.series:
+            return self.candles.get(timeframe, limit).tolist()
+        ohlcv = self.direct.get((self.strategy.exchange.exchange_name, self.symbol, timeframe))
+        if ohlcv is None:
+            return []
+        local = self.candles.get(LOCAL_TIMEFRAME) if self.candles.last_timestamp is not None else ()
+        if len(ohlcv) and len(local) and local[0, 0] <= ohlcv[-1, 0]:
+            recent = resample(local[local[:, 0] >= ohlcv[-1, 0]], timeframe, self.candles.offset_ms)
+            ohlcv = np.concatenate((ohlcv[:-1], recent))
+        return ohlcv[-limit:].tolist()
+
+    def strategy_candles(self):
+        """交给策略的基础周期K线，调用方持有 candles_lock；界面显示的周期只用于绘图"""
+        if self.candles.last_timestamp is None:
+            return []
+        return self.candles.get(self.base_timeframe, self.limit).tolist()
+
+    def candles_for(self, timeframe):
+        """timeframe 周期K线，还没有数据时返回空列表"""
+        with self.candles_lock:
+            return self.display_candles(timeframe)
+
     def update_timeframe(self, timeframe):
-        """更新K线周期"""
+        """更新K线周期，下次循环时按新周期推送"""
         self.timeframe = timeframe
         self.logger.info(f'K线周期已更新为: {timeframe}')
-        # 重置时间戳检查，确保下次循环立即更新图表
         return timeframe
 
+class StreamDataThread(DataThread):
+    """通过WebSocket订阅K线，只在K线变化时推送，替代定时轮询"""
+
+    def __init__(self, strategy, parent=None):
+        super().__init__(strategy, parent)
+        self.feed = None
+        self.loop = None
+        self.emitted = None  # 上次推送给界面的 (周期, 最后一根K线时间戳)
+
+    def run(self):
+        exchange = self.strategy.exchange
+        while self.running:
+            try:
+                # 先用REST补齐历史K线，之后由推送增量维护；只订阅1分钟K线
+                base = self.sync_base(exchange)
+                self.sync_direct(exchange, self.timeframe)
+                # 挂载了策略插件时同时订阅行情和增量深度，供 on_tick 和下单定价使用
+                channels = ('kline', 'ticker', 'book') if self.strategy.dispatcher is not None else ('kline',)
+                self.feed = StreamFeed(exchange.exchange_name, [self.symbol], self.base_timeframe,
+                                       channels=channels, simulated=exchange.simulated,
+                                       proxy=exchange.proxy if exchange.use_proxy else None,
+                                       max_candles=self.base_limit, on_update=self.on_update,
+                                       book_snapshot=exchange.get_order_book,
+                                       backfill=lambda symbol, since: self.fetch_base_since(exchange, since))
+                self.feed.seed(self.symbol, base.tolist())
+                self.emitted = None
+                self.emit_candles(None)
+                self.loop = asyncio.new_event_loop()
+                self.loop.run_until_complete(self.feed.run())
+                self.loop.close()
+                self.loop = None
+            except Exception as e:
+                self.retry_count += 1
+                self.error_occurred.emit(f'网络错误: {str(e)}\n已重试 {self.retry_count}/3 次')
+                if self.retry_count >= 3:
+                    self.running = False
+                self.msleep(3000)
+
+    def on_update(self, delta):
+        self.retry_count = 0
+        if delta.get('type') == 'ticker':
+            self.strategy.on_market_data(delta['symbol'], ticker=delta['ticker'])
+            return
+        if delta.get('type') == 'book':
+            self.strategy.attach_order_book(delta['book'])
+            return
+        self.emit_candles(delta)
+
+    def emit_candles(self, delta):
+        # 推送只改动最后一两根1分钟K线，衔接得上时只合成变化的部分
+        base = self.feed.candles[self.symbol]
+        last = self.candles.last_timestamp
+        timeframe = self.timeframe
+        with self.candles_lock:
+            self.candles.update_ohlcv(base[-2:] if last is not None and base[-2:][0][0] <= last else base)
+            # 界面缓冲区已有同一周期的数据时，只发从上次最后一根开始变化的K线
+            ohlcv = None
+            if delta is not None and self.emitted is not None and self.emitted[0] == timeframe:
+                tail = self.display_candles(timeframe, 2)
+                ohlcv = [bar for bar in tail if bar[0] >= self.emitted[1]]
+                if not ohlcv or ohlcv[0][0] != self.emitted[1]:
+                    ohlcv = None
+            partial = ohlcv is not None
+            if not partial:
+                ohlcv = self.display_candles(timeframe)
+            strategy_ohlcv = self.strategy_candles()
+        self.strategy.on_market_data(self.symbol, strategy_ohlcv)
+        if not ohlcv:
+            return
+        self.emitted = (timeframe, ohlcv[-1][0])
+        data = {
+            'balance': self.strategy.fund_manager.balance,
+            'ohlcv': ohlcv,
+            'timeframe': timeframe,
+            'symbol': self.symbol,
+            'delta': delta,
+            'partial': partial,
+            'window': self.limit
+        }
+        self.update_signal.emit(data)
+
+    def fetch_base_since(self, exchange, since):
+        """断线补K线：按本地仓库的页大小分页拉取，断线超过 base_limit 根时只补最近的 base_limit 根"""
+        step = self.candles.base_ms
+        page_limit = self.candle_store.page_limit
+        since = max(since, int(time.time() * 1000) // step * step - (self.base_limit - 1) * step)
+        bars = []
+        while True:
+            page = exchange.get_ohlcv(self.symbol, self.base_timeframe, limit=page_limit, since=since)
+            page = [bar for bar in page if not bars or bar[0] > bars[-1][0]]
+            if not page:
+                break
+            bars.extend(page)
+            if len(page) < page_limit:
+                break
+            since = int(page[-1][0]) + 1
+        return bars
+
+    def update_timeframe(self, timeframe):
+        timeframe = super().update_timeframe(timeframe)
+        if self.loop is not None:
+            # 推送过程中切换到直接拉取的周期，在单独的线程里同步，不阻塞推送循环
+            threading.Thread(target=self._sync_direct_background, args=(self.strategy.exchange, timeframe),
+                             name='direct-candles', daemon=True).start()
+        return timeframe
+
+    def _sync_direct_background(self, exchange, timeframe):
+        try:
+            self.sync_direct(exchange, timeframe)
+        except Exception as e:
+            self.error_occurred.emit(f'获取{timeframe}K线失败: {str(e)}')
+
+    def stop_feed(self):
+        if self.loop is not None and self.feed is not None:
+            self.loop.call_soon_threadsafe(self.feed.stop)
+
+    def stop(self):
+        self.running = False
+        self.stop_feed()
+        self.wait()
+
+
+class BusDataThread(DataThread):
+    """从共享内存行情总线（market_bus.py 发布）读取K线，不自己请求交易所，总线有更新时才刷新
+
+    总线上没有的显示周期由能整除它的最大总线周期本地合成；发布进程停止更新时重新挂载总线。
+    """
+
+    def __init__(self, strategy, parent=None, name=None):
+        super().__init__(strategy, parent)
+        self.bus_name = name
+        self.reader = None
+        self.last_bar = None
+        self.missing_timeframe = None
+
+    def check_bus(self):
+        """发布进程停止更新时重新挂载（发布进程重启后是新的一段共享内存），挂不上时抛出 BusStale"""
+        from market_bus import BusStale
+        reader = self.reader
+        if reader.alive():
+            return
+        fresh = reader.reopen()
+        if fresh is None:
+            raise BusStale(f'行情总线超过 {BUS_CONFIG["max_age"]} 秒没有更新，请检查 market_bus.py 是否在运行')
+        self.reader = fresh
+        self.logger.info('发布进程已重启，重新挂载行情总线')
+        reader.retire()
+
+    def run(self):
+        from market_bus import MarketBusReader
+        try:
+            self.reader = MarketBusReader(self.bus_name)
+        except (FileNotFoundError, ValueError) as e:
+            self.error_occurred.emit(f'行情总线不可用: {str(e)}\n请先运行 market_bus.py')
+            self.running = False
+            return
+        version = None
+        last_timestamp = None
+        last_timeframe = None
+        last_base = None
+        while self.running:
+            try:
+                version = self.reader.wait(version, timeout=0.5)
+                self.check_bus()
+                # 策略只看基础周期K线，显示周期只用于绘图
+                strategy_ohlcv = self.candles_for(self.base_timeframe)
+                if strategy_ohlcv and strategy_ohlcv[-1] != last_base:
+                    last_base = strategy_ohlcv[-1]
+                    self.strategy.on_market_data(self.symbol, strategy_ohlcv)
+                ohlcv = self.candles_for(self.timeframe)
+                if self.bus_source(self.timeframe) is None and self.missing_timeframe != self.timeframe:
+                    self.missing_timeframe = self.timeframe
+                    self.error_occurred.emit(f'行情总线没有 {self.timeframe} 周期，也无法由总线上的周期 '
+                                             f'{self.reader.timeframes} 合成')
+                current_timestamp = ohlcv[-1][0] if ohlcv else None
+                if current_timestamp is None:
+                    continue
+                if current_timestamp == last_timestamp and last_timeframe == self.timeframe \
+                        and ohlcv[-1] == self.last_bar:
+                    continue
+                last_timestamp = current_timestamp
+                last_timeframe = self.timeframe
+                self.last_bar = ohlcv[-1]
+                self.retry_count = 0
+                self.update_signal.emit({
+                    'balance': self.strategy.fund_manager.balance,
+                    'ohlcv': ohlcv,
+                    'timeframe': self.timeframe,
+                    'symbol': self.symbol
+                })
+            except Exception as e:
+                self.retry_count += 1
+                self.error_occurred.emit(f'行情总线读取错误: {str(e)}\n已重试 {self.retry_count}/3 次')
+                if self.retry_count >= 3:
+                    self.running = False
+                self.msleep(1000)
+
+    def stop(self):
+        super().stop()
+        # 线程结束后再卸载共享内存，界面线程里的 candles_for 不会读到已释放的视图
+        reader, self.reader = self.reader, None
+        if reader is not None:
+            reader.close()
+
+    def bus_source(self, timeframe):
+        """能得到 timeframe 周期K线的总线周期：总线上有就直接用，否则取能整除它的最大周期"""
+        reader = self.reader
+        if reader is None:
+            return None
+        if timeframe in reader.timeframes:
+            return timeframe
+        period = timeframe_ms(timeframe)
+        sources = [tf for tf in reader.timeframes if period % timeframe_ms(tf) == 0]
+        return max(sources, key=timeframe_ms) if sources else None
+
+    def candles_for(self, timeframe):
+        reader = self.reader
+        source = self.bus_source(timeframe)
+        if source is None or self.symbol not in reader.symbols:
+            return []
+        if source == timeframe:
+            return reader.ohlcv(self.symbol, timeframe, self.limit).tolist()
+        # 总线只保留 capacity 根源周期K线，日线等大周期可能不足 limit 根
+        ohlcv = resample(reader.ohlcv(self.symbol, source), timeframe, self.candles.offset_ms)
+        return ohlcv[-self.limit:].tolist()
+
+
+class DaemonViewerThread(DataThread):
+    """连接无界面守护进程（daemon.py），只接收推送的K线和余额，不自己请求交易所"""
+
+    def __init__(self, strategy, parent=None, host=None, port=None):
+        super().__init__(strategy, parent)
+        self.host = host or DAEMON_CONFIG['host']
+        self.port = port or DAEMON_CONFIG['port']
+        self.sock = None
+
+    def run(self):
+        while self.running:
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=5)
+                self.sock.settimeout(None)
+                self.logger.info(f'已连接守护进程 {self.host}:{self.port}')
+                for line in self.sock.makefile('r', encoding='utf-8'):
+                    if not self.running:
+                        break
+                    message = json.loads(line)
+                    if message.get('type') == 'update':
+                        self.retry_count = 0
+                        self.timeframe = message.get('timeframe', self.timeframe)
+                        self.symbol = message.get('symbol', self.symbol)
+                        self.update_signal.emit(message)
+                if self.running:
+                    raise ConnectionError('守护进程已断开')
+            except Exception as e:
+                if not self.running:
+                    break
+                self.retry_count += 1
+                self.error_occurred.emit(f'守护进程连接错误: {str(e)}\n已重试 {self.retry_count}/3 次')
+                if self.retry_count >= 3:
+                    self.running = False
+                self.msleep(3000)
+            finally:
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+
+    def stop(self):
+        self.running = False
+        if self.sock is not None:
+            # 关闭连接让阻塞的读取立即返回
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.wait()
+
+    def update_timeframe(self, timeframe):
+        self.logger.info('K线周期由守护进程决定，查看模式下不切换')
+        return self.timeframe
 
 
 if __name__ == '__main__':
@@ -0,0 +1,257 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import ccxt
+import numpy as np
+from candle_store import COLUMNS, timeframe_ms
+from order_executor import RetryPolicy
+from scheduler import TokenBucket
+from config import HISTORY_CONFIG
+
+
+def save_columns(path, ohlcv):
+    """按列压缩保存K线，时间戳为int64毫秒；先写临时文件再替换，中途崩溃不会留下半个文件"""
+    data = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+    columns = {c: data[:, i] for i, c in enumerate(COLUMNS)}
+    columns['timestamp'] = columns['timestamp'].astype(np.int64)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, **columns)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_columns(path):
+    """读取 save_columns 写入的文件，返回 (N, 6) 数组"""
+    with np.load(path) as f:
+        return np.column_stack([f[c].astype(np.float64) for c in COLUMNS])
+
+
+class HistoryDownloader:
+    """分段并发下载历史K线，支持断点续传
+
+    时间范围按 chunk_pages 页切成若干段，由线程池并发下载，所有请求共用一个按
+    交易所 rateLimit 换算的令牌桶。每段下载完先单独落盘并记入进度文件，
+    中断后重新运行会跳过已完成的段。全部完成后合并、按时间去重，写成按列压缩的
+    .npz 文件；交易所本身缺失的K线记为缺口，不会反复重试。
+    """
+
+    def __init__(self, exchange_interface, root=None, page_limit=None, chunk_pages=None,
+                 max_workers=None, rate=None, retry_policy=None, sleep=time.sleep):
+        self.exchange = exchange_interface
+        self.root = root or HISTORY_CONFIG['path']
+        self.page_limit = page_limit or HISTORY_CONFIG['page_limit']
+        self.chunk_pages = chunk_pages or HISTORY_CONFIG['chunk_pages']
+        self.max_workers = max_workers or HISTORY_CONFIG['max_workers']
+        rate = rate or 1000 / exchange_interface.exchange.rateLimit
+        self.bucket = TokenBucket(rate)
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=HISTORY_CONFIG['max_retries'])
+        self.sleep = sleep
+        self.logger = logging.getLogger('历史数据')
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, timeframe):
+        safe_symbol = symbol.replace('/', '-').replace(':', '_')
+        return os.path.join(self.root, self.exchange.exchange_name, safe_symbol, timeframe)
+
+    def output_path(self, symbol, timeframe, start, end):
+        return os.path.join(self._path(symbol, timeframe), f'{start}_{end}.npz')
+
+    # ---------- 进度文件 ----------
+
+    def _load_progress(self, path, job):
+        try:
+            with open(path) as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            return {'job': job, 'done': {}}
+        # 参数变了（例如分段大小不同）之前的进度不能复用
+        return progress if progress.get('job') == job else {'job': job, 'done': {}}
+
+    def _save_progress(self, path, progress):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(progress, f)
+        os.replace(tmp, path)
+
+    # ---------- 下载 ----------
+
+    def _fetch_page(self, symbol, timeframe, since):
+        for attempt in range(self.retry_policy.max_retries + 1):
+            self.bucket.acquire()
+            with self._lock:
+                self.requests += 1
+            try:
+                return self.exchange.get_ohlcv(symbol, timeframe, limit=self.page_limit, since=since)
+            except (ccxt.NetworkError, ccxt.ExchangeNotAvailable) as e:
+                if attempt == self.retry_policy.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                self.logger.warning(f'{symbol} {since} 请求失败: {e}，第{attempt + 1}次重试')
+                self.sleep(self.retry_policy.delay(attempt))
+
+    def _fetch_chunk(self, symbol, timeframe, start, end):
+        """下载 [start, end) 内的K线，返回 (K线数组, 缺口列表)"""
+        step = timeframe_ms(timeframe)
+        pages = []
+        since = start
+        while since < end:
+            ohlcv = self._fetch_page(symbol, timeframe, since)
+            rows = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+            rows = rows[(rows[:, 0] >= since) & (rows[:, 0] < end)]
+            if len(rows) == 0:
+                break
+            pages.append(rows)
+            next_since = int(rows[-1, 0]) + step
+            # 返回不足一页且没到段尾说明交易所这段没有更多数据
+            if next_since <= since or len(ohlcv) < self.page_limit:
+                break
+            since = next_since
+        data = np.concatenate(pages) if pages else np.empty((0, 6))
+        return data, self._gaps(data[:, 0], start, end, step)
+
+    @staticmethod
+    def _gaps(timestamps, start, end, step):
+        """按周期找出缺失的时间段，返回 [[起点, 终点), ...]"""
+        edges = np.concatenate(([start - step], timestamps, [end]))
+        missing = np.flatnonzero(np.diff(edges) > step)
+        return [[int(edges[i] + step), int(edges[i + 1])] for i in missing]
+
+    def download(self, symbol, timeframe, start, end=None):
+        """下载 [start, end) 的K线，返回输出文件路径和统计信息；end 默认为当前时间"""
+        step = timeframe_ms(timeframe)
+        start = start // step * step
+        end = int(time.time() * 1000) // step * step if end is None else end // step * step
+        directory = self._path(symbol, timeframe)
+        parts = os.path.join(directory, f'{start}_{end}.parts')
+        os.makedirs(parts, exist_ok=True)
+        progress_path = os.path.join(parts, 'progress.json')
+        chunk_ms = self.page_limit * self.chunk_pages * step
+        job = {'start': start, 'end': end, 'chunk_ms': chunk_ms}
+        progress = self._load_progress(progress_path, job)
+        chunks = [(s, min(s + chunk_ms, end)) for s in range(start, end, chunk_ms)]
+        pending = [c for c in chunks if str(c[0]) not in progress['done']]
+        self.logger.info(f'{symbol} {timeframe} 共 {len(chunks)} 段，待下载 {len(pending)} 段')
+        started = time.perf_counter()
+
+        def run(chunk):
+            data, gaps = self._fetch_chunk(symbol, timeframe, *chunk)
+            save_columns(os.path.join(parts, f'{chunk[0]}.npz'), data)
+            with self._lock:
+                progress['done'][str(chunk[0])] = {'bars': len(data), 'gaps': gaps}
+                self._save_progress(progress_path, progress)
+            return len(data)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='history') as pool:
+            # 任意一段失败都会在这里抛出，已完成的段保留在进度文件中
+            downloaded = sum(pool.map(run, pending))
+
+        merged = [load_columns(os.path.join(parts, f'{s}.npz')) for s, _ in chunks]
+        data = np.concatenate(merged) if merged else np.empty((0, 6))
+        # 按时间排序去重，相同时间戳保留后下载的
+        _, keep = np.unique(data[::-1, 0], return_index=True)
+        data = data[::-1][keep]
+        output = self.output_path(symbol, timeframe, start, end)
+        save_columns(output, data)
+        for name in os.listdir(parts):
+            os.remove(os.path.join(parts, name))
+        os.rmdir(parts)
+        return output, {
+            'bars': len(data),
+            'downloaded': downloaded,
+            'chunks': len(chunks),
+            'resumed_chunks': len(chunks) - len(pending),
+            'requests': self.requests,
+            'retries': self.retries,
+            'gaps': self._gaps(data[:, 0], start, end, step),
+            'seconds': time.perf_counter() - started
+        }
+
+    def to_store(self, store, symbol, timeframe, path):
+        """把下载结果写入本地K线仓库，供 run_offline_backtest 使用"""
+        return store.write(self.exchange.exchange_name, symbol, timeframe, load_columns(path))
+
+
+def benchmark(bars=200000, seed=0):
+    """对带随机网络错误和缺失K线的替身交易所下载，中途打断一次再续传，核对结果"""
+    import shutil
+    import tempfile
+    from fake_exchange import FakeExchange, generate_ohlcv
+    ohlcv = generate_ohlcv(bars, start=1700000040000, seed=seed)  # 起点对齐到整分钟
+    fake = FakeExchange(ohlcv, failure_rate=0.05, gap_rate=0.001, seed=seed)
+    expected = fake.ohlcv
+    start, end = int(ohlcv[0, 0]), int(ohlcv[-1, 0]) + 60000
+    policy = RetryPolicy(max_retries=10, base_delay=0.0, max_delay=0.0, jitter=0.0)
+    tmp = tempfile.mkdtemp()
+    try:
+        # 第一次运行在下载到大约一半时模拟崩溃，阈值随数据量变化，小数据量也会触发续传
+        crash = FakeExchange(ohlcv, failure_rate=0.0, gap_rate=0.001, seed=seed)
+        crash_after = max(bars // HISTORY_CONFIG['page_limit'] // 2, 1)
+        calls = {'n': 0}
+        original = crash.get_ohlcv
+
+        def crashing(*args, **kwargs):
+            calls['n'] += 1
+            if calls['n'] > crash_after:
+                raise KeyboardInterrupt
+            return original(*args, **kwargs)
+
+        crash.get_ohlcv = crashing
+        try:
+            HistoryDownloader(crash, tmp, max_workers=4, retry_policy=policy).download(
+                'BTC/USDT', '1m', start, end)
+        except KeyboardInterrupt:
+            pass
+
+        downloader = HistoryDownloader(fake, tmp, max_workers=4, retry_policy=policy)
+        path, stats = downloader.download('BTC/USDT', '1m', start, end)
+        data = load_columns(path)
+        assert np.array_equal(data, expected)
+        assert stats['resumed_chunks'] > 0
+        return dict(stats, gaps=len(stats['gaps']), missing_bars=bars - len(expected),
+                    bars_per_sec=stats['downloaded'] / stats['seconds'],
+                    file_kb=os.path.getsize(path) / 1024)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量下载历史K线')
+    parser.add_argument('--exchange', default='okx')
+    parser.add_argument('--symbol', default='BTC/USDT')
+    parser.add_argument('--timeframe', default='1m')
+    parser.add_argument('--days', type=float, default=30, help='下载最近多少天')
+    parser.add_argument('--start', type=int, default=None, help='起始时间戳（毫秒），优先于 --days')
+    parser.add_argument('--end', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--live', action='store_true', help='使用实盘行情（默认模拟盘）')
+    parser.add_argument('--store', action='store_true', help='同时写入本地K线仓库')
+    parser.add_argument('--benchmark', action='store_true', help='用替身交易所跑基准测试')
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        print(json.dumps(benchmark(), indent=2))
+        return
+
+    from exchange_interface import ExchangeInterface
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    exchange = ExchangeInterface(args.exchange, simulated=not args.live)
+    start = args.start if args.start is not None else int((time.time() - args.days * 86400) * 1000)
+    downloader = HistoryDownloader(exchange, max_workers=args.workers)
+    path, stats = downloader.download(args.symbol, args.timeframe, start, args.end)
+    if args.store:
+        from candle_store import CandleStore
+        downloader.to_store(CandleStore(), args.symbol, args.timeframe, path)
+    print(json.dumps(dict(stats, path=path), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
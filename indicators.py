@@ -0,0 +1,399 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 批量模式：对整段数组一次计算；流式模式：新K线到来时 O(1) 更新。
+# 两种模式的初始化方式一致（EMA类从第一个值开始递推），结果可以互相校验。
+
+_EMA_BLOCK = 128
+# 块内 w^k 的下限：1 / w^k 不超过 1e150，乘上价格量级的数值也不会溢出
+_EMA_MIN_POWER = 1e-150
+
+
+def _recursive_smooth(values, alpha):
+    """y[t] = alpha * x[t] + (1 - alpha) * y[t-1]，y[0] = x[0]
+
+    分块用闭式解向量化：块内 y[k] = w^k * y_prev + alpha * w^k * cumsum(x[j] / w^j)，
+    其中 w = 1 - alpha。w 很小时 w^k 衰减得快，块长度按 w 缩短到 w^k 不低于
+    _EMA_MIN_POWER，避免下溢成 0 后 x / w^k 得到 inf；alpha = 1 时 w = 0，输出就是输入。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    if len(values) == 0:
+        return out
+    w = 1 - alpha
+    if w == 0:
+        out[:] = values
+        return out
+    block_len = min(_EMA_BLOCK, max(int(math.log(_EMA_MIN_POWER) / math.log(w)), 1))
+    powers = w ** np.arange(1, block_len + 1)
+    prev = values[0]
+    out[0] = prev
+    for start in range(1, len(values), block_len):
+        block = values[start:start + block_len]
+        p = powers[:len(block)]
+        out[start:start + len(block)] = p * prev + alpha * p * np.cumsum(block / p)
+        prev = out[start + len(block) - 1]
+    return out
+
+
+def sma(values, period):
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        csum = np.cumsum(np.concatenate(([0.0], values)))
+        out[period - 1:] = (csum[period:] - csum[:-period]) / period
+    return out
+
+
+def ema(values, period):
+    return _recursive_smooth(values, 2 / (period + 1))
+
+
+def rsi(close, period=14):
+    """Wilder RSI，平滑系数 1/period"""
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(len(close), np.nan)
+    if len(close) < 2:
+        return out
+    diff = np.diff(close)
+    gain = _recursive_smooth(np.maximum(diff, 0), 1 / period)
+    loss = _recursive_smooth(np.maximum(-diff, 0), 1 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[1:] = np.where(loss > 0, 100 - 100 / (1 + gain / loss), np.where(gain > 0, 100.0, 50.0))
+    return out
+
+
+def true_range(high, low, close):
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    prev_close = np.concatenate(([close[0]], close[:-1])) if len(close) else close
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    if len(tr):
+        tr[0] = high[0] - low[0]
+    return tr
+
+
+def atr(high, low, close, period=14):
+    return _recursive_smooth(true_range(high, low, close), 1 / period)
+
+
+def bollinger(close, period=20, k=2.0):
+    """返回 (中轨, 上轨, 下轨)，标准差为总体标准差"""
+    close = np.asarray(close, dtype=np.float64)
+    mid = sma(close, period)
+    std = np.full(len(close), np.nan)
+    if len(close) >= period:
+        std[period - 1:] = sliding_window_view(close, period).std(axis=1)
+    return mid, mid + k * std, mid - k * std
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """返回 (MACD线, 信号线, 柱状图)"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def vwap(high, low, close, volume, timestamps=None, session_ms=86400000):
+    """成交量加权均价，提供时间戳时按交易日（UTC）重新累计"""
+    typical = (np.asarray(high, dtype=np.float64) + np.asarray(low, dtype=np.float64)
+               + np.asarray(close, dtype=np.float64)) / 3
+    volume = np.asarray(volume, dtype=np.float64)
+    pv = np.cumsum(typical * volume)
+    vol = np.cumsum(volume)
+    if timestamps is not None and len(volume):
+        session = np.asarray(timestamps, dtype=np.int64) // session_ms
+        starts = np.concatenate(([True], session[1:] != session[:-1]))
+        # 每个交易日减去之前所有交易日的累计值
+        base_idx = np.maximum.accumulate(np.where(starts, np.arange(len(volume)), 0))
+        pv_before = np.concatenate(([0.0], pv[:-1]))[base_idx]
+        vol_before = np.concatenate(([0.0], vol[:-1]))[base_idx]
+        pv, vol = pv - pv_before, vol - vol_before
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(vol > 0, pv / vol, typical)
+
+
+# ---------- 流式模式 ----------
+
+class _Streaming:
+    """流式指标基类：update 追加一根新K线，revise 用新数据替换最后一根（未收盘K线）"""
+
+    value = math.nan
+
+    def update(self, *bar):
+        self._saved = self._snapshot()
+        self.value = self._step(*bar)
+        return self.value
+
+    def revise(self, *bar):
+        self._restore(self._saved)
+        self.value = self._step(*bar)
+        return self.value
+
+
+class SMA(_Streaming):
+    def __init__(self, period):
+        self.period = period
+        self.window = np.zeros(period)
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+
+    def _snapshot(self):
+        return self.head, self.count, self.total, self.window[self.head]
+
+    def _restore(self, state):
+        self.head, self.count, self.total, self.window[state[0]] = state
+
+    def _step(self, x):
+        if self.count == self.period:
+            self.total -= self.window[self.head]
+        else:
+            self.count += 1
+        self.window[self.head] = x
+        self.total += x
+        self.head = (self.head + 1) % self.period
+        return self.total / self.period if self.count == self.period else math.nan
+
+
+class EMA(_Streaming):
+    def __init__(self, period=None, alpha=None):
+        self.alpha = alpha if alpha is not None else 2 / (period + 1)
+        self.current = None
+
+    def _snapshot(self):
+        return self.current
+
+    def _restore(self, state):
+        self.current = state
+
+    def _step(self, x):
+        self.current = x if self.current is None else self.alpha * x + (1 - self.alpha) * self.current
+        return self.current
+
+
+class RSI(_Streaming):
+    def __init__(self, period=14):
+        self.gain = EMA(alpha=1 / period)
+        self.loss = EMA(alpha=1 / period)
+        self.prev_close = None
+
+    def _snapshot(self):
+        return self.prev_close, self.gain.current, self.loss.current
+
+    def _restore(self, state):
+        self.prev_close, self.gain.current, self.loss.current = state
+
+    def _step(self, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return math.nan
+        diff = close - self.prev_close
+        self.prev_close = close
+        gain = self.gain._step(max(diff, 0.0))
+        loss = self.loss._step(max(-diff, 0.0))
+        if loss > 0:
+            return 100 - 100 / (1 + gain / loss)
+        return 100.0 if gain > 0 else 50.0
+
+
+class ATR(_Streaming):
+    def __init__(self, period=14):
+        self.smooth = EMA(alpha=1 / period)
+        self.prev_close = None
+
+    def _snapshot(self):
+        return self.prev_close, self.smooth.current
+
+    def _restore(self, state):
+        self.prev_close, self.smooth.current = state
+
+    def _step(self, high, low, close):
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        return self.smooth._step(tr)
+
+
+class Bollinger(_Streaming):
+    """值为 (中轨, 上轨, 下轨)"""
+
+    def __init__(self, period=20, k=2.0):
+        self.k = k
+        self.sma = SMA(period)
+        self.sq = SMA(period)
+        # 以第一个价格为基准累计偏差平方，避免大数相减损失精度
+        self.anchor = None
+
+    def _snapshot(self):
+        return self.sma._snapshot(), self.sq._snapshot(), self.anchor
+
+    def _restore(self, state):
+        self.sma._restore(state[0])
+        self.sq._restore(state[1])
+        self.anchor = state[2]
+
+    def _step(self, close):
+        if self.anchor is None:
+            self.anchor = close
+        mid = self.sma._step(close)
+        mean_sq = self.sq._step((close - self.anchor) ** 2)
+        if math.isnan(mid):
+            return math.nan, math.nan, math.nan
+        std = math.sqrt(max(mean_sq - (mid - self.anchor) ** 2, 0.0))
+        return mid, mid + self.k * std, mid - self.k * std
+
+
+class MACD(_Streaming):
+    """值为 (MACD线, 信号线, 柱状图)"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def _snapshot(self):
+        return self.fast.current, self.slow.current, self.signal.current
+
+    def _restore(self, state):
+        self.fast.current, self.slow.current, self.signal.current = state
+
+    def _step(self, close):
+        line = self.fast._step(close) - self.slow._step(close)
+        signal = self.signal._step(line)
+        return line, signal, line - signal
+
+
+class VWAP(_Streaming):
+    def __init__(self, session_ms=86400000):
+        self.session_ms = session_ms
+        self.session = None
+        self.pv = 0.0
+        self.volume = 0.0
+
+    def _snapshot(self):
+        return self.session, self.pv, self.volume
+
+    def _restore(self, state):
+        self.session, self.pv, self.volume = state
+
+    def _step(self, timestamp, high, low, close, volume):
+        session = int(timestamp) // self.session_ms
+        if session != self.session:
+            self.session, self.pv, self.volume = session, 0.0, 0.0
+        typical = (high + low + close) / 3
+        self.pv += typical * volume
+        self.volume += volume
+        return self.pv / self.volume if self.volume > 0 else typical
+
+
+class IndicatorSet:
+    """一组指标的共享计算结果，策略和图表读取同一份数据
+
+    首次加载或数据不连续时批量计算；之后最后一根K线变化用 revise，
+    新K线用 update，每次 O(1)。
+    """
+
+    def __init__(self, ma_periods=(5, 10), rsi_period=14, atr_period=14, boll_period=20):
+        self.ma_periods = tuple(ma_periods)
+        self.rsi_period = rsi_period
+        self.atr_period = atr_period
+        self.boll_period = boll_period
+        self.n = 0
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.values = {}
+
+    def load(self, ohlcv):
+        """批量计算全部指标，并把流式指标的状态推进到最后一根K线"""
+        data = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        ts, o, h, l, c, v = data.T
+        values = {f'sma{p}': sma(c, p) for p in self.ma_periods}
+        values['rsi'] = rsi(c, self.rsi_period)
+        values['atr'] = atr(h, l, c, self.atr_period)
+        values['boll_mid'], values['boll_upper'], values['boll_lower'] = bollinger(c, self.boll_period)
+        values['macd'], values['macd_signal'], values['macd_hist'] = macd(c)
+        values['vwap'] = vwap(h, l, c, v, ts)
+
+        capacity = max(len(data) * 2, 256)
+        timestamps = np.zeros(capacity, dtype=np.int64)
+        timestamps[:len(data)] = ts
+        buffers = {}
+        for name, array in values.items():
+            buffer = np.full(capacity, np.nan)
+            buffer[:len(data)] = array
+            buffers[name] = buffer
+        # 一次性替换，界面线程读取时不会看到长度不一致的数组
+        self.timestamps, self.values, self.n = timestamps, buffers, len(data)
+
+        # 流式指标从头重放一遍，保证后续增量结果与批量一致
+        streams = {f'sma{p}': SMA(p) for p in self.ma_periods}
+        streams.update(rsi=RSI(self.rsi_period), atr=ATR(self.atr_period),
+                       boll=Bollinger(self.boll_period), macd=MACD(), vwap=VWAP())
+        self._streams = streams
+        for bar in data:
+            self._step(bar, 'update')
+
+    def _step(self, bar, method):
+        ts, o, h, l, c, v = bar
+        result = {}
+        for p in self.ma_periods:
+            result[f'sma{p}'] = getattr(self._streams[f'sma{p}'], method)(c)
+        result['rsi'] = getattr(self._streams['rsi'], method)(c)
+        result['atr'] = getattr(self._streams['atr'], method)(h, l, c)
+        result['boll_mid'], result['boll_upper'], result['boll_lower'] = \
+            getattr(self._streams['boll'], method)(c)
+        result['macd'], result['macd_signal'], result['macd_hist'] = \
+            getattr(self._streams['macd'], method)(c)
+        result['vwap'] = getattr(self._streams['vwap'], method)(ts, h, l, c, v)
+        return result
+
+    def _write(self, i, result):
+        for name, value in result.items():
+            self.values[name][i] = value
+
+    def update_ohlcv(self, ohlcv):
+        """根据最新K线增量更新，返回 'revise'、'append' 或 'load'"""
+        if len(ohlcv) == 0:
+            return None
+        if self.n:
+            # 从后往前找已有的最后一根，之后的K线逐根追加（断线重连或热启动后可能有多根）
+            last_ts = self.timestamps[self.n - 1]
+            j = len(ohlcv) - 1
+            while j >= 0 and ohlcv[j][0] > last_ts:
+                j -= 1
+            if j >= 0 and ohlcv[j][0] == last_ts:
+                self._write(self.n - 1, self._step(ohlcv[j], 'revise'))
+                for bar in ohlcv[j + 1:]:
+                    self._append(bar)
+                return 'append' if j < len(ohlcv) - 1 else 'revise'
+        self.load(ohlcv)
+        return 'load'
+
+    def _append(self, bar):
+        if self.n == len(self.timestamps):
+            self.timestamps = np.concatenate((self.timestamps, np.zeros(self.n, dtype=np.int64)))
+            self.values = {k: np.concatenate((v, np.full(self.n, np.nan))) for k, v in self.values.items()}
+        self.timestamps[self.n] = bar[0]
+        self._write(self.n, self._step(bar, 'update'))
+        self.n += 1
+
+    def latest(self):
+        """最后一根K线的全部指标值"""
+        if not self.n:
+            return {}
+        return {name: float(values[self.n - 1]) for name, values in self.values.items()}
+
+    def series(self, name):
+        return self.values[name][:self.n]
+
+    def lookup(self, name, timestamps):
+        """按时间戳取指标值，找不到的位置为 nan"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        ts = self.timestamps[:self.n]
+        idx = np.searchsorted(ts, timestamps)
+        found = (idx < self.n) & (ts[np.minimum(idx, max(self.n - 1, 0))] == timestamps)
+        out = np.full(len(timestamps), np.nan)
+        out[found] = self.values[name][idx[found]]
+        return out
@@ -0,0 +1,300 @@
+import functools
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from config import METRICS_CONFIG
+
+# 延迟直方图按对数分桶：1微秒到100秒，每个数量级20个桶，相对误差约12%。
+_MIN_EXP = -6
+_MAX_EXP = 2
+_BUCKETS_PER_DECADE = 20
+_BUCKET_COUNT = (_MAX_EXP - _MIN_EXP) * _BUCKETS_PER_DECADE + 1
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图，记录一次 O(1)，分位数按桶上界估算"""
+
+    def __init__(self):
+        self.counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket(seconds):
+        if seconds <= 0:
+            return 0
+        i = int((math.log10(seconds) - _MIN_EXP) * _BUCKETS_PER_DECADE) + 1
+        return min(max(i, 0), _BUCKET_COUNT - 1)
+
+    @staticmethod
+    def _upper(i):
+        return 10 ** (_MIN_EXP + i / _BUCKETS_PER_DECADE)
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * _BUCKET_COUNT
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def record(self, seconds):
+        i = self._bucket(seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        with self._lock:
+            counts, count, peak = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return min(self._upper(i), peak)
+        return peak
+
+    def summary(self):
+        result = {'count': self.count, 'sum': self.total,
+                  'mean': self.total / self.count if self.count else 0.0, 'max': self.max}
+        for q in QUANTILES:
+            result[f'p{int(q * 100)}'] = self.quantile(q)
+        return result
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """按 (指标名, 标签) 保存延迟直方图，可导出为 Prometheus 文本或 JSON"""
+
+    def __init__(self, prefix='ouyi', enabled=True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.histograms = {}
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def record(self, name, seconds, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).record(seconds)
+
+    def timer(self, name, **labels):
+        """with registry.timer('gui', stage='draw'): ..."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(name, **labels))
+
+    def timed(self, name, **labels):
+        """函数装饰器，默认用函数名作为 method 标签"""
+        def decorator(func):
+            func_labels = dict(labels)
+            func_labels.setdefault('method', func.__name__)
+            histogram = self.histogram(name, **func_labels)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.record(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        # 原地清零，装饰器里缓存的直方图继续有效
+        for histogram in list(self.histograms.values()):
+            histogram.reset()
+
+    def snapshot(self):
+        """JSON 友好的统计结果，延迟单位为秒"""
+        result = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if not histogram.count:
+                continue
+            result.append(dict(name=name, labels=dict(labels), **histogram.summary()))
+        snapshot = {'timestamp': time.time(), 'metrics': result}
+        if self.profiler is not None:
+            snapshot['profile'] = self.profiler.report()
+        return snapshot
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """Prometheus 文本格式，每个指标导出为 summary（p50/p95/p99、_sum、_count）"""
+        lines = []
+        by_name = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if not histogram.count:
+                continue
+            by_name.setdefault(name, []).append((labels, histogram))
+        for name, series in by_name.items():
+            metric = f'{self.prefix}_{name}_seconds'
+            lines.append(f'# TYPE {metric} summary')
+            for labels, histogram in series:
+                base = ','.join(f'{k}="{v}"' for k, v in labels)
+                sep = ',' if base else ''
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{{base}{sep}quantile="{q}"}} {histogram.quantile(q):.9f}')
+                suffix = f'{{{base}}}' if base else ''
+                lines.append(f'{metric}_sum{suffix} {histogram.total:.9f}')
+                lines.append(f'{metric}_count{suffix} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path=None):
+        """写出 path.json 和 path.prom 两个文件，返回文件名"""
+        path = path or METRICS_CONFIG['export_path']
+        with open(path + '.json', 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+        with open(path + '.prom', 'w') as f:
+            f.write(self.to_prometheus())
+        return path + '.json', path + '.prom'
+
+    # ---------- 采样分析 ----------
+
+    def start_profiler(self, interval=None):
+        if self.profiler is None:
+            self.profiler = SamplingProfiler(interval or METRICS_CONFIG['profile_interval'])
+            self.profiler.start()
+        return self.profiler
+
+    def stop_profiler(self):
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.stop()
+        return profiler
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程定时读取所有线程的调用栈，统计函数出现次数
+
+    不修改被测代码，开销只与采样频率有关，适合在实盘中临时打开。
+    """
+
+    def __init__(self, interval=0.005, max_depth=30):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._loop, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self):
+        me = threading.get_ident()
+        while self.running:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                self.samples += 1
+                seen = set()
+                depth = 0
+                top = True
+                while frame is not None and depth < self.max_depth:
+                    code = frame.f_code
+                    key = f'{code.co_filename}:{code.co_firstlineno}({code.co_name})'
+                    if top:
+                        self.self_counts[key] += 1
+                        top = False
+                    if key not in seen:
+                        self.total_counts[key] += 1
+                        seen.add(key)
+                    frame = frame.f_back
+                    depth += 1
+            time.sleep(self.interval)
+
+    def report(self, top=20):
+        """按累计占比排序的热点函数，self 为栈顶（函数自身）占比"""
+        samples = max(self.samples, 1)
+        return [{'function': key, 'total': count / samples,
+                 'self': self.self_counts.get(key, 0) / samples}
+                for key, count in self.total_counts.most_common(top)]
+
+
+REGISTRY = MetricsRegistry(enabled=METRICS_CONFIG['enabled'])
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+record = REGISTRY.record
+
+if METRICS_CONFIG['profile']:
+    REGISTRY.start_profiler()
+
+
+def benchmark(calls=200000):
+    """测量计时装饰器本身的开销"""
+    registry = MetricsRegistry()
+
+    def plain():
+        pass
+
+    wrapped = registry.timed('bench')(plain)
+    start = time.perf_counter()
+    for _ in range(calls):
+        plain()
+    base = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        wrapped()
+    elapsed = time.perf_counter() - start
+    return {'calls': calls, 'overhead_us': (elapsed - base) / calls * 1e6,
+            'histogram': registry.snapshot()['metrics'][0]}
+
+
+if __name__ == '__main__':
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,682 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from resampler import MultiTimeframeCandles
+from config import BUS_CONFIG
+
+# 共享内存行情总线：一个发布进程拉取行情写入共享内存，本机任意多个策略进程和界面直接读取
+#
+# 内存布局：
+#   [0, DIRECTORY_SIZE)  魔数 + 目录长度 + JSON 目录（交易对、周期、深度、容量）
+#   计数区               总版本号、发布进程号、最近发布时间
+#   序号区               每个数据块一个序号，各占一个缓存行，避免读写互相干扰
+#   数据区               ticker / 盘口 / K线环形缓冲区，全部为 float64
+#
+# 每个数据块由序号保护（seqlock）：写入前序号加一变为奇数，写完再加一变为偶数。
+# 读取方先读序号，为奇数说明正在写入；读完再读一次序号，不一致说明读到一半被改写，重读。
+# 写入方只有一个，不需要锁，读取方不会阻塞写入方。
+MAGIC = b'OYBUS\x01\x00\x00'
+DIRECTORY_SIZE = 4096
+COUNTERS = 8
+SEQ_STRIDE = 8  # 64 字节
+TICKER_FIELDS = ('timestamp', 'bid', 'ask', 'last', 'open', 'high', 'low', 'baseVolume')
+BOOK_HEADER = 4  # 时间戳、nonce、买盘档数、卖盘档数
+CANDLE_HEADER = 2  # 已写入的K线总数、最近写入时间
+
+
+class BusTimeout(Exception):
+    """读取时写入方一直没有完成写入（通常是发布进程在写入中途崩溃）"""
+
+
+class BusStale(Exception):
+    """发布进程已停止更新，重新挂载后仍然没有新数据"""
+
+
+def _align(n, size=64):
+    return (n + size - 1) // size * size
+
+
+def _layout(directory):
+    """按目录计算每个数据块的 (序号下标, 数据偏移, 长度)，写入方和读取方用同一算法"""
+    depth, capacity = directory['depth'], directory['capacity']
+    blocks = []
+    for symbol in directory['symbols']:
+        blocks.append((('ticker', symbol), len(TICKER_FIELDS)))
+        blocks.append((('book', symbol), BOOK_HEADER + depth * 4))
+        for timeframe in directory['timeframes']:
+            # 每根K线写两份（i % capacity 和 i % capacity + capacity），最近 capacity 根总是连续的
+            blocks.append((('candles', symbol, timeframe), CANDLE_HEADER + capacity * 2 * 6))
+    seq_offset = DIRECTORY_SIZE + COUNTERS * 8
+    offset = _align(seq_offset + len(blocks) * SEQ_STRIDE * 8)
+    layout = {}
+    for i, (key, size) in enumerate(blocks):
+        layout[key] = (i, offset, size)
+        offset = _align(offset + size * 8)
+    return layout, seq_offset, offset
+
+
+# 本进程创建的共享内存，由 resource_tracker 负责在异常退出时清理
+_created = set()
+
+
+def _pid_alive(pid):
+    if os.name != 'posix' or not pid:
+        # Windows 上 os.kill 会结束进程，只按发布时间判断
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _attach(name):
+    """挂载已有的共享内存；读取方不登记到 resource_tracker，否则进程退出时会把共享内存删掉"""
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == 'posix' and shm._name not in _created:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class _Bus:
+    """写入方和读取方共用的内存映射"""
+
+    def _map(self, shm, directory):
+        self.shm = shm
+        self.directory = directory
+        self.symbols = directory['symbols']
+        self.timeframes = directory['timeframes']
+        self.depth = directory['depth']
+        self.capacity = directory['capacity']
+        self.layout, seq_offset, _ = _layout(directory)
+        buf = shm.buf
+        self.counters = np.ndarray(COUNTERS, dtype=np.uint64, buffer=buf, offset=DIRECTORY_SIZE)
+        self.seqs = np.ndarray(len(self.layout) * SEQ_STRIDE, dtype=np.uint64, buffer=buf, offset=seq_offset)
+        self.blocks = {key: np.ndarray(size, dtype=np.float64, buffer=buf, offset=offset)
+                       for key, (_, offset, size) in self.layout.items()}
+        self.seq_index = {key: index * SEQ_STRIDE for key, (index, _, _) in self.layout.items()}
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def version(self):
+        """总版本号，每次发布加一；读取方据此判断有没有新数据"""
+        return int(self.counters[0])
+
+    def _release(self):
+        # 先释放所有 numpy 视图，否则 SharedMemory.close 会因为缓冲区仍被引用而报错
+        self.counters = self.seqs = None
+        self.blocks = {}
+
+
+class MarketBusWriter(_Bus):
+    """共享内存的唯一写入方，由行情发布进程持有；同名的旧共享内存（上次崩溃残留）会被替换"""
+
+    def __init__(self, name=None, symbols=None, timeframes=None, depth=None, capacity=None,
+                 exchange_name=None):
+        directory = {
+            'symbols': list(symbols or BUS_CONFIG['symbols']),
+            'timeframes': list(timeframes or BUS_CONFIG['timeframes']),
+            'depth': depth or BUS_CONFIG['depth'],
+            'capacity': capacity or BUS_CONFIG['capacity'],
+            'exchange_name': exchange_name,
+            'created': time.time()
+        }
+        encoded = json.dumps(directory, ensure_ascii=False).encode()
+        if len(encoded) > DIRECTORY_SIZE - 16:
+            raise ValueError('交易对或周期太多，目录超出共享内存头部大小')
+        _, _, size = _layout(directory)
+        name = name or BUS_CONFIG['name']
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created.add(shm._name)
+        shm.buf[:size] = bytes(size)
+        self._map(shm, directory)
+        self.counters[1] = os.getpid()
+        # 目录最后写入，读取方看到魔数时目录已经完整
+        shm.buf[8:16] = np.array([len(encoded), 0], dtype=np.uint32).tobytes()
+        shm.buf[16:16 + len(encoded)] = encoded
+        shm.buf[:8] = MAGIC
+        self.closed = False
+
+    def _begin(self, key):
+        index = self.seq_index[key]
+        self.seqs[index] += 1
+        return index
+
+    def _end(self, index):
+        self.seqs[index] += 1
+        self.counters[0] += 1
+        self.counters[2] = time.time_ns()
+
+    def publish_ticker(self, symbol, ticker):
+        values = [float(ticker.get(field) or 0.0) for field in TICKER_FIELDS]
+        block = self.blocks[('ticker', symbol)]
+        index = self._begin(('ticker', symbol))
+        block[:] = values
+        self._end(index)
+
+    def publish_book(self, symbol, book):
+        depth = self.depth
+        bids = np.asarray(book['bids'][:depth], dtype=np.float64).reshape(-1, 2)[:, :2]
+        asks = np.asarray(book['asks'][:depth], dtype=np.float64).reshape(-1, 2)[:, :2]
+        block = self.blocks[('book', symbol)]
+        index = self._begin(('book', symbol))
+        block[:BOOK_HEADER] = (book.get('timestamp') or 0, book.get('nonce') or 0, len(bids), len(asks))
+        start = BOOK_HEADER
+        block[start:start + bids.size] = bids.ravel()
+        start += depth * 2
+        block[start:start + asks.size] = asks.ravel()
+        self._end(index)
+
+    def publish_candles(self, symbol, timeframe, ohlcv):
+        """合并最近的K线：与已有数据重叠时只改写最后一根并追加新K线，否则整体重置
+
+        返回 'update'、'append' 或 'reset'，没有数据时返回 None。
+        """
+        bars = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(bars) == 0:
+            return None
+        key = ('candles', symbol, timeframe)
+        block = self.blocks[key]
+        capacity = self.capacity
+        rows = block[CANDLE_HEADER:].reshape(capacity * 2, 6)
+        count = int(block[0])
+        last = rows[(count - 1) % capacity, 0] if count else None
+        k = int(np.searchsorted(bars[:, 0], last)) if last is not None else -1
+        if k < 0 or k >= len(bars) or bars[k, 0] != last:
+            mode, first, new = 'reset', 0, bars
+        else:
+            mode, first, new = ('append' if len(bars) - k > 1 else 'update'), count - 1, bars[k:]
+        if len(new) > capacity:
+            first += len(new) - capacity
+            new = new[-capacity:]
+        positions = (first + np.arange(len(new))) % capacity
+        index = self._begin(key)
+        rows[positions] = new
+        rows[positions + capacity] = new
+        block[0] = first + len(new)
+        block[1] = time.time() * 1000
+        self._end(index)
+        return mode
+
+    def close(self, unlink=True):
+        if self.closed:
+            return
+        self.closed = True
+        self._release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _created.discard(self.shm._name)
+
+
+class MarketBusReader(_Bus):
+    """挂载行情总线的读取方，可以在任意多个进程中同时使用
+
+    ticker / order_book / ohlcv 在序号保护下复制出一致的快照；read_candles 直接把
+    共享内存中的K线视图交给回调计算，不复制数据（回调可能因为写入冲突被重复调用，
+    不能有副作用，也不能把视图保存到回调之外）。
+    """
+
+    def __init__(self, name=None, timeout=None, spin=None):
+        self.bus_name = name or BUS_CONFIG['name']
+        self.shm = _attach(self.bus_name)
+        buf = self.shm.buf
+        if bytes(buf[:8]) != MAGIC:
+            self.shm.close()
+            raise ValueError(f'{self.shm.name} 不是行情总线或尚未初始化')
+        length = int(np.frombuffer(bytes(buf[8:12]), dtype=np.uint32)[0])
+        self._map(self.shm, json.loads(bytes(buf[16:16 + length]).decode()))
+        self.exchange_name = self.directory.get('exchange_name')
+        self.timeout = BUS_CONFIG['read_timeout'] if timeout is None else timeout
+        self.spin = BUS_CONFIG['spin'] if spin is None else spin
+        self.retries = 0
+
+    @property
+    def publisher_pid(self):
+        return int(self.counters[1])
+
+    @property
+    def last_publish(self):
+        """最近一次发布的时间（秒），还没有发布过时为 None"""
+        ns = int(self.counters[2])
+        return ns / 1e9 if ns else None
+
+    def alive(self, max_age=None):
+        """发布进程是否还在发布：最近 max_age 秒内有过发布，且发布进程还在运行
+
+        发布进程重启后会换一段同名的共享内存，挂在旧内存上的读取方从这里发现数据已经不再更新。
+        """
+        last = self.last_publish
+        max_age = BUS_CONFIG['max_age'] if max_age is None else max_age
+        if last is None or time.time() - last > max_age:
+            return False
+        return _pid_alive(self.publisher_pid)
+
+    def reopen(self, max_age=None):
+        """重新挂载同名的总线，返回新的读取方；总线不存在或同样没有在发布时返回 None"""
+        try:
+            reader = MarketBusReader(self.bus_name, self.timeout, self.spin)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not reader.alive(max_age):
+            reader.close()
+            return None
+        return reader
+
+    def sequence(self, key):
+        return int(self.seqs[self.seq_index[key]])
+
+    def _read(self, key, func):
+        """在序号保护下调用 func(数据块)，直到读到一致的结果"""
+        seqs = self.seqs
+        index = self.seq_index[key]
+        block = self.blocks[key]
+        deadline = None
+        spins = 0
+        while True:
+            before = int(seqs[index])
+            if not before & 1:
+                result = func(block)
+                if int(seqs[index]) == before:
+                    return result
+            self.retries += 1
+            spins += 1
+            if spins >= self.spin:
+                # 写入方可能没有拿到CPU，让出时间片；超时说明写入方中途退出了
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                elif now > deadline:
+                    raise BusTimeout(f'{key} 的写入一直没有完成')
+                time.sleep(0)
+
+    def wait(self, version, timeout=None, poll=None):
+        """等待总版本号超过 version，返回新的版本号；超时返回当前版本号"""
+        poll = BUS_CONFIG['poll_interval'] if poll is None else poll
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = int(self.counters[0])
+            if current != version:
+                return current
+            if deadline is not None and time.monotonic() >= deadline:
+                return current
+            time.sleep(poll)
+
+    def ticker(self, symbol):
+        """最新 ticker，字段见 TICKER_FIELDS；还没有发布时返回 None"""
+        values = self._read(('ticker', symbol), lambda block: block.tolist())
+        if not values[0]:
+            return None
+        ticker = dict(zip(TICKER_FIELDS, values))
+        ticker['symbol'] = symbol
+        ticker['timestamp'] = int(ticker['timestamp'])
+        ticker['close'] = ticker['last']
+        return ticker
+
+    def order_book(self, symbol):
+        """最新盘口，bids / asks 为 (N, 2) 数组；还没有发布时返回 None"""
+        depth = self.depth
+
+        def copy(block):
+            n_bids, n_asks = int(block[2]), int(block[3])
+            start = BOOK_HEADER + depth * 2
+            return (block[0], block[1], block[BOOK_HEADER:BOOK_HEADER + n_bids * 2].reshape(-1, 2).copy(),
+                    block[start:start + n_asks * 2].reshape(-1, 2).copy())
+
+        timestamp, nonce, bids, asks = self._read(('book', symbol), copy)
+        if not timestamp:
+            return None
+        return {'symbol': symbol, 'timestamp': int(timestamp), 'nonce': int(nonce), 'bids': bids, 'asks': asks}
+
+    def _window(self, block, limit):
+        capacity = self.capacity
+        count = int(block[0])
+        n = min(count, capacity, capacity if limit is None else limit)
+        end = (count - 1) % capacity + capacity + 1 if count else capacity
+        return block[CANDLE_HEADER:].reshape(capacity * 2, 6)[end - n:end]
+
+    def read_candles(self, symbol, timeframe, func, limit=None):
+        """把最近 limit 根K线的共享内存视图 (N, 6) 交给 func，返回 func 的结果"""
+        return self._read(('candles', symbol, timeframe), lambda block: func(self._window(block, limit)))
+
+    def ohlcv(self, symbol, timeframe, limit=None):
+        """最近 limit 根K线的拷贝 (N, 6)，列顺序与 ccxt 相同"""
+        return self.read_candles(symbol, timeframe, np.array, limit)
+
+    def close(self):
+        self._release()
+        self.shm.close()
+
+    def retire(self):
+        """换用新的读取方后关闭旧的；其他线程还在读时留给垃圾回收"""
+        try:
+            self.close()
+        except BufferError:
+            pass
+
+
+class BusExchange:
+    """用行情总线代替 ExchangeInterface 的行情接口，策略和界面不用改代码就能共用一个发布进程
+
+    总线上没有的交易对、周期，或者带 since 的历史查询转给 exchange；
+    下单、查余额等其他方法也直接转发给 exchange。
+    发布进程超过 max_age 秒没有发布时先重新挂载（发布进程可能已重启），
+    仍然没有新数据就转给 exchange，没有 exchange 时抛出 BusStale。
+    """
+
+    def __init__(self, reader, exchange=None, max_age=None):
+        self.reader = reader
+        self.inner = exchange
+        self.exchange_name = reader.exchange_name or getattr(exchange, 'exchange_name', None)
+        self.max_age = BUS_CONFIG['max_age'] if max_age is None else max_age
+        self.proxy = None
+        self.fallbacks = 0
+        self.reattached = 0
+        self._reopen_at = 0.0
+
+    def _current(self):
+        """发布中的读取方，总线已停止更新时返回 None"""
+        reader = self.reader
+        if reader.alive(self.max_age):
+            return reader
+        now = time.monotonic()
+        if now >= self._reopen_at:
+            # 每秒最多重新挂载一次，发布进程卡住时不会每次调用都重新映射共享内存
+            self._reopen_at = now + 1.0
+            fresh = reader.reopen(self.max_age)
+            if fresh is not None:
+                self.reader = fresh
+                self.reattached += 1
+                reader.retire()
+                return fresh
+        if self.inner is None:
+            raise BusStale(f'行情总线 {reader.bus_name} 超过 {self.max_age} 秒没有更新')
+        return None
+
+    def __getattr__(self, name):
+        if self.inner is None:
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _fallback(self, method, *args):
+        if self.inner is None:
+            raise KeyError(f'行情总线上没有 {args[0]} 的数据')
+        self.fallbacks += 1
+        return getattr(self.inner, method)(*args)
+
+    def set_proxy(self, proxy_settings):
+        self.proxy = proxy_settings
+        if self.inner is not None:
+            self.inner.set_proxy(proxy_settings)
+
+    def get_ticker(self, symbol):
+        reader = self._current()
+        ticker = reader.ticker(symbol) if reader is not None and symbol in reader.symbols else None
+        return ticker if ticker is not None else self._fallback('get_ticker', symbol)
+
+    def get_order_book(self, symbol):
+        reader = self._current()
+        book = reader.order_book(symbol) if reader is not None and symbol in reader.symbols else None
+        if book is None:
+            return self._fallback('get_order_book', symbol)
+        book['bids'] = book['bids'].tolist()
+        book['asks'] = book['asks'].tolist()
+        return book
+
+    def get_market_data(self, symbol):
+        return {
+            'ticker': self.get_ticker(symbol),
+            'orderbook': self.get_order_book(symbol)
+        }
+
+    def get_ohlcv(self, symbol, timeframe='1m', limit=100, since=None):
+        reader = self._current() if since is None else None
+        if reader is not None and symbol in reader.symbols and timeframe in reader.timeframes:
+            data = reader.ohlcv(symbol, timeframe, limit)
+            if len(data):
+                return data.tolist()
+        return self._fallback('get_ohlcv', symbol, timeframe, limit, since)
+
+
+class MarketDataPublisher:
+    """行情发布进程：定时拉取 ticker、盘口和基础周期K线，本地合成其余周期后写入总线
+
+    每个交易对每轮只发出三次请求，与读取方的数量无关。
+    """
+
+    def __init__(self, exchange_interface, symbols=None, timeframes=None, name=None, interval=None,
+                 depth=None, capacity=None, poll_limit=None):
+        self.exchange = exchange_interface
+        self.symbols = list(symbols or BUS_CONFIG['symbols'])
+        self.timeframes = list(timeframes or BUS_CONFIG['timeframes'])
+        self.interval = BUS_CONFIG['interval'] if interval is None else interval
+        self.poll_limit = poll_limit or BUS_CONFIG['poll_limit']
+        self.writer = MarketBusWriter(name, self.symbols, self.timeframes, depth, capacity,
+                                      exchange_name=exchange_interface.exchange_name)
+        self.candles = {s: MultiTimeframeCandles(self.timeframes, max_bars=self.writer.capacity)
+                        for s in self.symbols}
+        self.base_timeframe = self.candles[self.symbols[0]].base_timeframe
+        # 首次拉取足够合成 capacity 根最大周期K线的基础K线，之后每轮只拉最近几根
+        largest = max(self.timeframes, key=lambda tf: self.candles[self.symbols[0]].base_bars_needed(tf, 1))
+        self.initial_limit = min(self.candles[self.symbols[0]].base_bars_needed(largest, self.writer.capacity),
+                                 BUS_CONFIG['max_initial_bars'])
+        self.logger = logging.getLogger('行情总线')
+        self.stop_event = threading.Event()
+        self.cycles = 0
+        self.errors = 0
+
+    @property
+    def name(self):
+        return self.writer.name
+
+    def _publish_candles(self, symbol):
+        candles = self.candles[symbol]
+        first = candles.last_timestamp is None
+        base = self.exchange.get_ohlcv(symbol, self.base_timeframe,
+                                       limit=self.initial_limit if first else self.poll_limit)
+        previous = candles.last_timestamp
+        mode = candles.update_ohlcv(base)
+        if mode == 'load' and not first:
+            # 和已有K线接不上（例如发布进程卡住太久），重新拉取完整历史
+            base = self.exchange.get_ohlcv(symbol, self.base_timeframe, limit=self.initial_limit)
+            candles.load(base)
+        if mode is None:
+            return
+        if mode == 'load':
+            tail = None
+        else:
+            # 新增的基础K线最多让每个周期多出同样多根K线
+            tail = sum(1 for bar in base if bar[0] > previous) + 1
+        for timeframe in self.timeframes:
+            self.writer.publish_candles(symbol, timeframe, candles.get(timeframe, tail))
+
+    def run_once(self):
+        for symbol in self.symbols:
+            self.writer.publish_ticker(symbol, self.exchange.get_ticker(symbol))
+            self.writer.publish_book(symbol, self.exchange.get_order_book(symbol))
+            self._publish_candles(symbol)
+        self.cycles += 1
+
+    def run(self):
+        self.logger.info(f'行情总线 {self.name} 已启动: {self.symbols} {self.timeframes}')
+        try:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self.errors += 1
+                    self.logger.error(f'行情拉取出错: {e}')
+                self.stop_event.wait(max(self.interval - (time.monotonic() - started), 0))
+        finally:
+            self.close()
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def close(self):
+        self.writer.close()
+        self.logger.info(f'行情总线已关闭，共发布 {self.cycles} 轮，错误 {self.errors} 次')
+
+
+def _bench_reader(name, symbol, timeframe, updates, result_queue):
+    """基准测试的读取进程：等待每次更新，记录发布到读取的延迟，并检查有没有读到写了一半的数据"""
+    reader = MarketBusReader(name)
+    latencies = []
+    torn = 0
+    version = reader.version
+    while len(latencies) < updates:
+        version = reader.wait(version, timeout=5.0)
+        ticker = reader.ticker(symbol)
+        if ticker is None:
+            continue
+        latencies.append(time.monotonic_ns() / 1e6 - ticker['timestamp'])
+        # 发布方写入 bid = last - 1、ask = last + 1，撕裂的读取会破坏这个关系
+        if ticker['bid'] != ticker['last'] - 1 or ticker['ask'] != ticker['last'] + 1:
+            torn += 1
+        if ticker['high'] < 0:
+            break
+    reads = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < 0.2:
+        reader.ohlcv(symbol, timeframe, 100)
+        reads += 1
+    result_queue.put({'latencies': latencies, 'torn': torn, 'retries': reader.retries,
+                      'candle_reads_per_sec': reads / (time.perf_counter() - started)})
+    reader.close()
+
+
+def benchmark(readers=4, updates=500, seed=0):
+    """单进程读写开销，以及多个读取进程同时订阅时的延迟、吞吐和一致性"""
+    import multiprocessing
+    from fake_exchange import FakeExchange, generate_ohlcv
+    name = f'ouyi_bench_{os.getpid()}'
+    exchange = FakeExchange(generate_ohlcv(20000, seed=seed), cursor=10000)
+    publisher = MarketDataPublisher(exchange, ['BTC/USDT'], ['1m', '5m', '15m', '1h'], name=name,
+                                    capacity=1000)
+    writer = publisher.writer
+    result = {'readers': readers}
+    try:
+        publisher.run_once()
+        reader = MarketBusReader(name)
+        bus = BusExchange(reader, exchange)
+        for timeframe in ('1m', '5m', '15m', '1h'):
+            expected = exchange.get_ohlcv('BTC/USDT', timeframe, limit=50)
+            assert np.allclose(bus.get_ohlcv('BTC/USDT', timeframe, 50), expected), timeframe
+        for _ in range(300):
+            exchange.advance()
+            publisher.run_once()
+        expected = exchange.get_ohlcv('BTC/USDT', '5m', limit=1000)
+        assert np.allclose(reader.ohlcv('BTC/USDT', '5m'), expected)
+        assert bus.get_order_book('BTC/USDT') == {k: v for k, v in exchange.get_order_book('BTC/USDT').items()}
+
+        def rate(func, n=20000):
+            start = time.perf_counter()
+            for _ in range(n):
+                func()
+            return (time.perf_counter() - start) / n * 1e6
+
+        ticker = exchange.get_ticker('BTC/USDT')
+        book = exchange.get_order_book('BTC/USDT')
+        bar = exchange.get_ohlcv('BTC/USDT', limit=1)
+        result['write_us'] = {
+            'ticker': rate(lambda: writer.publish_ticker('BTC/USDT', ticker)),
+            'book': rate(lambda: writer.publish_book('BTC/USDT', book)),
+            'candle_update': rate(lambda: writer.publish_candles('BTC/USDT', '1m', bar))
+        }
+        result['read_us'] = {
+            'ticker': rate(lambda: reader.ticker('BTC/USDT')),
+            'book': rate(lambda: reader.order_book('BTC/USDT')),
+            'candles_copy_100': rate(lambda: reader.ohlcv('BTC/USDT', '1m', 100)),
+            'candles_zero_copy_mean_100': rate(
+                lambda: reader.read_candles('BTC/USDT', '1m', lambda a: a[:, 4].mean(), 100)),
+            'exchange_get_ohlcv_100': rate(lambda: exchange.get_ohlcv('BTC/USDT', limit=100), 2000)
+        }
+        bus = None
+        reader.close()
+
+        # 多进程扇出：发布方按 1ms 间隔写 ticker，读取进程等待并读取每次更新
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_bench_reader,
+                                             args=(name, 'BTC/USDT', '1m', updates, queue))
+                     for _ in range(readers)]
+        for p in processes:
+            p.start()
+        time.sleep(0.5)
+        started = time.perf_counter()
+        for i in range(updates + 50):
+            last = 30000.0 + i
+            writer.publish_ticker('BTC/USDT', {'timestamp': time.monotonic_ns() / 1e6, 'last': last,
+                                               'bid': last - 1, 'ask': last + 1, 'high': 1.0})
+            time.sleep(0.001)
+        writer.publish_ticker('BTC/USDT', {'timestamp': time.monotonic_ns() / 1e6, 'last': 1.0,
+                                           'bid': 0.0, 'ask': 2.0, 'high': -1.0})
+        publish_seconds = time.perf_counter() - started
+        reports = [queue.get(timeout=30) for _ in processes]
+        for p in processes:
+            p.join()
+        latencies = np.concatenate([r['latencies'] for r in reports])
+        result['fan_out'] = {
+            'updates': updates,
+            'publish_per_sec': (updates + 50) / publish_seconds,
+            'latency_ms_p50': float(np.percentile(latencies, 50)),
+            'latency_ms_p99': float(np.percentile(latencies, 99)),
+            'torn_reads': sum(r['torn'] for r in reports),
+            'seqlock_retries': sum(r['retries'] for r in reports),
+            'candle_reads_per_sec_total': sum(r['candle_reads_per_sec'] for r in reports)
+        }
+        assert result['fan_out']['torn_reads'] == 0
+        # 不用总线时每个进程各自轮询交易所，请求数随进程数线性增长
+        result['exchange_requests_per_cycle'] = {'bus': 3, 'per_process_polling': 3 * readers}
+    finally:
+        publisher.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='共享内存行情发布进程')
+    parser.add_argument('--exchange', default='okx')
+    parser.add_argument('--symbols', default=None, help='逗号分隔，默认见 BUS_CONFIG')
+    parser.add_argument('--timeframes', default=None, help='逗号分隔，默认见 BUS_CONFIG')
+    parser.add_argument('--name', default=None, help='共享内存名称')
+    parser.add_argument('--interval', type=float, default=None)
+    parser.add_argument('--live', action='store_true', help='实盘行情（默认模拟盘）')
+    parser.add_argument('--proxy', default=None)
+    parser.add_argument('--benchmark', action='store_true', help='用替身交易所跑基准测试')
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        print(json.dumps(benchmark(), indent=2))
+        return
+
+    import signal
+    from exchange_interface import ExchangeInterface
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    exchange = ExchangeInterface(args.exchange, simulated=not args.live, proxy=args.proxy,
+                                 use_proxy=args.proxy is not None)
+    publisher = MarketDataPublisher(exchange, args.symbols and args.symbols.split(','),
+                                    args.timeframes and args.timeframes.split(','),
+                                    name=args.name, interval=args.interval)
+    signal.signal(signal.SIGINT, publisher.stop)
+    signal.signal(signal.SIGTERM, publisher.stop)
+    publisher.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import threading
+import time
+from concurrent.futures import Future
+
+# 各接口的缓存有效期（秒）
+DEFAULT_TTL = {
+    'ticker': 1.0,
+    'orderbook': 0.5,
+    'ohlcv': 2.0,
+    'balance': 5.0
+}
+
+
+class CachedExchange:
+    """ExchangeInterface 的线程安全缓存层，策略和界面共用以减少请求次数
+
+    同一数据在有效期内直接返回缓存；多个线程同时请求同一数据时只发出一次HTTP请求，
+    其余线程等待该请求的结果。其他属性和方法直接转发给被包装的 ExchangeInterface。
+    写入新数据时顺带清理过期条目（最多每个最短有效期一次），分页拉取K线时
+    每个 since 一个键，不清理的话缓存会无限增长。
+    """
+
+    def __init__(self, exchange_interface, ttl=None):
+        self.inner = exchange_interface
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._inflight = {}
+        self._next_sweep = 0.0
+        self._stats = {endpoint: {'hits': 0, 'misses': 0, 'coalesced': 0} for endpoint in self.ttl}
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def _get(self, endpoint, key, fetch):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._stats[endpoint]['hits'] += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._stats[endpoint]['misses'] += 1
+            else:
+                self._stats[endpoint]['coalesced'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._evict(now)
+            self._cache[key] = (now + self.ttl[endpoint], value)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def get_ticker(self, symbol):
+        return self._get('ticker', ('ticker', symbol), lambda: self.inner.get_ticker(symbol))
+
+    def get_order_book(self, symbol):
+        return self._get('orderbook', ('orderbook', symbol), lambda: self.inner.get_order_book(symbol))
+
+    def get_market_data(self, symbol):
+        return {
+            'ticker': self.get_ticker(symbol),
+            'orderbook': self.get_order_book(symbol)
+        }
+
+    def get_ohlcv(self, symbol, timeframe='1m', limit=100, since=None):
+        key = ('ohlcv', symbol, timeframe, limit, since)
+        return self._get('ohlcv', key, lambda: self.inner.get_ohlcv(symbol, timeframe, limit, since))
+
+    def get_balance(self):
+        return self._get('balance', ('balance',), self.inner.get_balance)
+
+    def create_order(self, *args, **kwargs):
+        # 下单会改变余额，清除余额缓存
+        order = self.inner.create_order(*args, **kwargs)
+        self.invalidate('balance')
+        return order
+
+    # 执行引擎直接调用下面三个接口；请求超时时订单也可能已经落地或成交，出错同样清除余额缓存
+
+    def submit_order(self, *args, **kwargs):
+        try:
+            return self.inner.submit_order(*args, **kwargs)
+        finally:
+            self.invalidate('balance')
+
+    def cancel_order_by_client_id(self, *args, **kwargs):
+        try:
+            return self.inner.cancel_order_by_client_id(*args, **kwargs)
+        finally:
+            self.invalidate('balance')
+
+    def fetch_order_by_client_id(self, *args, **kwargs):
+        # 查询到新的成交说明余额已经变了
+        try:
+            return self.inner.fetch_order_by_client_id(*args, **kwargs)
+        finally:
+            self.invalidate('balance')
+
+    def _evict(self, now):
+        """删除已过期的条目，调用方持有 _lock"""
+        for key in [k for k, entry in self._cache.items() if entry[0] <= now]:
+            del self._cache[key]
+        self._next_sweep = now + min(self.ttl.values())
+
+    def invalidate(self, endpoint=None):
+        """清除指定接口或全部缓存"""
+        with self._lock:
+            if endpoint is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == endpoint]:
+                    del self._cache[key]
+
+    def stats(self):
+        """各接口的命中、未命中和合并请求次数"""
+        with self._lock:
+            result = {}
+            for endpoint, counts in self._stats.items():
+                total = counts['hits'] + counts['misses'] + counts['coalesced']
+                result[endpoint] = dict(counts, hit_rate=(total - counts['misses']) / total if total else 0.0)
+            return result
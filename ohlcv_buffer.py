@@ -0,0 +1,150 @@
+import time
+import numpy as np
+
+# K线字段全部为 float64，结构化数组可以零拷贝地看作 (N, 6) 的二维数组
+OHLCV_DTYPE = np.dtype([('time', '<f8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                        ('close', '<f8'), ('volume', '<f8')])
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class OHLCVBuffer:
+    """预分配的K线环形缓冲区，界面绘图和指标共用，刷新时不再重建 DataFrame
+
+    最多保留 window 根K线，底层数组容量为 2 * window：写满后把最近 window 根
+    搬回开头（均摊 O(1)），所以任何时刻有效数据都是连续的一段，
+    array / dataframe 返回的都是视图而不是拷贝。时间索引另存一份 datetime64[ns]，
+    同样原地维护，DatetimeIndex 直接引用它。
+
+    视图在下一次 update 之后内容可能变化，只在同一线程内、下次更新前使用。
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.records = np.zeros(window * 2, dtype=OHLCV_DTYPE)
+        self.values = self.records.view(np.float64).reshape(-1, 6)
+        self.index = np.zeros(window * 2, dtype='datetime64[ns]')
+        self.start = 0
+        self.end = 0
+        self.key = None
+        self.resets = 0
+        self.appends = 0
+        self.updates = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def last_timestamp(self):
+        return self.values[self.end - 1, 0] if self.end > self.start else None
+
+    def clear(self, key=None):
+        self.start = self.end = 0
+        self.key = key
+
+    def _compact(self, extra):
+        """保证尾部还能写入 extra 行，必要时丢弃最旧的K线"""
+        if self.end + extra <= len(self.values):
+            return
+        keep = min(self.end - self.start, self.window - extra)
+        keep = max(keep, 0)
+        src = self.end - keep
+        self.values[:keep] = self.values[src:self.end]
+        self.index[:keep] = self.index[src:self.end]
+        self.start, self.end = 0, keep
+
+    def _write(self, row, bars):
+        self.values[row:row + len(bars)] = bars
+        self.index[row:row + len(bars)] = (bars[:, 0] * 1e6).astype('datetime64[ns]')
+
+    def update(self, ohlcv, key=None):
+        """合并交易所返回的K线（ccxt 的列表或 (N, 6) 数组）
+
+        与已有数据重叠时只原地改写最后一根并追加新K线，不重叠、时间倒退
+        或 key（例如交易对和周期）变化时整体重置。返回 'update'、'append'、'reset'，
+        没有数据时返回 None。
+        """
+        bars = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(bars) == 0:
+            return None
+        if len(bars) > self.window:
+            bars = bars[-self.window:]
+        last = self.last_timestamp
+        k = int(np.searchsorted(bars[:, 0], last)) if last is not None and key == self.key else -1
+        if k < 0 or k >= len(bars) or bars[k, 0] != last:
+            self.key = key
+            self.start = 0
+            self.end = len(bars)
+            self._write(0, bars)
+            self.resets += 1
+            return 'reset'
+        new = bars[k:]
+        self._compact(len(new) - 1)
+        self._write(self.end - 1, new)
+        self.end += len(new) - 1
+        if self.end - self.start > self.window:
+            self.start = self.end - self.window
+        if len(new) > 1:
+            self.appends += 1
+            return 'append'
+        self.updates += 1
+        return 'update'
+
+    def array(self, last=None):
+        """(N, 6) 的K线视图，列顺序与 ccxt 相同"""
+        start = self.start if last is None else max(self.end - last, self.start)
+        return self.values[start:self.end]
+
+    def column(self, name, last=None):
+        start = self.start if last is None else max(self.end - last, self.start)
+        return self.records[name][start:self.end]
+
+    def dataframe(self, last=None):
+        """以时间为索引的 DataFrame，数据和索引都直接引用缓冲区，供 mplfinance 绘图"""
+        import pandas as pd
+        start = self.start if last is None else max(self.end - last, self.start)
+        index = pd.DatetimeIndex(self.index[start:self.end], name='time', copy=False)
+        return pd.DataFrame(self.values[start:self.end, 1:], index=index, columns=COLUMNS, copy=False)
+
+
+def benchmark(bars=100, frames=2000, seed=0):
+    """对比每次刷新重建 DataFrame 和缓冲区零拷贝视图的耗时与内存分配"""
+    import tracemalloc
+    import pandas as pd
+    from fake_exchange import generate_ohlcv
+    data = generate_ohlcv(bars + frames, seed=seed)
+    # 模拟界面每次刷新拿到的 ccxt 列表：新K线时整体后移，否则只有最后一根变化
+    snapshots = [data[i // 2:i // 2 + bars].tolist() for i in range(frames)]
+
+    def rebuild(ohlcv):
+        df = pd.DataFrame(ohlcv, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
+        df['time'] = pd.to_datetime(df['time'], unit='ms')
+        df.set_index('time', inplace=True)
+        return df
+
+    buffer = OHLCVBuffer(bars)
+
+    def buffered(ohlcv):
+        buffer.update(ohlcv)
+        return buffer.dataframe()
+
+    result = {'bars': bars, 'frames': frames}
+    for name, func in (('rebuild', rebuild), ('buffer', buffered)):
+        buffer.clear()
+        start = time.perf_counter()
+        for ohlcv in snapshots:
+            func(ohlcv)
+        elapsed = time.perf_counter() - start
+        buffer.clear()
+        tracemalloc.start()
+        for ohlcv in snapshots[:200]:
+            func(ohlcv)
+        allocated = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result[name] = {'frame_us': elapsed / frames * 1e6, 'peak_alloc_kb': allocated / 1024}
+    assert np.allclose(rebuild(snapshots[199]).values, buffer.dataframe().values)
+    return result
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,160 @@
+import os
+import json
+import itertools
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, util
+import numpy as np
+from fund_manager import FundManager
+from backtest import compute_signals, simulate, summarize, to_ohlcv_array
+from config import TRADE_PARAMS, FUND_PARAMS
+
+# 默认搜索空间：列表为离散取值，二元组为随机搜索时的连续区间
+DEFAULT_SPACE = {
+    'risk_percent': [1.0, 2.0, 3.0, 5.0],
+    'hold_bars': [15, 30, 60, 240],
+    'win_threshold': [0.2, 0.5, 0.8],
+    'reinvest_risk': [2.0, 5.0, 10.0],
+    'drawdown_threshold': [0.3, 0.5],
+    'reset_threshold': [0.1, 0.2],
+    'liquidation_multiplier': [0.01, 0.02, 0.05]
+}
+
+RANK_KEYS = ('total_return', 'max_drawdown', 'sharpe')
+
+# 工作进程内的共享K线和信号缓存
+_candles = None
+_candles_shm = None
+_signal_cache = {}
+_signal_data = None  # _signal_cache 对应的K线，持有引用保证 is 比较可靠
+
+
+def grid_search(space=None):
+    """展开网格搜索的所有参数组合"""
+    space = space or DEFAULT_SPACE
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_search(space=None, samples=1000, seed=None):
+    """随机抽取参数组合，区间用均匀分布采样"""
+    space = space or DEFAULT_SPACE
+    rng = random.Random(seed)
+    result = []
+    for _ in range(samples):
+        params = {}
+        for key, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                params[key] = rng.randint(low, high) if isinstance(low, int) else rng.uniform(low, high)
+            else:
+                params[key] = rng.choice(values)
+        result.append(params)
+    return result
+
+
+def _init_worker(shm_name, shape):
+    """工作进程启动时挂载共享内存中的K线，之后每个任务只传参数"""
+    global _candles, _candles_shm
+    _close_candles()
+    _candles_shm = shared_memory.SharedMemory(name=shm_name)
+    _candles = np.ndarray(shape, dtype=np.float64, buffer=_candles_shm.buf)
+    # 进程池可能复用 fork 出来的进程状态，旧数据的信号不能带进新的K线
+    _signal_cache.clear()
+    # 工作进程用 os._exit 退出，不执行 atexit；multiprocessing 的终结器会在退出前调用
+    util.Finalize(None, _close_candles, exitpriority=10)
+
+
+def _close_candles():
+    """释放对共享内存的所有引用后关闭映射"""
+    global _candles, _candles_shm, _signal_data
+    _candles = _signal_data = None
+    _signal_cache.clear()
+    if _candles_shm is not None:
+        _candles_shm.close()
+        _candles_shm = None
+
+
+def _run_backtest(params, initial_balance, ohlcv=None):
+    """用一组参数跑一次离线回测，返回参数和指标"""
+    ohlcv = _candles if ohlcv is None else ohlcv
+    fund_params = {k: v for k, v in params.items() if k in FUND_PARAMS}
+    hold_bars = int(params.get('hold_bars', 60))
+    trend_bars = int(params.get('trend_bars', 1))
+    multiplier = fund_params.get('liquidation_multiplier', FUND_PARAMS['liquidation_multiplier'])
+
+    # 信号只取决于K线、持仓周期和爆仓比例；同一份K线内按参数复用，换了K线整体清空
+    global _signal_data
+    if ohlcv is not _signal_data:
+        _signal_cache.clear()
+        _signal_data = ohlcv
+    key = (hold_bars, trend_bars, multiplier)
+    signals = _signal_cache.get(key)
+    if signals is None:
+        signals = compute_signals(ohlcv, hold_bars, trend_bars, multiplier)
+        _signal_cache[key] = signals
+
+    fund_manager = FundManager(initial_balance, fund_params)
+    risk = params.get('risk_percent', TRADE_PARAMS['risk_percent'])
+    _, pnls, _ = simulate(signals['returns'], fund_manager, risk)
+    metrics = summarize(pnls, initial_balance, signals['timestamp'], signals['exit_timestamp'])
+    return dict(params=params, **metrics)
+
+
+def _run_batch(param_sets, initial_balance):
+    return [_run_backtest(params, initial_balance) for params in param_sets]
+
+
+def rank_results(results, by='sharpe'):
+    """按收益率、最大回撤或夏普比率排序，其余两项作为次级排序"""
+    order = [by] + [k for k in RANK_KEYS if k != by]
+
+    def sort_key(result):
+        # 回撤越小越好，其余越大越好
+        return tuple(result[k] if k == 'max_drawdown' else -result[k] for k in order)
+
+    return sorted(results, key=sort_key)
+
+
+class ParameterOptimizer:
+    """多进程参数寻优，K线放在共享内存中供所有工作进程读取"""
+
+    def __init__(self, ohlcv, initial_balance=None, max_workers=None, batch_size=64):
+        self.ohlcv = to_ohlcv_array(ohlcv)
+        self.initial_balance = TRADE_PARAMS['initial_balance'] if initial_balance is None else initial_balance
+        self.max_workers = max_workers or os.cpu_count()
+        self.batch_size = batch_size
+
+    def run(self, param_sets, rank_by='sharpe'):
+        shm = shared_memory.SharedMemory(create=True, size=max(self.ohlcv.nbytes, 1))
+        try:
+            np.ndarray(self.ohlcv.shape, dtype=np.float64, buffer=shm.buf)[:] = self.ohlcv
+            batches = [param_sets[i:i + self.batch_size]
+                       for i in range(0, len(param_sets), self.batch_size)]
+            results = []
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(shm.name, self.ohlcv.shape)) as pool:
+                for batch in pool.map(_run_batch, batches,
+                                      itertools.repeat(self.initial_balance)):
+                    results.extend(batch)
+        finally:
+            shm.close()
+            shm.unlink()
+        return rank_results(results, rank_by)
+
+    def save(self, results, filename='optimizer_results.json', top=100):
+        """保存排名结果，最优参数放在顶层字段，FundManager.load_params 可直接读取
+
+        回测用的初始资金和杠杆只是回测条件，放在 backtest 下，加载时不会覆盖实盘余额和杠杆。
+        """
+        best = results[0]['params'] if results else {}
+        output = {
+            'risk_percent': best.get('risk_percent', TRADE_PARAMS['risk_percent']),
+            'fund_params': {k: v for k, v in best.items() if k in FUND_PARAMS},
+            'hold_bars': best.get('hold_bars', 60),
+            'backtest': {'initial_balance': self.initial_balance, 'leverage': 1},
+            'results': results[:top]
+        }
+        with open(filename, 'w') as f:
+            json.dump(output, f, indent=2)
+        return filename
@@ -0,0 +1,272 @@
+import threading
+import time
+import numpy as np
+
+
+class _BookSide:
+    """单边价位，按 key 升序保存在预分配数组中；买盘用负价格作为 key 以便同样升序"""
+
+    def __init__(self, sign, capacity=256):
+        self.sign = sign
+        self.keys = np.empty(capacity)
+        self.sizes = np.empty(capacity)
+        self.n = 0
+
+    def clear(self):
+        self.n = 0
+
+    def load(self, levels):
+        levels = np.asarray(levels, dtype=np.float64).reshape(-1, 2)[:, :2] if len(levels) else np.empty((0, 2))
+        levels = levels[levels[:, 1] > 0]
+        keys = levels[:, 0] * self.sign
+        order = np.argsort(keys, kind='stable')
+        self._reserve(len(levels))
+        self.keys[:len(levels)] = keys[order]
+        self.sizes[:len(levels)] = levels[order, 1]
+        self.n = len(levels)
+
+    def _reserve(self, n):
+        if n <= len(self.keys):
+            return
+        capacity = max(n, len(self.keys) * 2)
+        keys, sizes = np.empty(capacity), np.empty(capacity)
+        keys[:self.n], sizes[:self.n] = self.keys[:self.n], self.sizes[:self.n]
+        self.keys, self.sizes = keys, sizes
+
+    def set(self, price, size):
+        """设置价位数量，数量为0时删除该价位"""
+        key = price * self.sign
+        n = self.n
+        i = int(np.searchsorted(self.keys[:n], key))
+        if i < n and self.keys[i] == key:
+            if size > 0:
+                self.sizes[i] = size
+            else:
+                self.keys[i:n - 1] = self.keys[i + 1:n]
+                self.sizes[i:n - 1] = self.sizes[i + 1:n]
+                self.n -= 1
+        elif size > 0:
+            self._reserve(n + 1)
+            self.keys[i + 1:n + 1] = self.keys[i:n]
+            self.sizes[i + 1:n + 1] = self.sizes[i:n]
+            self.keys[i] = key
+            self.sizes[i] = size
+            self.n += 1
+
+    def truncate(self, depth):
+        if depth and self.n > depth:
+            self.n = depth
+
+    def best(self):
+        return float(self.keys[0] * self.sign) if self.n else None
+
+    def size_at(self, price):
+        key = price * self.sign
+        i = int(np.searchsorted(self.keys[:self.n], key))
+        return float(self.sizes[i]) if i < self.n and self.keys[i] == key else 0.0
+
+    def prices(self):
+        return self.keys[:self.n] * self.sign
+
+    def vwap(self, size):
+        """吃掉 size 数量的成交均价，深度不足时返回None；size 不为正时返回最优价"""
+        if size <= 0:
+            return self.best()
+        sizes = self.sizes[:self.n]
+        cumulative = np.cumsum(sizes)
+        i = int(np.searchsorted(cumulative, size))
+        if i >= self.n:
+            return None
+        prices = self.keys[:i + 1] * self.sign
+        filled = sizes[:i + 1].copy()
+        filled[-1] -= cumulative[i] - size
+        return float(prices @ filled / size)
+
+    def volume(self, levels):
+        return float(self.sizes[:min(levels, self.n)].sum())
+
+
+class LocalOrderBook:
+    """本地L2订单簿，按序号校验增量更新，发现缺口时用快照重新同步
+
+    序号规则见 apply_update。resync 为返回快照的函数，例如
+    lambda: exchange.get_order_book(symbol)，快照的 nonce（币安 lastUpdateId）作为起始序号；
+    resync 在调用线程里同步执行，事件循环中使用时不传，由调用方异步取快照（见 StreamFeed）。
+
+    写入和查询都在锁内进行，推送线程更新时其他线程（例如下单定价）读到的总是完整的一档。
+    """
+
+    def __init__(self, symbol, depth=None, resync=None):
+        self.symbol = symbol
+        self.depth = depth
+        self.resync = resync
+        self.bids = _BookSide(-1)
+        self.asks = _BookSide(1)
+        self.seq = None
+        self.synced = False
+        self.gaps = 0
+        self.updates = 0
+        self.timestamp = None
+        self.updated_at = None  # 最近一次快照或增量的本地时间（time.monotonic）
+        self._bridging = False  # 快照之后还没有衔接上第一条增量
+        self._lock = threading.Lock()
+
+    def apply_snapshot(self, snapshot, seq=None):
+        """加载完整快照，snapshot 为ccxt格式的订单簿"""
+        with self._lock:
+            self._load(snapshot, seq)
+
+    def _load(self, snapshot, seq=None):
+        self.bids.load(snapshot.get('bids', []))
+        self.asks.load(snapshot.get('asks', []))
+        self.bids.truncate(self.depth)
+        self.asks.truncate(self.depth)
+        self.seq = seq if seq is not None else snapshot.get('nonce')
+        self.timestamp = snapshot.get('timestamp')
+        self.updated_at = time.monotonic()
+        self.synced = True
+        self._bridging = True
+
+    def _check(self, seq, prev_seq, first_seq):
+        """返回 'ok'、'stale'（重复或早于快照，丢弃）或 'gap'"""
+        if seq is None or self.seq is None:
+            return 'ok'
+        if seq <= self.seq:
+            return 'stale'
+        if self._bridging and first_seq is not None:
+            # 快照后的第一条：U <= lastUpdateId + 1 <= u
+            return 'ok' if first_seq <= self.seq + 1 else 'gap'
+        if prev_seq is not None:
+            return 'ok' if prev_seq == self.seq else 'gap'
+        if first_seq is not None:
+            return 'ok' if first_seq == self.seq + 1 else 'gap'
+        return 'ok' if seq == self.seq + 1 else 'gap'
+
+    def apply_update(self, bids, asks, seq=None, prev_seq=None, timestamp=None, first_seq=None):
+        """应用增量更新，返回是否已应用；缺口时用 resync 重新同步
+
+        seq 为本次更新的最后序号。币安传 first_seq=U、seq=u，合约另传 prev_seq=pu：
+        快照之后丢弃 u <= lastUpdateId 的更新，第一条要求 U <= lastUpdateId + 1 <= u，
+        之后按 pu 等于上一条 u（现货为 U 等于上一条 u + 1）衔接。OKX 传 seq=seqId、
+        prev_seq=prevSeqId。只有 seq 时要求连续递增。
+        """
+        with self._lock:
+            status = self._check(seq, prev_seq, first_seq) if self.synced else 'gap'
+            if status == 'gap':
+                if self.synced:
+                    self.gaps += 1
+                    self.synced = False
+                if self.resync is None:
+                    return False
+                self._load(self.resync())
+                # 用新快照重新判断这条更新：早于快照的丢弃，衔接得上的直接应用
+                status = self._check(seq, prev_seq, first_seq)
+            if status != 'ok':
+                return False
+
+            for price, size, *_ in bids:
+                self.bids.set(float(price), float(size))
+            for price, size, *_ in asks:
+                self.asks.set(float(price), float(size))
+            self.bids.truncate(self.depth)
+            self.asks.truncate(self.depth)
+            if seq is not None:
+                self.seq = seq
+            self.timestamp = timestamp
+            self.updated_at = time.monotonic()
+            self._bridging = False
+            self.updates += 1
+            return True
+
+    def age(self):
+        """距最近一次快照或增量的秒数，还没有数据时为 None"""
+        return None if self.updated_at is None else time.monotonic() - self.updated_at
+
+    # ---------- 查询 ----------
+
+    def best_bid(self):
+        with self._lock:
+            return self.bids.best()
+
+    def best_ask(self):
+        with self._lock:
+            return self.asks.best()
+
+    def mid_price(self):
+        with self._lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        return (bid + ask) / 2 if bid is not None and ask is not None else None
+
+    def spread(self):
+        with self._lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        return ask - bid if bid is not None and ask is not None else None
+
+    def depth_at(self, side, price):
+        """指定价位的挂单量，side 为 'bid' 或 'ask'"""
+        with self._lock:
+            return (self.bids if side == 'bid' else self.asks).size_at(price)
+
+    def vwap(self, side, size):
+        """按 size 数量成交的均价；买入吃卖盘，卖出吃买盘"""
+        with self._lock:
+            return (self.asks if side in ('buy', 'long') else self.bids).vwap(size)
+
+    def imbalance(self, levels=5):
+        """前 levels 档买卖量失衡度，范围 [-1, 1]，正数表示买盘更强"""
+        with self._lock:
+            bid, ask = self.bids.volume(levels), self.asks.volume(levels)
+        return (bid - ask) / (bid + ask) if bid + ask > 0 else 0.0
+
+    def entry_price(self, side):
+        """限价单价格：做多取卖一，做空取买一，使挂单能立即成交"""
+        return self.best_ask() if side in ('buy', 'long') else self.best_bid()
+
+
+def benchmark(updates=200000, levels=400, seed=0):
+    """用合成的增量数据回放订单簿，统计每秒处理的更新数和查询耗时"""
+    rng = np.random.default_rng(seed)
+    tick = 0.1
+    mid = 30000.0
+    snapshot = {
+        'bids': [[mid - tick * (i + 1), 1.0] for i in range(levels)],
+        'asks': [[mid + tick * (i + 1), 1.0] for i in range(levels)],
+        'nonce': 0
+    }
+    book = LocalOrderBook('BTC/USDT')
+    book.apply_snapshot(snapshot)
+
+    offsets = rng.integers(1, levels, updates)
+    sizes = np.where(rng.random(updates) < 0.2, 0.0, rng.uniform(0.1, 5, updates))
+    is_bid = rng.random(updates) < 0.5
+    prices = np.where(is_bid, mid - offsets * tick, mid + offsets * tick).round(1)
+    stream = [([(p, s)], []) if b else ([], [(p, s)])
+              for p, s, b in zip(prices.tolist(), sizes.tolist(), is_bid.tolist())]
+
+    start = time.perf_counter()
+    for seq, (bids, asks) in enumerate(stream, 1):
+        book.apply_update(bids, asks, seq)
+    elapsed = time.perf_counter() - start
+
+    queries = 10000
+    start = time.perf_counter()
+    for _ in range(queries):
+        book.best_bid()
+        book.best_ask()
+        book.imbalance()
+        book.vwap('buy', 5.0)
+    query_us = (time.perf_counter() - start) / queries / 4 * 1e6
+
+    return {
+        'updates': updates,
+        'updates_per_sec': updates / elapsed,
+        'avg_update_us': elapsed / updates * 1e6,
+        'avg_query_us': query_us,
+        'bid_levels': book.bids.n,
+        'ask_levels': book.asks.n
+    }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,362 @@
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+import ccxt
+
+# 订单终态
+FINAL_STATUSES = ('closed', 'canceled', 'expired', 'rejected', 'failed')
+
+logger = logging.getLogger('订单执行')
+
+
+def new_client_order_id(prefix='oy'):
+    """生成客户端订单号，OKX要求不超过32位字母数字，币安不超过36位"""
+    return prefix + uuid.uuid4().hex[:32 - len(prefix)]
+
+
+class RetryPolicy:
+    """带上限的指数退避重试，叠加随机抖动避免多个线程同时重试"""
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=10.0, jitter=0.5):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        delay = min(self.base_delay * 2 ** attempt, self.max_delay)
+        return delay * (1 - self.jitter * random.random())
+
+
+def _placement(policy, client_order_id):
+    """下单重试的决策过程，同步和异步下单共用
+
+    产出 (动作, 参数)：'submit' 提交、'fetch' 按客户端订单号查询、'sleep' 等待；
+    调用方执行后把 (结果, 网络异常) 发回。提交失败后先确认订单是否已经落地，
+    查询本身失败时继续查询，不在不确定的情况下重新提交。
+    """
+    attempt = 0
+    while True:
+        order, error = yield 'submit', None
+        if error is None:
+            return order
+        if attempt == policy.max_retries:
+            raise error
+        logger.warning(f'{client_order_id} 下单网络错误: {error}，第{attempt + 1}次重试')
+        while True:
+            yield 'sleep', policy.delay(attempt)
+            attempt += 1
+            existing, error = yield 'fetch', None
+            if error is None:
+                break
+            if attempt == policy.max_retries:
+                raise error
+            logger.warning(f'{client_order_id} 查询订单失败: {error}，确认前不重新提交')
+        if existing is not None:
+            return existing
+
+
+def place_order(exchange, symbol, side, amount, price, client_order_id, policy=None, sleep=time.sleep):
+    """提交订单，网络错误时有限次重试
+
+    每次重试前先按客户端订单号查询，订单其实已经成交或挂单时直接返回，避免重复下单。
+    重试用完仍无法确认时抛出最后一次的网络错误，订单可能已经在交易所挂着。
+    """
+    steps = _placement(policy or RetryPolicy(), client_order_id)
+    action, delay = next(steps)
+    while True:
+        reply = (None, None)
+        if action == 'sleep':
+            sleep(delay)
+        else:
+            try:
+                reply = (exchange.submit_order(symbol, side, amount, price, client_order_id)
+                         if action == 'submit' else exchange.fetch_order_by_client_id(symbol, client_order_id),
+                         None)
+            except ccxt.NetworkError as e:
+                reply = (None, e)
+        try:
+            action, delay = steps.send(reply)
+        except StopIteration as done:
+            return done.value
+
+
+async def place_order_async(exchange, symbol, side, amount, price, client_order_id, policy=None, sleep=None):
+    """place_order 的异步版本，exchange 的 submit_order / fetch_order_by_client_id 为协程"""
+    import asyncio
+    sleep = sleep or asyncio.sleep
+    steps = _placement(policy or RetryPolicy(), client_order_id)
+    action, delay = next(steps)
+    while True:
+        reply = (None, None)
+        if action == 'sleep':
+            await sleep(delay)
+        else:
+            try:
+                reply = (await exchange.submit_order(symbol, side, amount, price, client_order_id)
+                         if action == 'submit' else await exchange.fetch_order_by_client_id(symbol, client_order_id),
+                         None)
+            except ccxt.NetworkError as e:
+                reply = (None, e)
+        try:
+            action, delay = steps.send(reply)
+        except StopIteration as done:
+            return done.value
+
+
+class TrackedOrder:
+    """执行引擎中跟踪的订单，future 在订单到达终态时完成
+
+    quantity 为折算成基础货币的数量；amount 本身就是基础货币数量时为 None。
+    """
+
+    def __init__(self, symbol, side, amount, price, client_order_id, quantity=None):
+        self.symbol = symbol
+        self.side = side
+        self.amount = amount
+        self.price = price
+        self.client_order_id = client_order_id
+        self.quantity = amount if quantity is None else quantity
+        self.status = 'pending'
+        self.order = None
+        self.filled = 0.0
+        self.error = None
+        self.created_at = time.monotonic()
+        self.acked_at = None
+        self.finished_at = None
+        self.polling = False
+        self.future = Future()
+
+    def update(self, order):
+        self.order = order
+        self.status = order.get('status') or 'open'
+        self.filled = order.get('filled') or 0.0
+        if self.acked_at is None:
+            self.acked_at = time.monotonic()
+
+    def finish(self, status=None, error=None):
+        if status:
+            self.status = status
+        self.error = error
+        self.finished_at = time.monotonic()
+        if not self.future.done():
+            self.future.set_result(self)
+
+    @property
+    def done(self):
+        return self.status in FINAL_STATUSES
+
+
+class OrderExecutor:
+    """订单执行引擎：下单和成交查询都在线程池中完成，调用方不会被网络阻塞"""
+
+    def __init__(self, exchange, max_workers=4, retry_policy=None, poll_interval=1.0,
+                 poll_timeout=300.0, on_update=None):
+        self.exchange = exchange
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.poll_interval = poll_interval
+        self.poll_timeout = poll_timeout
+        self.on_update = on_update
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='order')
+        self.orders = {}
+        self._lock = threading.Lock()
+        self._running = True
+        self._tracker = threading.Thread(target=self._track_loop, name='order-tracker', daemon=True)
+        self._tracker.start()
+
+    def submit(self, symbol, side, amount, price, client_order_id=None, quantity=None):
+        """异步下单，立即返回 TrackedOrder；amount 为计价货币金额时用 quantity 给出基础货币数量"""
+        tracked = TrackedOrder(symbol, side, amount, price, client_order_id or new_client_order_id(), quantity)
+        with self._lock:
+            self.orders[tracked.client_order_id] = tracked
+        self.pool.submit(self._place, tracked)
+        return tracked
+
+    def _place(self, tracked):
+        try:
+            order = place_order(self.exchange, tracked.symbol, tracked.side, tracked.amount,
+                                tracked.price, tracked.client_order_id, self.retry_policy)
+            tracked.update(order)
+            if tracked.done:
+                tracked.finish()
+        except ccxt.NetworkError as e:
+            # 无法确认订单是否落地，交给跟踪线程按客户端订单号继续查询，超时后撤单
+            logger.warning(f'{tracked.client_order_id} 下单结果未知: {e}')
+            tracked.status = 'unknown'
+            tracked.error = e
+        except Exception as e:
+            tracked.finish('failed', e)
+        self._notify(tracked)
+
+    def _poll(self, tracked):
+        try:
+            order = self.exchange.fetch_order_by_client_id(tracked.symbol, tracked.client_order_id)
+        except ccxt.NetworkError:
+            return
+        except Exception as e:
+            tracked.finish('failed', e)
+            self._notify(tracked)
+            return
+        finally:
+            tracked.polling = False
+        if order is None:
+            return
+        previous = (tracked.status, tracked.filled)
+        tracked.update(order)
+        if tracked.done:
+            tracked.finish()
+        if (tracked.status, tracked.filled) != previous:
+            self._notify(tracked)
+
+    def _expire(self, tracked):
+        """超时订单先在交易所撤单，再按撤单后的实际状态结束，撤单前成交的部分不会丢失"""
+        try:
+            try:
+                self.exchange.cancel_order_by_client_id(tracked.symbol, tracked.client_order_id)
+            except ccxt.NetworkError:
+                raise
+            except ccxt.InvalidOrder:
+                pass  # 订单已经成交或撤销，以查询结果为准
+            order = self.exchange.fetch_order_by_client_id(tracked.symbol, tracked.client_order_id)
+        except ccxt.NetworkError as e:
+            logger.warning(f'{tracked.client_order_id} 超时撤单失败: {e}，下一轮重试')
+            return
+        except Exception as e:
+            tracked.finish('failed', e)
+            self._notify(tracked)
+            return
+        finally:
+            tracked.polling = False
+        if order is not None:
+            tracked.update(order)
+        tracked.finish(None if tracked.done else 'expired')
+        self._notify(tracked)
+
+    def _track_loop(self):
+        # 定时把所有未完成订单的查询分发到线程池
+        while self._running:
+            now = time.monotonic()
+            for tracked in self.pending():
+                # 下单请求还没返回或上一次查询还没返回的订单本轮跳过
+                if tracked.status == 'pending' or tracked.polling:
+                    continue
+                tracked.polling = True
+                if now - tracked.created_at > self.poll_timeout:
+                    self.pool.submit(self._expire, tracked)
+                else:
+                    self.pool.submit(self._poll, tracked)
+            time.sleep(self.poll_interval)
+
+    def _notify(self, tracked):
+        if self.on_update:
+            self.on_update(tracked)
+
+    def pending(self):
+        with self._lock:
+            return [o for o in self.orders.values() if not o.future.done()]
+
+    def shutdown(self, wait=True):
+        self._running = False
+        self.pool.shutdown(wait=wait)
+
+
+class MockOrderExchange:
+    """离线模拟交易所，可配置网络延迟、失败率和成交延迟，用于执行引擎的基准测试"""
+
+    def __init__(self, latency=0.01, failure_rate=0.0, lost_ack_rate=0.0, fill_delay=0.05, seed=0):
+        self.exchange_name = 'mock'
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.lost_ack_rate = lost_ack_rate
+        self.fill_delay = fill_delay
+        self.rng = random.Random(seed)
+        self.orders = {}
+        self.submit_calls = 0
+        self._lock = threading.Lock()
+
+    def _network(self):
+        time.sleep(self.latency)
+        with self._lock:
+            failed = self.rng.random() < self.failure_rate
+        if failed:
+            raise ccxt.NetworkError('模拟网络错误')
+
+    def _status(self, order):
+        if time.monotonic() - order['created'] >= self.fill_delay:
+            order.update(status='closed', filled=order['amount'])
+        return dict(order)
+
+    def submit_order(self, symbol, side, amount, price, client_order_id=None):
+        self._network()
+        with self._lock:
+            self.submit_calls += 1
+            if client_order_id in self.orders:
+                raise ccxt.InvalidOrder(f'重复的客户端订单号 {client_order_id}')
+            order = {'id': str(len(self.orders) + 1), 'clientOrderId': client_order_id,
+                     'symbol': symbol, 'side': side, 'amount': amount, 'price': price,
+                     'filled': 0.0, 'status': 'open', 'created': time.monotonic()}
+            self.orders[client_order_id] = order
+            lost = self.rng.random() < self.lost_ack_rate
+        if lost:
+            # 订单已经落地但响应丢失
+            raise ccxt.RequestTimeout('模拟响应超时')
+        return dict(order)
+
+    def create_order(self, symbol, side, amount, price, client_order_id=None):
+        return place_order(self, symbol, side, amount, price, client_order_id or new_client_order_id())
+
+    def fetch_order_by_client_id(self, symbol, client_order_id):
+        self._network()
+        with self._lock:
+            order = self.orders.get(client_order_id)
+            return self._status(order) if order else None
+
+    def cancel_order_by_client_id(self, symbol, client_order_id):
+        self._network()
+        with self._lock:
+            order = self.orders.get(client_order_id)
+            if order is None:
+                raise ccxt.OrderNotFound(client_order_id)
+            if self._status(order)['status'] != 'open':
+                raise ccxt.InvalidOrder(f'订单 {client_order_id} 已结束')
+            order['status'] = 'canceled'
+            return dict(order)
+
+
+def benchmark(orders=200, workers=8, latency=0.01, failure_rate=0.05, lost_ack_rate=0.02, fill_delay=0.05):
+    """离线测量下单确认延迟、成交延迟和吞吐量"""
+    exchange = MockOrderExchange(latency, failure_rate, lost_ack_rate, fill_delay)
+    executor = OrderExecutor(exchange, max_workers=workers, poll_interval=0.01,
+                             retry_policy=RetryPolicy(max_retries=5, base_delay=0.01, max_delay=0.1))
+    start = time.monotonic()
+    tracked = [executor.submit('BTC/USDT', 'buy', 0.01, 100.0) for _ in range(orders)]
+    for t in tracked:
+        t.future.result()
+    elapsed = time.monotonic() - start
+    executor.shutdown()
+
+    ack = sorted(t.acked_at - t.created_at for t in tracked if t.acked_at)
+    fill = sorted(t.finished_at - t.created_at for t in tracked if t.status == 'closed')
+
+    def pct(values, q):
+        return values[min(int(len(values) * q), len(values) - 1)] * 1000 if values else None
+
+    return {
+        'orders': orders,
+        'filled': len(fill),
+        'failed': sum(t.status == 'failed' for t in tracked),
+        'duplicates': exchange.submit_calls - len(exchange.orders),
+        'throughput_per_sec': orders / elapsed,
+        'ack_p50_ms': pct(ack, 0.5),
+        'ack_p99_ms': pct(ack, 0.99),
+        'fill_p50_ms': pct(fill, 0.5),
+        'fill_p99_ms': pct(fill, 0.99)
+    }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
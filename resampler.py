@@ -0,0 +1,224 @@
+import time
+import numpy as np
+from candle_store import timeframe_ms
+from config import RESAMPLE_CONFIG
+
+
+def bucket_start(timestamp, period_ms, offset_ms=0):
+    """时间戳所在周期的起点；offset_ms 为时区相对UTC的偏移，日线等按当地零点对齐"""
+    return (timestamp + offset_ms) // period_ms * period_ms - offset_ms
+
+
+def resample(ohlcv, timeframe, offset_ms=0):
+    """把基础周期K线批量合并为 timeframe 周期，最后一根可能是未走完的K线
+
+    输入需按时间排序；缺失的基础K线不会补齐，只影响所在周期的成交量和高低价。
+    """
+    data = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+    if len(data) == 0:
+        return data
+    period = timeframe_ms(timeframe)
+    groups = (data[:, 0] + offset_ms) // period
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+    ends = np.concatenate((starts[1:], [len(data)])) - 1
+    return np.column_stack([
+        groups[starts] * float(period) - offset_ms,
+        data[starts, 1],
+        np.maximum.reduceat(data[:, 2], starts),
+        np.minimum.reduceat(data[:, 3], starts),
+        data[ends, 4],
+        np.add.reduceat(data[:, 5], starts)
+    ])
+
+
+class _Series:
+    """单个周期的合成K线：已完成的K线存在预分配数组里，最后一行是当前周期
+
+    当前周期由已收盘的基础K线（prefix）和最新一根基础K线合成，
+    最新基础K线被修正时只需重新合成最后一行。
+    """
+
+    def __init__(self, timeframe, offset_ms, max_bars):
+        self.timeframe = timeframe
+        self.period = timeframe_ms(timeframe)
+        self.offset = offset_ms
+        self.max_bars = max_bars
+        self.data = np.zeros((max_bars * 2, 6))
+        self.n = 0
+        self.prefix = None  # [开盘, 最高, 最低, 成交量]，当前周期内已收盘的基础K线
+        self.tail = None  # 当前周期内最新的一根基础K线
+
+    def load(self, base, resampled):
+        n = min(len(resampled), self.max_bars)
+        self.data[:n] = resampled[len(resampled) - n:]
+        self.n = n
+        # 重建当前周期的状态，之后的增量更新与批量结果一致
+        bucket = self.data[n - 1, 0]
+        inside = base[base[:, 0] >= bucket]
+        self.tail = inside[-1].tolist()
+        closed = inside[:-1]
+        self.prefix = [closed[0, 1], closed[:, 2].max(), closed[:, 3].min(), closed[:, 5].sum()] \
+            if len(closed) else None
+
+    def _combine(self):
+        ts, o, h, l, c, v = self.tail
+        row = self.data[self.n - 1]
+        if self.prefix is None:
+            row[1:] = (o, h, l, c, v)
+        else:
+            po, ph, pl, pv = self.prefix
+            row[1:] = (po, max(ph, h), min(pl, l), c, pv + v)
+
+    def revise(self, bar):
+        self.tail = bar
+        self._combine()
+
+    def append(self, bar):
+        bucket = bucket_start(bar[0], self.period, self.offset)
+        if self.n and self.data[self.n - 1, 0] == bucket:
+            # 同一周期内的新K线：上一根基础K线已收盘，并入 prefix
+            ts, o, h, l, c, v = self.tail
+            if self.prefix is None:
+                self.prefix = [o, h, l, v]
+            else:
+                prefix = self.prefix
+                prefix[1] = max(prefix[1], h)
+                prefix[2] = min(prefix[2], l)
+                prefix[3] += v
+            self.tail = bar
+            self._combine()
+            return False
+        if self.n == len(self.data):
+            self.data[:self.max_bars] = self.data[self.n - self.max_bars:self.n]
+            self.n = self.max_bars
+        self.data[self.n, 0] = bucket
+        self.n += 1
+        self.prefix = None
+        self.tail = bar
+        self._combine()
+        return True
+
+    def view(self, limit=None):
+        start = max(self.n - min(limit or self.max_bars, self.max_bars), 0)
+        return self.data[start:self.n]
+
+
+class MultiTimeframeCandles:
+    """从一条基础周期（默认1分钟）K线流派生多个周期的K线
+
+    update_ohlcv 接收基础周期的最近K线：最后一根变化时 O(周期数) 修正，
+    新K线逐根并入各周期；与已有数据对不上时整体用 resample 批量重算。
+    切换周期只是换一个视图，不需要再请求交易所。
+    """
+
+    def __init__(self, timeframes=None, base_timeframe=None, utc_offset_hours=None, max_bars=None):
+        self.base_timeframe = base_timeframe or RESAMPLE_CONFIG['base_timeframe']
+        self.base_ms = timeframe_ms(self.base_timeframe)
+        offset = RESAMPLE_CONFIG['utc_offset_hours'] if utc_offset_hours is None else utc_offset_hours
+        self.offset_ms = int(offset * 3600000)
+        self.max_bars = max_bars or RESAMPLE_CONFIG['max_bars']
+        timeframes = timeframes or RESAMPLE_CONFIG['timeframes']
+        for timeframe in timeframes:
+            if timeframe_ms(timeframe) % self.base_ms:
+                raise ValueError(f'{timeframe} 不是基础周期 {self.base_timeframe} 的整数倍')
+        self.series = {tf: _Series(tf, self.offset_ms, self.max_bars) for tf in timeframes}
+        self.last_timestamp = None
+        self.loads = 0
+
+    @property
+    def timeframes(self):
+        return list(self.series)
+
+    def load(self, ohlcv):
+        base = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(base) == 0:
+            return
+        for timeframe, series in self.series.items():
+            series.load(base, resample(base, timeframe, self.offset_ms))
+        self.last_timestamp = base[-1, 0]
+        self.loads += 1
+
+    def update_bar(self, bar):
+        """并入一根基础K线（新K线或最后一根的修正），返回 'revise' 或 'append'"""
+        bar = [float(x) for x in bar]
+        if bar[0] == self.last_timestamp:
+            for series in self.series.values():
+                series.revise(bar)
+            return 'revise'
+        for series in self.series.values():
+            series.append(bar)
+        self.last_timestamp = bar[0]
+        return 'append'
+
+    def update_ohlcv(self, ohlcv):
+        """同步基础周期的最近K线，返回 'revise'、'append' 或 'load'"""
+        base = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(base) == 0:
+            return None
+        last = self.last_timestamp
+        k = int(np.searchsorted(base[:, 0], last)) if last is not None else -1
+        if k < 0 or k >= len(base) or base[k, 0] != last:
+            self.load(base)
+            return 'load'
+        mode = 'revise'
+        for bar in base[k:].tolist():
+            if self.update_bar(bar) == 'append':
+                mode = 'append'
+        return mode
+
+    def get(self, timeframe, limit=None):
+        """timeframe 周期最近 limit 根K线的视图，最后一根可能未走完"""
+        return self.series[timeframe].view(limit)
+
+    def is_partial(self, timeframe, now_ms=None):
+        """最后一根K线的周期是否还没结束"""
+        series = self.series[timeframe]
+        if not series.n:
+            return False
+        now_ms = time.time() * 1000 if now_ms is None else now_ms
+        return now_ms < series.data[series.n - 1, 0] + series.period
+
+    def base_bars_needed(self, timeframe, bars):
+        """得到 bars 根 timeframe 周期K线需要的基础K线数量"""
+        return bars * (timeframe_ms(timeframe) // self.base_ms)
+
+
+def benchmark(bars=200000, seed=0):
+    """批量重算和逐根增量更新全部周期的速度，并核对两者结果一致"""
+    from fake_exchange import generate_ohlcv
+    base = generate_ohlcv(bars, seed=seed)
+    candles = MultiTimeframeCandles(max_bars=bars)
+    start = time.perf_counter()
+    candles.load(base)
+    batch = time.perf_counter() - start
+
+    incremental = MultiTimeframeCandles(max_bars=bars)
+    incremental.load(base[:1000])
+    rows = base[1000:].tolist()
+    start = time.perf_counter()
+    for bar in rows:
+        revised = list(bar)
+        revised[4] = bar[1]
+        incremental.update_bar(revised)  # 未收盘时的中间价
+        incremental.update_bar(bar)
+    elapsed = time.perf_counter() - start
+    for timeframe in candles.timeframes:
+        assert np.allclose(candles.get(timeframe), incremental.get(timeframe)), timeframe
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        for timeframe in candles.timeframes:
+            candles.get(timeframe, 100)
+    switch = (time.perf_counter() - start) / (1000 * len(candles.timeframes))
+    return {
+        'base_bars': bars,
+        'timeframes': candles.timeframes,
+        'batch_ms': batch * 1000,
+        'incremental_updates_per_sec': 2 * len(rows) / elapsed,
+        'switch_us': switch * 1e6
+    }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
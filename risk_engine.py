@@ -0,0 +1,195 @@
+import time
+import numpy as np
+from config import RISK_LIMITS
+
+
+class RiskRejected(Exception):
+    """下单前风控检查未通过"""
+
+    def __init__(self, reason, symbol=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.symbol = symbol
+
+
+class RiskEngine:
+    """组合风控：跟踪所有交易对的持仓，下单前对全部持仓做向量化检查
+
+    持仓存放在预分配数组中（数量带符号，多头为正），每个交易对占一行。
+    强平价按全仓保证金计算：价格变动使权益降到维持保证金时的价格。
+    权益 = FundManager 已实现余额 + 全部持仓浮动盈亏。
+    """
+
+    def __init__(self, fund_manager, limits=None, capacity=256):
+        self.fund_manager = fund_manager
+        self.limits = dict(RISK_LIMITS, **(limits or {}))
+        self.index = {}
+        self.symbols = []
+        self.qty = np.zeros(capacity)
+        self.entry = np.zeros(capacity)
+        self.mark = np.zeros(capacity)
+        self.n = 0
+        self.peak_equity = fund_manager.balance
+        self.killed = False
+        self.rejections = 0
+
+    def _row(self, symbol):
+        i = self.index.get(symbol)
+        if i is None:
+            if self.n == len(self.qty):
+                grow = len(self.qty)
+                self.qty = np.concatenate((self.qty, np.zeros(grow)))
+                self.entry = np.concatenate((self.entry, np.zeros(grow)))
+                self.mark = np.concatenate((self.mark, np.zeros(grow)))
+            i = self.index[symbol] = self.n
+            self.symbols.append(symbol)
+            self.n += 1
+        return i
+
+    # ---------- 状态更新 ----------
+
+    def update_mark(self, symbol, price):
+        i = self.index.get(symbol)
+        if i is not None:
+            self.mark[i] = price
+
+    def on_fill(self, symbol, side, amount, price):
+        """成交后更新持仓数量和均价，amount 为基础货币数量"""
+        i = self._row(symbol)
+        dq = amount if side in ('long', 'buy') else -amount
+        q = self.qty[i]
+        new_q = q + dq
+        if q == 0 or q * dq > 0:
+            self.entry[i] = (self.entry[i] * q + price * dq) / new_q
+        elif q * new_q < 0:
+            # 反手，剩余部分按成交价开仓
+            self.entry[i] = price
+        if abs(new_q) < 1e-12:
+            new_q = 0.0
+        self.qty[i] = new_q
+        self.mark[i] = price
+
+    def equity(self):
+        n = self.n
+        return self.fund_manager.balance + float(self.qty[:n] @ (self.mark[:n] - self.entry[:n]))
+
+    def reset_kill_switch(self):
+        self.killed = False
+        self.peak_equity = self.equity()
+
+    # ---------- 检查 ----------
+
+    def liquidation_prices(self):
+        """每个持仓的全仓强平价，无持仓的行为 nan"""
+        n = self.n
+        qty, mark = self.qty[:n], self.mark[:n]
+        equity = self.equity()
+        maintenance = self.limits['maintenance_margin_rate'] * float(np.abs(qty) @ mark)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prices = mark - (equity - maintenance) / qty
+        prices[qty == 0] = np.nan
+        return np.maximum(prices, 0.0)
+
+    def liquidation_price(self, symbol):
+        i = self.index.get(symbol)
+        if i is None or self.qty[i] == 0:
+            return None
+        return float(self.liquidation_prices()[i])
+
+    def check(self, symbol, side, amount, price):
+        """返回拒绝原因，检查通过时返回 None"""
+        limits = self.limits
+        n = self.n
+        i = self.index.get(symbol)
+        dq = amount if side in ('long', 'buy') else -amount
+
+        # 假设订单成交后的持仓
+        qty = self.qty[:n].copy()
+        mark = self.mark[:n].copy()
+        entry = self.entry[:n]
+        if i is None:
+            qty = np.append(qty, 0.0)
+            mark = np.append(mark, price)
+            entry = np.append(entry, price)
+            i = n
+        unrealized = float(qty @ (mark - entry))
+        equity = self.fund_manager.balance + unrealized
+        qty[i] += dq
+        mark[i] = price
+        notional = np.abs(qty) * mark
+        gross = float(notional.sum())
+
+        # 回撤止损：权益从高点回撤过大时停止开仓，之后需要手动 reset_kill_switch
+        self.peak_equity = max(self.peak_equity, equity)
+        if self.peak_equity > 0 and 1 - equity / self.peak_equity >= limits['max_drawdown']:
+            self.killed = True
+        if abs(qty[i]) < abs(qty[i] - dq):
+            return None  # 减仓总是允许
+        if self.killed:
+            return self._reject(f'回撤超过 {limits["max_drawdown"]:.0%}，已停止开仓')
+        if equity <= 0:
+            return self._reject('权益不足')
+
+        if amount * price > limits['max_order_notional']:
+            return self._reject(f'单笔名义价值 {amount * price:.2f} 超过上限 {limits["max_order_notional"]}')
+        if notional[i] / equity > limits['max_symbol_leverage']:
+            return self._reject(f'{symbol} 杠杆 {notional[i] / equity:.2f} 超过上限 {limits["max_symbol_leverage"]}')
+        if gross / equity > limits['max_total_leverage']:
+            return self._reject(f'总杠杆 {gross / equity:.2f} 超过上限 {limits["max_total_leverage"]}')
+
+        # 全仓强平价：equity + q_i * (p - mark_i) = 维持保证金
+        maintenance = limits['maintenance_margin_rate'] * gross
+        liquidation = float(mark[i] - (equity - maintenance) / qty[i])
+        if abs(price - liquidation) / price < limits['min_liquidation_distance']:
+            return self._reject(f'{symbol} 强平价 {liquidation:.2f} 距现价过近')
+        return None
+
+    def _reject(self, reason):
+        self.rejections += 1
+        return reason
+
+    def enforce(self, symbol, side, amount, price):
+        """检查不通过时抛出 RiskRejected"""
+        reason = self.check(symbol, side, amount, price)
+        if reason is not None:
+            raise RiskRejected(reason, symbol)
+
+    def report(self):
+        n = self.n
+        liquidation = self.liquidation_prices()
+        equity = self.equity()
+        return {
+            'equity': equity,
+            'peak_equity': self.peak_equity,
+            'gross_leverage': float(np.abs(self.qty[:n]) @ self.mark[:n]) / equity if equity > 0 else None,
+            'killed': self.killed,
+            'rejections': self.rejections,
+            'positions': {s: {'qty': float(self.qty[i]), 'entry': float(self.entry[i]),
+                              'mark': float(self.mark[i]), 'liquidation': float(liquidation[i])}
+                          for s, i in self.index.items() if self.qty[i] != 0}
+        }
+
+
+def benchmark(positions=500, checks=20000, seed=0):
+    """在大量持仓下测量单次下单前检查的耗时"""
+    from fund_manager import FundManager
+    rng = np.random.default_rng(seed)
+    engine = RiskEngine(FundManager(1e7), {'max_order_notional': 1e6})
+    prices = rng.uniform(1, 50000, positions)
+    for k in range(positions):
+        engine.on_fill(f'SYM{k}/USDT', 'long' if k % 2 else 'short', 1000 / prices[k], prices[k])
+    symbols = [f'SYM{k}/USDT' for k in rng.integers(0, positions, checks)]
+    sides = rng.choice(['long', 'short'], checks).tolist()
+    start = time.perf_counter()
+    rejected = 0
+    for symbol, side in zip(symbols, sides):
+        i = engine.index[symbol]
+        rejected += engine.check(symbol, side, 0.01, engine.mark[i]) is not None
+    elapsed = time.perf_counter() - start
+    return {'positions': positions, 'checks': checks, 'avg_check_us': elapsed / checks * 1e6,
+            'rejected': rejected}
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,178 @@
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from exchange_interface import ExchangeInterface
+from market_cache import CachedExchange
+from strategy import TradingStrategy
+from trade_ledger import ledger_path
+
+
+class TokenBucket:
+    """令牌桶限流，rate 为每秒补充的令牌数，capacity 为允许的突发量"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1, timeout=None):
+        """取出令牌，不足时等待，超时返回False"""
+        if tokens > self.capacity:
+            # 桶永远装不下这么多令牌，等待不会结束
+            raise ValueError(f'请求 {tokens} 个令牌超过桶容量 {self.capacity}')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SymbolMetrics:
+    """单个交易对的执行次数、耗时和调度延迟"""
+
+    def __init__(self):
+        self.evaluations = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_error = None
+
+    def record(self, latency, lag, error=None):
+        self.evaluations += 1
+        self.total_latency += latency
+        self.last_latency = latency
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if error is not None:
+            self.errors += 1
+            self.last_error = str(error)
+
+
+class StrategyScheduler:
+    """多交易所、多交易对的策略调度器
+
+    每个交易所只创建一个 ExchangeInterface 和一个 TradingStrategy，
+    策略评估在线程池中执行，请求数按交易所的令牌桶限流。
+    同一交易所的 TradingStrategy 共享风控和持仓状态，其评估按交易所串行，
+    不同交易所之间并发。
+    """
+
+    def __init__(self, symbols, interval=60.0, max_workers=16, simulated=True,
+                 rate_limits=None, request_cost=3, evaluate=None, proxy=None, use_proxy=False):
+        # symbols 形如 {'okx': ['BTC/USDT', ...], 'binance': [...]}
+        self.symbols = {name: list(pairs) for name, pairs in symbols.items()}
+        self.interval = interval
+        self.request_cost = request_cost
+        self.evaluate = evaluate or (lambda strategy, symbol: strategy.execute_strategy(symbol))
+        self.logger = logging.getLogger('策略调度')
+
+        self.exchanges = {}
+        self.strategies = {}
+        self.buckets = {}
+        self.locks = {}
+        for name in self.symbols:
+            exchange = CachedExchange(ExchangeInterface(name, simulated=simulated,
+                                                        proxy=proxy, use_proxy=use_proxy))
+            self.exchanges[name] = exchange
+            # 每个交易所单独的交易记录文件，避免多个实例写同一个文件
+            self.strategies[name] = TradingStrategy(exchange, ledger_path=ledger_path(name))
+            # 默认按ccxt的 rateLimit（两次请求的最小间隔毫秒数）换算每秒请求数
+            rate = (rate_limits or {}).get(name) or 1000 / exchange.exchange.rateLimit
+            # 容量至少能放下一次评估的请求数，否则 acquire 永远等不到
+            self.buckets[name] = TokenBucket(rate, max(rate, 1, request_cost))
+            self.locks[name] = threading.Lock()
+
+        self.metrics = {(name, s): SymbolMetrics() for name, pairs in self.symbols.items() for s in pairs}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='strategy')
+        self.running = False
+        self.started_at = None
+        self._running_jobs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+        self.pool.shutdown(wait=wait)
+
+    def _loop(self):
+        # 小顶堆按下次执行时间排序
+        now = time.monotonic()
+        queue = [(now, key) for key in self.metrics]
+        heapq.heapify(queue)
+        while self.running:
+            due, key = queue[0]
+            now = time.monotonic()
+            if due > now:
+                time.sleep(min(due - now, 0.1))
+                continue
+            heapq.heapreplace(queue, (due + self.interval, key))
+            with self._lock:
+                if key in self._running_jobs:
+                    # 上一轮还没执行完，跳过本轮，延迟计入指标
+                    continue
+                self._running_jobs.add(key)
+            self.pool.submit(self._run_job, key, due)
+
+    def _run_job(self, key, due):
+        exchange_name, symbol = key
+        error = None
+        self.buckets[exchange_name].acquire(self.request_cost)
+        start = time.monotonic()
+        try:
+            # RiskEngine 的检查和成交更新不是原子的，同一交易所的评估不能交错
+            with self.locks[exchange_name]:
+                self.evaluate(self.strategies[exchange_name], symbol)
+        except Exception as e:
+            error = e
+            self.logger.error(f'{exchange_name} {symbol} 策略执行失败: {e}')
+        finally:
+            latency = time.monotonic() - start
+            with self._lock:
+                self.metrics[key].record(latency, start - due, error)
+                self._running_jobs.discard(key)
+
+    def run_once(self):
+        """立即对所有交易对执行一轮评估并等待完成"""
+        now = time.monotonic()
+        futures = [self.pool.submit(self._run_job, key, now) for key in self.metrics]
+        for future in futures:
+            future.result()
+
+    def report(self):
+        """每个交易对的吞吐量、平均耗时和调度延迟"""
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        with self._lock:
+            return {
+                f'{name}:{symbol}': {
+                    'evaluations': m.evaluations,
+                    'errors': m.errors,
+                    'throughput_per_min': m.evaluations / elapsed * 60 if elapsed else 0.0,
+                    'avg_latency_ms': m.total_latency / m.evaluations * 1000 if m.evaluations else 0.0,
+                    'last_lag_ms': m.last_lag * 1000,
+                    'max_lag_ms': m.max_lag * 1000,
+                    'last_error': m.last_error
+                }
+                for (name, symbol), m in self.metrics.items()
+            }
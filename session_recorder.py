@@ -0,0 +1,351 @@
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+import ccxt
+import numpy as np
+
+# 会话录制文件：文件头 + 定长记录头 + 负载；负载是 JSON 加上数值表的原始字节，
+# 只有数据，读取时不会执行任何代码
+# 记录头：开始时间（相对会话开始，纳秒）、耗时（微秒）、方法编号、状态、负载长度
+# 版本 1 的负载是 pickle，不再读取
+MAGIC = b'OYREC\x02'
+RECORD_HEADER = struct.Struct('<qIBBI')
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_UNENCODABLE = 2  # 负载无法编码，只记下字符串化的参数和编码错误
+
+# 只录制访问交易所的方法；编号写入文件，只能在末尾追加
+RECORDED_METHODS = ('get_ticker', 'get_order_book', 'get_market_data', 'get_ohlcv', 'get_balance',
+                    'submit_order', 'create_order', 'fetch_order_by_client_id')
+METHOD_CODES = {name: i for i, name in enumerate(RECORDED_METHODS)}
+
+
+def _table(rows):
+    """二维数值表（K线、深度档位）返回 (float64 数组, 整数列编号)，其他返回 None"""
+    cols = len(rows[0]) if type(rows[0]) in (list, tuple) else 0
+    if not cols:
+        return None
+    ints = [True] * cols
+    for row in rows:
+        if type(row) not in (list, tuple) or len(row) != cols:
+            return None
+        for j, x in enumerate(row):
+            kind = type(x)
+            if kind is float:
+                ints[j] = False
+            elif kind is not int or not -2 ** 53 < x < 2 ** 53:
+                return None
+    return np.array(rows, dtype=np.float64), [j for j in range(cols) if ints[j]]
+
+
+def _pack(value, blocks):
+    """数值表换成对二进制块的引用，其余保持 JSON 结构；numpy 数值转成 Python 数值"""
+    if isinstance(value, (list, tuple)):
+        table = _table(value) if value else None
+        if table is not None:
+            array, ints = table
+            offset = sum(len(b) for b in blocks) // 8
+            blocks.append(array.tobytes())
+            return {'__table__': [offset, array.shape[0], array.shape[1], ints]}
+        return [_pack(v, blocks) for v in value]
+    if isinstance(value, dict):
+        return {k: _pack(v, blocks) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        return _pack(value.tolist(), blocks)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _dumps(value):
+    """记录负载：JSON 长度 + JSON + 数值表的 float64 原始字节"""
+    blocks = []
+    # 无法表示为 JSON 的对象录成字符串，录制不能让交易请求本身失败
+    tree = json.dumps(_pack(value, blocks), separators=(',', ':'), default=str).encode()
+    return struct.pack('<I', len(tree)) + tree + b''.join(blocks)
+
+
+def _loads(data):
+    (length,) = struct.unpack_from('<I', data)
+    blob = data[4 + length:]
+
+    def hook(obj):
+        if '__table__' not in obj:
+            return obj
+        offset, n, cols, ints = obj['__table__']
+        rows = np.frombuffer(blob, dtype=np.float64, count=n * cols, offset=offset * 8).reshape(n, cols).tolist()
+        for row in rows:
+            for j in ints:
+                row[j] = int(row[j])
+        return rows
+
+    return json.loads(data[4:4 + length], object_hook=hook)
+
+
+class RecordingExchange:
+    """录制层：包在 ExchangeInterface 外面，把每次请求的参数、返回值或异常连同时间写入二进制日志
+
+    热路径上只做一次编码和带缓冲的顺序写，不做压缩和 fsync；K线和深度这类数值表
+    按 float64 原始字节保存，不逐个格式化成文本。元组录制后读回为列表。
+    其他属性和方法原样转发，可以再包一层 CachedExchange。
+    """
+
+    def __init__(self, exchange_interface, path, buffer_size=1 << 16):
+        self.exchange_interface = exchange_interface
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(MAGIC)
+        meta = _dumps({'exchange_name': exchange_interface.exchange_name,
+                       'simulated': getattr(exchange_interface, 'simulated', None),
+                       'started': time.time()})
+        self._file.write(struct.pack('<I', len(meta)) + meta)
+        self._lock = threading.Lock()
+        self._started = time.perf_counter_ns()
+        self.records = 0
+        self.bytes = 0
+        self.encode_errors = 0
+        for name in RECORDED_METHODS:
+            if hasattr(exchange_interface, name):
+                setattr(self, name, self._recorder(name))
+
+    def __getattr__(self, name):
+        return getattr(self.exchange_interface, name)
+
+    def _recorder(self, name):
+        method = getattr(self.exchange_interface, name)
+        code = METHOD_CODES[name]
+
+        def call(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                self._write(start, code, STATUS_ERROR, (args, kwargs, (type(e).__name__, str(e))))
+                raise
+            self._write(start, code, STATUS_OK, (args, kwargs, result))
+            return result
+
+        call.__name__ = name
+        return call
+
+    def _write(self, start, code, status, payload):
+        end = time.perf_counter_ns()
+        try:
+            data = _dumps(payload)
+        except (TypeError, ValueError) as e:
+            # 例如元组作键的 dict、循环引用；录制不能让交易请求本身失败
+            args, kwargs, _ = payload
+            status = STATUS_UNENCODABLE
+            data = _dumps(([str(a) for a in args], {str(k): str(v) for k, v in kwargs.items()},
+                           (type(e).__name__, str(e))))
+            self.encode_errors += 1
+        header = RECORD_HEADER.pack(start - self._started, min((end - start) // 1000, 0xFFFFFFFF),
+                                    code, status, len(data))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(header)
+            self._file.write(data)
+            self.records += 1
+            self.bytes += len(header) + len(data)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_session(path):
+    """读取录制文件，返回 (元数据, 记录列表)；崩溃留下的半条记录被忽略
+
+    每条记录为 dict：offset_ns、duration_us、method、ok、recorded、args、kwargs、result（异常时为 [类名, 信息]）。
+    recorded 为 False 表示负载无法编码，args/kwargs 为字符串，result 为编码错误的 [类名, 信息]。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f'{path} 不是会话录制文件')
+    pos = len(MAGIC)
+    (meta_len,) = struct.unpack_from('<I', data, pos)
+    pos += 4
+    meta = _loads(data[pos:pos + meta_len])
+    pos += meta_len
+    records = []
+    size = RECORD_HEADER.size
+    while pos + size <= len(data):
+        offset, duration, code, status, length = RECORD_HEADER.unpack_from(data, pos)
+        if pos + size + length > len(data):
+            break
+        args, kwargs, result = _loads(data[pos + size:pos + size + length])
+        records.append({'offset_ns': offset, 'duration_us': duration, 'method': RECORDED_METHODS[code],
+                        'ok': status == STATUS_OK, 'recorded': status != STATUS_UNENCODABLE, 'args': args, 'kwargs': kwargs, 'result': result})
+        pos += size + length
+    return meta, records
+
+
+class ReplayExhausted(Exception):
+    """回放时请求的数据在录制中不存在"""
+
+
+class ReplayExchange:
+    """按录制文件回放交易所响应，接口与 ExchangeInterface 相同
+
+    同一方法、同一交易对的请求按录制顺序依次返回，客户端订单号等随机参数不参与匹配；
+    录制时抛出的异常回放时以同类型重新抛出。speed 为 1 时按原始节奏（包括请求耗时）回放，
+    大于 1 时加速，为 None 时不等待。某个请求的录制用完后重复最后一次的响应，
+    strict 为True时改为抛出 ReplayExhausted。
+    """
+
+    def __init__(self, path, speed=None, strict=False, sleep=time.sleep):
+        self.meta, self.records = read_session(path)
+        self.exchange_name = self.meta['exchange_name']
+        self.simulated = self.meta.get('simulated')
+        self.proxy = None
+        self.use_proxy = False
+        self.speed = speed
+        self.strict = strict
+        self.sleep = sleep
+        self.exchange = type('ReplayCcxt', (), {'rateLimit': 1, 'proxies': {}})()
+        self.queues = {}
+        for record in self.records:
+            self.queues.setdefault(self._key(record['method'], record['args'], record['kwargs']),
+                                   deque()).append(record)
+        self.last = {}
+        self.calls = 0
+        self.misses = 0
+        self._started = None
+        self._lock = threading.Lock()
+        for name in RECORDED_METHODS:
+            setattr(self, name, self._replayer(name))
+
+    @staticmethod
+    def _key(method, args, kwargs):
+        symbol = kwargs.get('symbol', args[0] if args else None)
+        return method, symbol
+
+    def _replayer(self, name):
+        def call(*args, **kwargs):
+            return self._replay(name, args, kwargs)
+
+        call.__name__ = name
+        return call
+
+    def _replay(self, method, args, kwargs):
+        key = self._key(method, args, kwargs)
+        with self._lock:
+            self.calls += 1
+            if self._started is None:
+                self._started = time.perf_counter_ns()
+            queue = self.queues.get(key)
+            if queue:
+                record = self.last[key] = queue.popleft()
+            else:
+                record = self.last.get(key)
+                self.misses += 1
+                if record is None or self.strict:
+                    raise ReplayExhausted(f'录制中没有更多的 {method} {key[1]} 响应')
+            started = self._started
+        if self.speed:
+            # 等到录制时该请求结束的时刻，保持原始节奏
+            due = started + (record['offset_ns'] + record['duration_us'] * 1000) / self.speed
+            wait = (due - time.perf_counter_ns()) / 1e9
+            if wait > 0:
+                self.sleep(wait)
+        if not record['recorded']:
+            raise ReplayExhausted(f'录制时 {method} {key[1]} 的负载无法编码: {record["result"][1]}')
+        if not record['ok']:
+            name, message = record['result']
+            raise getattr(ccxt, name, Exception)(message)
+        return record['result']
+
+    def set_proxy(self, proxy_settings):
+        self.proxy = proxy_settings
+
+    def configure_proxy(self, proxy):
+        self.proxy = proxy
+
+    def remaining(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+
+def replay(path, handler, speed=None, sleep=time.sleep):
+    """按录制顺序把每条记录交给 handler(record)，speed 含义同 ReplayExchange，返回记录数"""
+    _, records = read_session(path)
+    started = time.perf_counter_ns()
+    for record in records:
+        if speed:
+            wait = (started + record['offset_ns'] / speed - time.perf_counter_ns()) / 1e9
+            if wait > 0:
+                sleep(wait)
+        handler(record)
+    return len(records)
+
+
+def benchmark(iterations=2000):
+    """录制开销、日志大小和回放速度；回放同一会话，核对策略下单结果与录制时一致"""
+    import tempfile
+    from fake_exchange import FakeExchange, generate_ohlcv
+    from order_executor import RetryPolicy
+    from strategy import TradingStrategy
+
+    def run_strategy(exchange, ledger, advance=None):
+        strategy = TradingStrategy(exchange, ledger_path=ledger)
+        strategy.risk.limits.update(max_symbol_leverage=float('inf'), max_total_leverage=float('inf'),
+                                    min_liquidation_distance=0.0)
+        orders = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            if advance:
+                advance()
+            ohlcv = exchange.get_ohlcv('BTC/USDT', limit=100)
+            strategy.on_market_data('BTC/USDT', ohlcv)
+            order = strategy.execute_strategy('BTC/USDT')
+            orders.append((order['side'], order['amount'], order['price']))
+        elapsed = time.perf_counter() - start
+        strategy.trade_history.close()
+        strategy.executor.shutdown()
+        return orders, elapsed, strategy.fund_manager.balance
+
+    def fake():
+        exchange = FakeExchange(generate_ohlcv(iterations + 100), cursor=99)
+        exchange.retry_policy = RetryPolicy(base_delay=0.0, max_delay=0.0, jitter=0.0)
+        return exchange
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = fake()
+        _, plain_elapsed, _ = run_strategy(plain, os.path.join(tmp, 'plain.bin'), plain.advance)
+
+        source = fake()
+        recorder = RecordingExchange(source, os.path.join(tmp, 'session.rec'))
+        recorded, record_elapsed, balance = run_strategy(recorder, os.path.join(tmp, 'rec.bin'),
+                                                         source.advance)
+        recorder.close()
+
+        player = ReplayExchange(recorder.path)
+        replayed, replay_elapsed, replay_balance = run_strategy(player, os.path.join(tmp, 'replay.bin'))
+        assert replayed == recorded and replay_balance == balance
+        calls = recorder.records
+        return {
+            'iterations': iterations,
+            'recorded_calls': calls,
+            'record_overhead_us': (record_elapsed - plain_elapsed) / calls * 1e6,
+            'bytes_per_call': recorder.bytes / calls,
+            'replay_iterations_per_sec': iterations / replay_elapsed,
+            'replay_misses': player.misses,
+            'identical': True
+        }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
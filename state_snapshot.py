@@ -0,0 +1,380 @@
+import io
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from collections import deque
+import numpy as np
+import indicators
+from analytics import RunningStats
+from order_executor import TrackedOrder
+from strategy_api import LiveBroker, PositionBook
+from config import SNAPSHOT_CONFIG
+
+# 快照文件：定长文件头 + npz 负载（numpy 数组按原始字节保存，其余状态是其中的一段 JSON）
+# 文件头：魔数、格式版本、序号、保存时间、负载 CRC32
+MAGIC = b'OYSNAP'
+SNAPSHOT_VERSION = 2
+# 版本 1 的负载是 pickle，读取时会执行任意代码，不再支持
+MIN_VERSION = 2
+HEADER = struct.Struct('<6sHQdI')
+
+# 允许出现在快照里的对象类型，只按属性字典还原，不调用任何构造或反序列化代码
+OBJECT_TYPES = {cls.__name__: cls for cls in (
+    indicators.IndicatorSet, indicators.SMA, indicators.EMA, indicators.RSI, indicators.ATR,
+    indicators.Bollinger, indicators.MACD, indicators.VWAP, RunningStats)}
+
+# 旧版本快照升级到下一版本的函数，按版本号登记：{1: upgrade_1_to_2, ...}
+MIGRATIONS = {}
+
+
+class SnapshotError(Exception):
+    """快照文件损坏或版本不支持"""
+
+
+def _pack(value, arrays):
+    """把状态转成可 JSON 化的结构，数组另存到 arrays，按 '#编号' 引用"""
+    if isinstance(value, np.ndarray):
+        key = f'#{len(arrays)}'
+        arrays[key] = value
+        return {'__array__': key}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {'__dict__': {k: _pack(v, arrays) for k, v in value.items()}}
+        return {'__items__': [[_pack(k, arrays), _pack(v, arrays)] for k, v in value.items()]}
+    if isinstance(value, tuple):
+        return {'__tuple__': [_pack(v, arrays) for v in value]}
+    if isinstance(value, (list, deque)):
+        packed = [_pack(v, arrays) for v in value]
+        return {'__deque__': packed} if isinstance(value, deque) else packed
+    if type(value).__name__ in OBJECT_TYPES and OBJECT_TYPES[type(value).__name__] is type(value):
+        return {'__object__': type(value).__name__, 'attrs': _pack(vars(value), arrays)}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f'快照不支持 {type(value).__name__} 类型的状态')
+
+
+def _unpack(value, arrays):
+    if isinstance(value, list):
+        return [_unpack(v, arrays) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if '__array__' in value:
+        return arrays[value['__array__']]
+    if '__dict__' in value:
+        return {k: _unpack(v, arrays) for k, v in value['__dict__'].items()}
+    if '__items__' in value:
+        return {_unpack(k, arrays): _unpack(v, arrays) for k, v in value['__items__']}
+    if '__tuple__' in value:
+        return tuple(_unpack(v, arrays) for v in value['__tuple__'])
+    if '__deque__' in value:
+        return deque(_unpack(v, arrays) for v in value['__deque__'])
+    if '__object__' in value:
+        cls = OBJECT_TYPES.get(value['__object__'])
+        if cls is None:
+            raise SnapshotError(f'快照包含未知对象类型 {value["__object__"]}')
+        obj = cls.__new__(cls)
+        vars(obj).update(_unpack(value['attrs'], arrays))
+        return obj
+    raise SnapshotError('快照结构无法识别')
+
+
+def encode(state, sequence=0):
+    arrays = {}
+    tree = json.dumps(_pack(state, arrays), separators=(',', ':')).encode()
+    buffer = io.BytesIO()
+    np.savez(buffer, __state__=np.frombuffer(tree, dtype=np.uint8), **arrays)
+    payload = buffer.getvalue()
+    return HEADER.pack(MAGIC, SNAPSHOT_VERSION, sequence, time.time(), zlib.crc32(payload)) + payload
+
+
+def decode(data):
+    """解析快照，返回 (文件头信息, 状态)；旧版本按 MIGRATIONS 逐级升级"""
+    if len(data) < HEADER.size:
+        raise SnapshotError('快照文件不完整')
+    magic, version, sequence, created, crc = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError('不是快照文件')
+    payload = data[HEADER.size:]
+    if zlib.crc32(payload) != crc:
+        raise SnapshotError('快照校验失败')
+    if version > SNAPSHOT_VERSION:
+        raise SnapshotError(f'快照版本 {version} 高于当前支持的 {SNAPSHOT_VERSION}')
+    if version < MIN_VERSION:
+        raise SnapshotError(f'快照版本 {version} 已不再支持')
+    try:
+        with np.load(io.BytesIO(payload), allow_pickle=False) as archive:
+            arrays = {key: archive[key] for key in archive.files}
+        state = _unpack(json.loads(arrays.pop('__state__').tobytes()), arrays)
+    except (ValueError, KeyError, OSError) as e:
+        raise SnapshotError(f'快照负载无法解析: {e}')
+    while version < SNAPSHOT_VERSION:
+        state = MIGRATIONS[version](state)
+        version += 1
+    return {'version': version, 'sequence': sequence, 'created': created}, state
+
+
+def write_atomic(path, data):
+    """写临时文件并 fsync，再把旧快照改名为 .prev、新快照换上，任何时刻崩溃都至少留下一份完整快照"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.path.exists(path):
+        os.replace(path, path + '.prev')
+    os.replace(tmp, path)
+    # 目录 fsync 让改名落盘；Windows 不能以只读方式打开目录，改名本身已由系统保证
+    if os.name == 'posix':
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def capture(strategy):
+    """收集策略的完整状态：资金、风控持仓、插件持仓、未完成订单和最近K线"""
+    fund_manager = strategy.fund_manager
+    risk = strategy.risk
+    n = risk.n
+    broker = strategy.dispatcher.broker if strategy.dispatcher is not None else None
+    return {
+        'fund_manager': {
+            'balance': fund_manager.balance,
+            'position_size': fund_manager.position_size,
+            'leverage': fund_manager.leverage,
+            'risk_percent': fund_manager.risk_percent,
+            'params': dict(fund_manager.params)
+        },
+        'risk': {
+            'symbols': list(risk.symbols),
+            'qty': risk.qty[:n].copy(),
+            'entry': risk.entry[:n].copy(),
+            'mark': risk.mark[:n].copy(),
+            'peak_equity': risk.peak_equity,
+            'killed': risk.killed
+        },
+        'analytics': dict(vars(strategy.analytics)),
+        # 模拟盘和实盘插件的持仓格式相同：[带符号数量, 均价, 开仓时间, 未计入的开仓手续费]
+        'paper_positions': {s: list(p) for s, p in broker.positions.items()}
+        if isinstance(broker, PositionBook) else None,
+        # quantity 为基础货币数量：策略单的 amount 是计价货币金额，插件单的 amount 本身就是数量
+        'orders': [{
+            'symbol': o.symbol, 'side': o.side, 'amount': o.amount, 'price': o.price,
+            'quantity': o.quantity, 'client_order_id': o.client_order_id, 'status': o.status,
+            'filled': o.filled, 'order': o.order,
+            'owner': 'broker' if isinstance(broker, LiveBroker) and broker.owns(o.client_order_id) else 'strategy'
+        } for o in strategy.executor.pending()],
+        'candles': {symbol: np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+                    for symbol, ohlcv in strategy.candles.items()},
+        # 指标连同流式状态一起保存，热启动时不需要从头重算
+        'indicators': dict(strategy.indicators),
+        'ledger_records': len(strategy.trade_history)
+    }
+
+
+def restore(strategy, state):
+    """把快照状态装回策略，不访问交易所；K线和指标原样装回，不触发重算"""
+    fund = state['fund_manager']
+    fund_manager = strategy.fund_manager
+    fund_manager.balance = fund['balance']
+    fund_manager.position_size = fund['position_size']
+    fund_manager.leverage = fund['leverage']
+    fund_manager.risk_percent = fund['risk_percent']
+    fund_manager.params.update(fund['params'])
+
+    risk = strategy.risk
+    for i, symbol in enumerate(state['risk']['symbols']):
+        row = risk._row(symbol)
+        risk.qty[row] = state['risk']['qty'][i]
+        risk.entry[row] = state['risk']['entry'][i]
+        risk.mark[row] = state['risk']['mark'][i]
+    risk.peak_equity = state['risk']['peak_equity']
+    risk.killed = state['risk']['killed']
+    vars(strategy.analytics).update(state['analytics'])
+
+    broker = strategy.dispatcher.broker if strategy.dispatcher is not None else None
+    if state['paper_positions'] is not None and isinstance(broker, PositionBook):
+        broker.positions = {s: list(p) for s, p in state['paper_positions'].items()}
+
+    strategy.indicators.update(state['indicators'])
+    for symbol, ohlcv in state['candles'].items():
+        strategy.candles[symbol] = ohlcv.tolist()
+        if strategy.dispatcher is not None and len(ohlcv):
+            strategy.dispatcher.on_ohlcv(symbol, strategy.candles[symbol])
+
+
+def reconcile(strategy, state, timeframe='1m'):
+    """热启动后只与交易所核对变化的部分，返回核对统计
+
+    未完成订单逐个按客户端订单号查询：成交增量按基础货币数量计入风控持仓，
+    插件订单交给 LiveBroker 同时更新插件持仓；仍未完成的交回执行引擎继续跟踪。
+    K线只拉取快照最后一根之后的部分。
+    """
+    exchange = strategy.exchange
+    executor = strategy.executor
+    broker = strategy.dispatcher.broker if strategy.dispatcher is not None else None
+    live = broker if isinstance(broker, LiveBroker) else None
+    stats = {'orders': 0, 'filled_orders': 0, 'open_orders': 0, 'lost_orders': 0, 'new_bars': 0}
+    for saved in state['orders']:
+        stats['orders'] += 1
+        quantity = saved['quantity']
+        tracked = TrackedOrder(saved['symbol'], saved['side'], saved['amount'], saved['price'],
+                               saved['client_order_id'], quantity)
+        order = exchange.fetch_order_by_client_id(saved['symbol'], saved['client_order_id'])
+        if order is None:
+            # 交易所没有这笔订单，说明下单请求没有送达
+            stats['lost_orders'] += 1
+            continue
+        tracked.update(order)
+        delta = tracked.filled - saved['filled']
+        plugin = saved['owner'] == 'broker' and live is not None
+        if delta > 0:
+            stats['filled_orders'] += 1
+        if plugin:
+            live.adopt(tracked, saved['filled'])
+        elif delta > 0:
+            strategy.record_fill(saved['symbol'], saved['side'], quantity,
+                                 dict(order, filled=delta, amount=saved['amount']))
+        if tracked.done:
+            tracked.finish()
+            continue
+        stats['open_orders'] += 1
+        reconciled = tracked.filled
+        if not plugin:
+            tracked.future.add_done_callback(
+                lambda future, saved=saved, quantity=quantity, reconciled=reconciled: strategy.record_fill(
+                    saved['symbol'], saved['side'], quantity,
+                    dict(future.result().order or {}, filled=future.result().filled - reconciled,
+                         amount=saved['amount'])))
+        with executor._lock:
+            executor.orders[tracked.client_order_id] = tracked
+
+    for symbol, saved in state['candles'].items():
+        if not len(saved):
+            continue
+        fresh = np.asarray(exchange.get_ohlcv(symbol, timeframe, limit=len(saved), since=int(saved[-1, 0])),
+                           dtype=np.float64).reshape(-1, 6)
+        if not len(fresh):
+            continue
+        merged = np.concatenate((saved[saved[:, 0] < fresh[0, 0]], fresh))[-len(saved):]
+        stats['new_bars'] += int((fresh[:, 0] > saved[-1, 0]).sum())
+        strategy.on_market_data(symbol, merged.tolist())
+    return stats
+
+
+class SnapshotManager:
+    """定期把策略状态保存为快照，启动时从快照热启动"""
+
+    def __init__(self, strategy, path=None, interval=None):
+        self.strategy = strategy
+        self.path = path or SNAPSHOT_CONFIG['path']
+        self.interval = SNAPSHOT_CONFIG['interval'] if interval is None else interval
+        self.sequence = 0
+        self.last_saved = None
+        self.logger = logging.getLogger('状态快照')
+
+    def save(self):
+        started = time.perf_counter()
+        self.sequence += 1
+        data = encode(capture(self.strategy), self.sequence)
+        write_atomic(self.path, data)
+        self.last_saved = time.monotonic()
+        return {'bytes': len(data), 'ms': (time.perf_counter() - started) * 1000}
+
+    def maybe_save(self):
+        if self.last_saved is None or time.monotonic() - self.last_saved >= self.interval:
+            return self.save()
+        return None
+
+    def load(self):
+        """读取最新的完整快照，当前文件损坏时退回上一份；都没有时返回 (None, None)"""
+        for path in (self.path, self.path + '.prev'):
+            try:
+                with open(path, 'rb') as f:
+                    return decode(f.read())
+            except FileNotFoundError:
+                continue
+            except SnapshotError as e:
+                self.logger.warning(f'快照 {path} 无法读取: {e}')
+        return None, None
+
+    def warm_start(self, timeframe='1m', reconcile_exchange=True):
+        """从快照恢复并与交易所核对增量，没有快照时返回 None"""
+        started = time.perf_counter()
+        header, state = self.load()
+        if state is None:
+            return None
+        self.sequence = header['sequence']
+        restore(self.strategy, state)
+        restored = time.perf_counter()
+        stats = reconcile(self.strategy, state, timeframe) if reconcile_exchange else {}
+        report = dict(stats, sequence=header['sequence'], age_seconds=time.time() - header['created'],
+                      restore_ms=(restored - started) * 1000,
+                      reconcile_ms=(time.perf_counter() - restored) * 1000)
+        self.logger.info(f'已从快照 #{header["sequence"]} 热启动: {report}')
+        return report
+
+
+def benchmark(symbols=20, bars=1000, orders=50):
+    """快照保存、加载和热启动耗时；核对恢复后的状态与保存时一致"""
+    import tempfile
+    from fake_exchange import FakeExchange, generate_ohlcv
+    from strategy import TradingStrategy
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeExchange(generate_ohlcv(bars + 10), cursor=bars - 1)
+        strategy = TradingStrategy(fake, ledger_path=os.path.join(tmp, 'ledger.bin'))
+        ohlcv = fake.get_ohlcv('BTC/USDT', limit=bars)
+        for k in range(symbols):
+            symbol = f'SYM{k}/USDT'
+            strategy.on_market_data(symbol, ohlcv)
+            strategy.risk.on_fill(symbol, 'long' if k % 2 else 'short', 0.01 * (k + 1), ohlcv[-1][4])
+        strategy.fund_manager.update_balance(12.5)
+        # 未完成订单：执行引擎还没来得及跟踪的状态
+        for k in range(orders):
+            tracked = TrackedOrder('SYM0/USDT', 'long', 100.0, ohlcv[-1][4], f'snap{k}', 100.0 / ohlcv[-1][4])
+            strategy.executor.orders[tracked.client_order_id] = tracked
+            fake.orders[tracked.client_order_id] = {
+                'clientOrderId': tracked.client_order_id, 'symbol': 'SYM0/USDT', 'side': 'long',
+                'amount': 100.0, 'price': ohlcv[-1][4], 'filled': 100.0 if k % 2 else 0.0,
+                'status': 'closed' if k % 2 else 'open'}
+
+        manager = SnapshotManager(strategy, os.path.join(tmp, 'strategy.snap'))
+        saved = manager.save()
+        expected = strategy.risk.report()
+        strategy.executor.shutdown()
+        strategy.trade_history.close()
+
+        fake.advance(5)
+        started = time.perf_counter()
+        warm = TradingStrategy(fake, ledger_path=os.path.join(tmp, 'ledger.bin'))
+        report = SnapshotManager(warm, manager.path).warm_start()
+        warm_ms = (time.perf_counter() - started) * 1000
+        assert warm.fund_manager.balance == strategy.fund_manager.balance
+        assert warm.risk.report()['positions'].keys() == expected['positions'].keys()
+        assert len(warm.executor.pending()) == report['open_orders'] == orders // 2
+        warm.executor.shutdown()
+        warm.trade_history.close()
+        return {
+            'symbols': symbols,
+            'bars_per_symbol': bars,
+            'snapshot_kb': saved['bytes'] / 1024,
+            'save_ms': saved['ms'],
+            'warm_start_ms': warm_ms,
+            'restore_ms': report['restore_ms'],
+            'reconcile_ms': report['reconcile_ms'],
+            'reconciled_fills': report['filled_orders'],
+            'new_bars': report['new_bars']
+        }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
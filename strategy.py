@@ -1,35 +1,142 @@
 import time
 from fund_manager import FundManager
 from exchange_interface import ExchangeInterface
-from config import TRADE_PARAMS
+from market_cache import CachedExchange
+from order_executor import OrderExecutor
+from trade_ledger import TradeLedger
+from analytics import PerformanceTracker
+from order_book import LocalOrderBook
+from indicators import IndicatorSet
+from instrumentation import timed
+from risk_engine import RiskEngine
+from config import TRADE_PARAMS, LEDGER_CONFIG
 
 class TradingStrategy:
-    def __init__(self):
+    def __init__(self, exchange=None, ledger_path=None):
         self.fund_manager = FundManager(TRADE_PARAMS['initial_balance'])
-        self.exchange = ExchangeInterface(simulated=True)
-        self.trade_history = []
+        self.executor = OrderExecutor(None)
+        self.exchange = exchange or CachedExchange(ExchangeInterface(simulated=True))
+        # ledger_path 为空时交易记录只保存在内存中，落盘的调用方用 trade_ledger.ledger_path 各用一个文件
+        self.trade_history = TradeLedger(ledger_path,
+                                         fsync_every=LEDGER_CONFIG['fsync_every'],
+                                         fsync_interval=LEDGER_CONFIG['fsync_interval'])
+        self.analytics = PerformanceTracker(self.fund_manager.balance)
+        self.risk = RiskEngine(self.fund_manager)
+        # 行情推送增量维护的订单簿（attach_order_book），下单时优先使用
+        self.order_books = {}
+        self._snapshot_books = {}
+        # 每个交易对一组技术指标，界面图表和趋势判断共用
+        self.indicators = {}
+        # 策略插件，由 add_plugin 创建调度器后才启用
+        self.dispatcher = None
+        # 每个交易对最近一次收到的K线，状态快照用它做热启动
+        self.candles = {}
 
-    def determine_trend(self, symbol):
+    @property
+    def exchange(self):
+        return self._exchange
+
+    @exchange.setter
+    def exchange(self, exchange):
+        # 界面切换交易所时，执行引擎跟着切换
+        self._exchange = exchange
+        self.executor.exchange = exchange
+
+    def determine_trend(self, symbol, market_data=None):
         """判断市场趋势方向"""
-        market_data = self.exchange.get_market_data(symbol)
+        trend_ma = TRADE_PARAMS.get('trend_ma')
+        indicators = self.indicators.get(symbol)
+        if trend_ma and indicators is not None and indicators.n:
+            latest = indicators.latest()
+            fast, slow = latest[f'sma{trend_ma[0]}'], latest[f'sma{trend_ma[1]}']
+            if fast == fast and slow == slow:  # 均线数据足够（非nan）时按均线判断
+                return 'long' if fast > slow else 'short'
+        if market_data is None:
+            market_data = self.exchange.get_market_data(symbol)
         current_price = market_data['ticker']['last']
         # 简单趋势判断逻辑：最近价格变化方向
         return 'long' if current_price > market_data['ticker']['open'] else 'short'
 
-    def execute_strategy(self, symbol):
-        trend = self.determine_trend(symbol)
-        risk = TRADE_PARAMS['risk_percent']
+    def update_indicators(self, symbol, ohlcv):
+        """用最新K线更新该交易对的指标，新K线和最后一根K线变化都是 O(1)"""
+        indicators = self.indicators.get(symbol)
+        if indicators is None:
+            periods = set((5, 10)) | set(TRADE_PARAMS.get('trend_ma') or ())
+            indicators = self.indicators[symbol] = IndicatorSet(ma_periods=sorted(periods))
+        indicators.update_ohlcv(ohlcv)
+        return indicators
+
+    def add_plugin(self, plugin, paper=False):
+        """挂载策略插件；paper 为True时模拟成交（模拟盘），否则通过执行引擎实盘下单"""
+        from strategy_api import EventDispatcher, LiveBroker, PaperBroker
+        if self.dispatcher is None:
+            broker = PaperBroker(self.fund_manager, on_close=self.record_close) if paper else LiveBroker(self)
+            self.dispatcher = EventDispatcher(broker=broker)
+        self.dispatcher.add_plugin(plugin)
+        return self.dispatcher
+
+    def on_market_data(self, symbol, ohlcv=None, ticker=None):
+        """行情线程拿到数据后调用：更新指标并把新收盘K线和行情分发给插件"""
+        if ohlcv is not None:
+            self.candles[symbol] = ohlcv
+            self.update_indicators(symbol, ohlcv)
+            if len(ohlcv):
+                self.risk.update_mark(symbol, ohlcv[-1][4])
+        if self.dispatcher is not None:
+            if ohlcv is not None:
+                self.dispatcher.on_ohlcv(symbol, ohlcv)
+            if ticker is not None:
+                self.dispatcher.on_tick(symbol, ticker)
+
+    def prepare_order(self, symbol):
+        """计算下单方向、仓位和入场价"""
+        # 行情只获取一次，趋势判断和入场价共用；推送维护的订单簿够新时不再请求深度快照
+        book = self.live_book(symbol)
+        if book is not None:
+            market_data = {'ticker': self.exchange.get_ticker(symbol)}
+        else:
+            market_data = self.exchange.get_market_data(symbol)
+        trend = self.determine_trend(symbol, market_data)
+        risk = self.fund_manager.risk_percent
         
         position_params = self.fund_manager.get_trade_params(risk)
-        entry_price = self.exchange.get_market_data(symbol)['ticker']['last']
-        
-        order = self.exchange.create_order(
-            symbol=symbol,
-            side=trend,
-            amount=position_params['position_size'],
-            price=entry_price
-        )
-        
+        entry_price = self.book_price(symbol, trend, market_data)
+        return trend, position_params, entry_price
+
+    def attach_order_book(self, book):
+        """挂载由 StreamFeed 增量维护的 LocalOrderBook"""
+        self.order_books[book.symbol] = book
+
+    def live_book(self, symbol):
+        """已同步且 book_max_age 秒内有更新的推送订单簿，没有时返回 None"""
+        book = self.order_books.get(symbol)
+        if book is None or not book.synced:
+            return None
+        age = book.age()
+        return book if age is not None and age <= TRADE_PARAMS['book_max_age'] else None
+
+    def book_price(self, symbol, trend, market_data):
+        """用订单簿的对手价作为限价，订单簿为空时退回最新成交价
+
+        优先用推送维护的订单簿；没有或已过期时用 market_data 中的REST快照，
+        快照单独存放，不会打乱推送订单簿的序号。
+        """
+        book = self.live_book(symbol)
+        if book is None:
+            book = self._snapshot_books.get(symbol)
+            if book is None:
+                book = self._snapshot_books[symbol] = LocalOrderBook(symbol)
+            if market_data.get('orderbook'):
+                book.apply_snapshot(market_data['orderbook'])
+        price = book.entry_price(trend)
+        return price if price is not None else market_data['ticker']['last']
+
+    def liquidation_price(self, symbol, entry_price, trend):
+        """优先用组合风控按保证金算出的强平价，没有持仓记录时退回固定比例"""
+        price = self.risk.liquidation_price(symbol)
+        return price if price is not None else self.fund_manager.get_liquidation_price(entry_price, trend)
+
+    def record_trade(self, symbol, trend, position_params, entry_price):
         # 记录交易信息
         self.trade_history.append({
             'timestamp': time.time(),
@@ -37,12 +144,53 @@ class TradingStrategy:
             'direction': trend,
             'size': position_params['position_size'],
             'entry_price': entry_price,
-            'liquidation_price': self.fund_manager.get_liquidation_price(entry_price, trend)
+            'liquidation_price': self.liquidation_price(symbol, entry_price, trend)
         })
+
+    def check_risk(self, symbol, trend, position_params, entry_price):
+        """下单前组合风控，position_size 为计价货币金额，不通过时抛出 RiskRejected"""
+        quantity = position_params['position_size'] / entry_price
+        self.risk.enforce(symbol, trend, quantity, entry_price)
+        return quantity
+
+    def record_fill(self, symbol, trend, quantity, order):
+        """按成交比例更新风控持仓"""
+        filled = (order or {}).get('filled') or 0.0
+        amount = (order or {}).get('amount') or 0.0
+        if filled and amount:
+            self.risk.on_fill(symbol, trend, quantity * filled / amount,
+                              order.get('average') or order.get('price'))
+
+    @timed('strategy')
+    def execute_strategy(self, symbol):
+        trend, position_params, entry_price = self.prepare_order(symbol)
+        quantity = self.check_risk(symbol, trend, position_params, entry_price)
         
+        order = self.exchange.create_order(
+            symbol=symbol,
+            side=trend,
+            amount=position_params['position_size'],
+            price=entry_price
+        )
+        
+        self.record_fill(symbol, trend, quantity, order)
+        self.record_trade(symbol, trend, position_params, entry_price)
         return order
 
-    def run_backtest(self, symbol, days):
+    def submit_strategy(self, symbol):
+        """通过执行引擎异步下单，返回 TrackedOrder，成交状态在后台线程跟踪"""
+        trend, position_params, entry_price = self.prepare_order(symbol)
+        quantity = self.check_risk(symbol, trend, position_params, entry_price)
+        tracked = self.executor.submit(symbol, trend, position_params['position_size'], entry_price,
+                                       quantity=quantity)
+        tracked.future.add_done_callback(
+            lambda future: self.record_fill(symbol, trend, quantity, future.result().order))
+        self.record_trade(symbol, trend, position_params, entry_price)
+        return tracked
+
+    def run_backtest(self, symbol, days, offline=False, timeframe='1m', ohlcv=None, hold_bars=60):
+        if offline:
+            return self.run_offline_backtest(symbol, days, timeframe, ohlcv, hold_bars)
         results = []
         for _ in range(days * 24):
             order = self.execute_strategy(symbol)
@@ -51,13 +199,85 @@ class TradingStrategy:
                 'direction': order['side'],
                 'size': order['amount'],
                 'entry_price': order['price'],
-                'pnl': order['filled'] * (order['price'] - self.exchange.get_market_data(symbol)['ticker']['last'])
+                'pnl': self.unrealized_pnl(order, self.exchange.get_market_data(symbol)['ticker']['last'])
             })
             time.sleep(3600)
         
         # 导出回测结果
         self.export_backtest_results(results)
 
+    @staticmethod
+    def unrealized_pnl(order, last_price):
+        """按订单方向计算浮动盈亏：多头价格上涨盈利，空头价格下跌盈利"""
+        direction = 1.0 if order['side'] in ('long', 'buy') else -1.0
+        return direction * order['filled'] * (last_price - order['price'])
+
+    def run_tick_backtest(self, symbol, events, interval_ms=60000, hold_ms=3600000, params=None):
+        """逐笔回测：用成交和报价事件驱动 execute_strategy，成交按排队位置、手续费、滑点和延迟模拟
+
+        空仓且没有在途订单时每隔 interval_ms 执行一次策略，持仓超过 hold_ms 后市价平仓。
+        回测在独立的策略实例上运行：资金是当前资金的副本，交易记录只保存在内存中，
+        不影响实盘余额、风控持仓和交易记录文件。
+        """
+        from tick_simulator import TickSimulator, SimulatedExchange
+        from risk_engine import RiskRejected
+        fund_manager = self.fund_manager.copy()
+        simulator = TickSimulator(
+            fund_manager, params, symbol, on_close=lambda *args: backtest.record_close(*args),
+            on_fill=lambda fill: backtest.risk.on_fill(fill['symbol'], fill['side'], fill['amount'],
+                                                       fill['price']))
+        backtest = TradingStrategy(SimulatedExchange(simulator))
+        backtest.fund_manager = fund_manager
+        backtest.analytics = PerformanceTracker(fund_manager.balance)
+        backtest.risk = RiskEngine(fund_manager, dict(self.risk.limits))
+        rejected = 0
+
+        def on_interval(sim):
+            nonlocal rejected
+            if sim.position(symbol) or any(o.status in ('pending', 'open') for o in sim.orders.values()):
+                return
+            try:
+                backtest.execute_strategy(symbol)
+            except RiskRejected:
+                rejected += 1
+
+        try:
+            simulator.run(events, on_interval, interval_ms, hold_ms)
+        finally:
+            backtest.executor.shutdown()
+        return {
+            'events': simulator.events,
+            'orders': len(simulator.orders),
+            'fills': len(simulator.fills),
+            'rejected': rejected,
+            'fees': sum(fill['fee'] for fill in simulator.fills),
+            'balance': fund_manager.balance,
+            'position': simulator.position(symbol),
+            'realized_pnl': sum(backtest.trade_history.pnl_by_symbol().values()),
+            'performance': backtest.analytics.report()
+        }
+
+    def run_offline_backtest(self, symbol, days, timeframe='1m', ohlcv=None, hold_bars=60):
+        """离线回测：用历史K线重放策略，不下单也不等待；在资金的副本上模拟，不影响实盘余额"""
+        from backtest import VectorBacktester
+        if ohlcv is None:
+            # 从本地K线仓库读取，只补拉缺失部分
+            from candle_store import CandleStore
+            store = CandleStore()
+            start = int((time.time() - days * 86400) * 1000)
+            store.backfill(self.exchange, symbol, timeframe, start=start)
+            ohlcv = store.read_array(self.exchange.exchange_name, symbol, timeframe)
+            ohlcv = ohlcv[ohlcv[:, 0] >= start]
+        backtester = VectorBacktester(ohlcv, hold_bars=hold_bars, fund_manager=self.fund_manager.copy())
+        results = backtester.run()
+        self.export_backtest_results(results)
+        return backtester.summary()
+
+    def run_plugin_backtest(self, plugins, symbol, ohlcv, fee_rate=0.0):
+        """用历史K线回放策略插件，每个插件独立资金，返回各插件的绩效"""
+        from strategy_api import run_plugins
+        return run_plugins(plugins, symbol, ohlcv, self.fund_manager.balance, fee_rate)
+
     def export_backtest_results(self, results):
         import csv
         from datetime import datetime
@@ -66,11 +286,21 @@ class TradingStrategy:
             writer = csv.DictWriter(f, fieldnames=['timestamp','direction','size','entry_price','pnl'])
             writer.writeheader()
             writer.writerows(results)
+        return filename
+
+    def record_close(self, pnl, entry_time=None, exit_time=None, trade=None):
+        """平仓后更新资金和绩效统计，已实现盈亏写回交易记录"""
+        self.fund_manager.update_balance(pnl)
+        self.analytics.update(pnl, entry_time, exit_time)
+        if trade is not None:
+            self.trade_history.record_pnl(trade['symbol'], pnl, trade)
 
     def get_performance_report(self):
         """生成绩效报告"""
-        return {
+        report = {
             'current_balance': self.fund_manager.balance,
             'total_trades': len(self.trade_history),
             'leverage': self.fund_manager.leverage
-        }
\ No newline at end of file
+        }
+        report.update(self.analytics.report())
+        return report
\ No newline at end of file
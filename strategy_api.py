@@ -0,0 +1,458 @@
+import threading
+import time
+import numpy as np
+from fund_manager import FundManager
+from config import TRADE_PARAMS
+
+# 策略插件接口：同一个插件可以在实盘 DataThread、离线回测和模拟盘中运行，
+# 行情由调度器预先放进 BarBuffer，回调中不发起任何网络请求。
+
+
+class BarBuffer:
+    """预分配的K线缓冲区，插件通过列视图读取已收盘的K线，不产生拷贝
+
+    data 的前 n 行为已收盘K线；回放时整段数据一次写入，只推进 n。
+    """
+
+    def __init__(self, capacity=4096):
+        self.data = np.zeros((capacity, 6))
+        self.n = 0
+        self.size = 0  # 已写入的行数，回放时大于 n
+
+    def __len__(self):
+        return self.n
+
+    def load(self, ohlcv, closed=None):
+        bars = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        if len(bars) > len(self.data):
+            self.data = np.zeros((max(len(bars), len(self.data) * 2), 6))
+        self.data[:len(bars)] = bars
+        self.size = len(bars)
+        self.n = len(bars) if closed is None else closed
+
+    def append(self, bar):
+        if self.n == len(self.data):
+            # 满了之后丢弃前一半，保持内存固定
+            half = len(self.data) // 2
+            self.data[:self.n - half] = self.data[half:self.n]
+            self.n -= half
+        self.data[self.n] = bar
+        self.n += 1
+        self.size = self.n
+
+    @property
+    def timestamp(self):
+        return self.data[:self.n, 0]
+
+    @property
+    def open(self):
+        return self.data[:self.n, 1]
+
+    @property
+    def high(self):
+        return self.data[:self.n, 2]
+
+    @property
+    def low(self):
+        return self.data[:self.n, 3]
+
+    @property
+    def close(self):
+        return self.data[:self.n, 4]
+
+    @property
+    def volume(self):
+        return self.data[:self.n, 5]
+
+    @property
+    def last(self):
+        return self.data[self.n - 1] if self.n else None
+
+
+class StrategyPlugin:
+    """策略插件基类，按需覆盖回调
+
+    on_bar 在每根K线收盘后调用，bars 为该交易对的 BarBuffer；
+    on_tick 收到最新行情时调用；on_fill 在自己的订单成交后调用。
+    下单通过 context.buy / context.sell / context.close；实盘订单异步成交，
+    context.pending 不为 0 时说明还有订单在途。
+    """
+
+    name = 'plugin'
+
+    def on_start(self, context):
+        pass
+
+    def on_bar(self, context, symbol, bars):
+        pass
+
+    def on_tick(self, context, symbol, ticker):
+        pass
+
+    def on_fill(self, context, fill):
+        pass
+
+
+class TrendPlugin(StrategyPlugin):
+    """与 determine_trend 相同的规则：收盘价高于开盘价做多，否则做空，持有 hold_bars 根K线后平仓"""
+
+    name = 'trend'
+
+    def __init__(self, hold_bars=60, risk_percent=None):
+        self.hold_bars = hold_bars
+        self.risk_percent = risk_percent
+        self.held = {}
+
+    def on_bar(self, context, symbol, bars):
+        if context.pending(symbol):
+            # 上一笔订单还没成交完，等成交后再决定
+            return
+        if context.position(symbol):
+            self.held[symbol] += 1
+            if self.held[symbol] >= self.hold_bars:
+                context.close(symbol)
+            return
+        bar = bars.last
+        side = 'long' if bar[4] > bar[1] else 'short'
+        amount = context.position_size(self.risk_percent) / bar[4]
+        context.order(symbol, side, amount)
+        self.held[symbol] = 0
+
+
+class StrategyContext:
+    """插件看到的运行环境：行情缓冲区、持仓和下单入口"""
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+
+    @property
+    def fund_manager(self):
+        return self.dispatcher.broker.fund_manager
+
+    def bars(self, symbol):
+        return self.dispatcher.buffers.get(symbol)
+
+    def price(self, symbol):
+        bars = self.dispatcher.buffers.get(symbol)
+        return float(bars.last[4]) if bars is not None and bars.n else None
+
+    def position(self, symbol):
+        """带符号的持仓数量，多头为正"""
+        return self.dispatcher.broker.position(symbol)
+
+    def pending(self, symbol):
+        """已下单但还没成交的带符号数量，模拟撮合时总是 0"""
+        return self.dispatcher.broker.pending(symbol)
+
+    def position_size(self, risk_percent=None):
+        """按资金管理规则计算的下单金额"""
+        risk = self.fund_manager.risk_percent if risk_percent is None else risk_percent
+        return self.fund_manager.get_trade_params(risk)['position_size']
+
+    def order(self, symbol, side, amount, price=None):
+        """side 为 'long'/'buy' 或 'short'/'sell'，price 为空时按最新收盘价"""
+        if price is None:
+            price = self.price(symbol)
+        bars = self.dispatcher.buffers.get(symbol)
+        timestamp = float(bars.last[0]) / 1000 if bars is not None and bars.n else time.time()
+        return self.dispatcher.broker.submit(symbol, side, amount, price, timestamp)
+
+    def buy(self, symbol, amount, price=None):
+        return self.order(symbol, 'long', amount, price)
+
+    def sell(self, symbol, amount, price=None):
+        return self.order(symbol, 'short', amount, price)
+
+    def close(self, symbol, price=None):
+        size = self.position(symbol)
+        if size:
+            return self.order(symbol, 'short' if size > 0 else 'long', abs(size), price)
+
+
+class PositionBook:
+    """按成交维护每个交易对的持仓和均价，平仓时计算已实现盈亏，模拟撮合和实盘下单共用
+
+    平仓盈亏通过 on_close(pnl, entry_time, exit_time, trade) 通知，trade 为被平掉的持仓
+    （交易对、方向、数量、均价）。
+    """
+
+    def __init__(self, on_close):
+        self.on_close = on_close
+        self.positions = {}  # symbol -> [带符号数量, 均价, 开仓时间, 未计入的开仓手续费]
+        self.realized = []
+
+    def position(self, symbol):
+        position = self.positions.get(symbol)
+        return position[0] if position else 0.0
+
+    def pending(self, symbol):
+        """已下单未成交的带符号数量，立即成交时总是 0"""
+        return 0.0
+
+    def _apply(self, symbol, qty, price, fee, timestamp):
+        position = self.positions.get(symbol)
+        if position is None:
+            # 开仓手续费先挂在持仓上，平仓时按比例计入盈亏
+            self.positions[symbol] = [qty, price, timestamp, fee]
+            return
+        size, avg, opened, fees = position
+        if size * qty > 0:
+            # 同方向加仓，更新均价
+            total = size + qty
+            self.positions[symbol] = [total, (avg * size + price * qty) / total, opened, fees + fee]
+            return
+        closed = min(abs(qty), abs(size))
+        direction = 1.0 if size > 0 else -1.0
+        entry_fee = fees * closed / abs(size)
+        close_fee = fee * closed / abs(qty)
+        pnl = closed * (price - avg) * direction - entry_fee - close_fee
+        self.realized.append(pnl)
+        self.on_close(pnl, opened, timestamp, {'timestamp': opened, 'symbol': symbol,
+                                               'direction': 'long' if size > 0 else 'short',
+                                               'size': closed * avg, 'entry_price': avg})
+        remaining = size + qty
+        if abs(remaining) < 1e-12:
+            del self.positions[symbol]
+        elif remaining * size > 0:
+            self.positions[symbol] = [remaining, avg, opened, fees - entry_fee]
+        else:
+            # 反手：剩余部分按成交价开新仓
+            self.positions[symbol] = [remaining, price, timestamp, fee - close_fee]
+
+
+class PaperBroker(PositionBook):
+    """模拟撮合：按给定价格立即成交，计算手续费和已实现盈亏，回测和模拟盘共用
+
+    on_close 默认更新 FundManager，实盘策略可传入 TradingStrategy.record_close。
+    """
+
+    def __init__(self, fund_manager=None, fee_rate=0.0, on_close=None):
+        self.fund_manager = fund_manager or FundManager(TRADE_PARAMS['initial_balance'])
+        super().__init__(on_close or (lambda pnl, entry_time, exit_time, trade=None:
+                                      self.fund_manager.update_balance(pnl)))
+        self.fee_rate = fee_rate
+        self.dispatcher = None
+        self.fills = []
+
+    def submit(self, symbol, side, amount, price, timestamp, fee=None):
+        """fee 为空时按 fee_rate 计算，逐笔模拟器按挂单/吃单费率传入"""
+        sign = 1.0 if side in ('long', 'buy') else -1.0
+        if fee is None:
+            fee = amount * price * self.fee_rate
+        fill = {'symbol': symbol, 'side': side, 'amount': amount, 'price': price,
+                'fee': fee, 'timestamp': timestamp}
+        self._apply(symbol, sign * amount, price, fee, timestamp)
+        self.fills.append(fill)
+        if self.dispatcher is not None:
+            self.dispatcher.on_fill(fill)
+        return fill
+
+
+class LiveBroker(PositionBook):
+    """实盘下单：先过 TradingStrategy 的组合风控，再通过执行引擎异步下单，成交增量转换为 on_fill 事件
+
+    平仓盈亏交给 TradingStrategy.record_close，资金和绩效统计随之更新。
+    未完成的订单按交易对记在 _orders 中，插件通过 context.pending 判断是否还有订单在途。
+    """
+
+    def __init__(self, strategy):
+        super().__init__(strategy.record_close)
+        self.strategy = strategy
+        self.fund_manager = strategy.fund_manager
+        self.dispatcher = None
+        self._filled = {}
+        self._orders = {}
+        self._lock = threading.Lock()
+        strategy.executor.on_update = self._on_update
+
+    def pending(self, symbol):
+        # 执行引擎线程会增删 _orders，先复制一份再遍历
+        return sum((t.quantity - t.filled) * (1.0 if t.side in ('long', 'buy') else -1.0)
+                   for t in list(self._orders.values()) if t.symbol == symbol)
+
+    def submit(self, symbol, side, amount, price, timestamp):
+        self.strategy.risk.enforce(symbol, side, amount, price)
+        tracked = self.strategy.executor.submit(symbol, side, amount, price)
+        self._track(tracked, 0.0)
+        return tracked
+
+    def _track(self, tracked, filled):
+        self._filled[tracked.client_order_id] = filled
+        self._orders[tracked.client_order_id] = tracked
+        # 下单返回前订单可能已经结束，补一次更新
+        self._on_update(tracked)
+
+    def owns(self, client_order_id):
+        """订单是否由插件通过本对象下单、还在跟踪成交"""
+        return client_order_id in self._filled
+
+    def adopt(self, tracked, filled):
+        """热启动后接回快照里的插件订单：filled 为快照时已记账的成交量，之后的增量照常转成 on_fill"""
+        self._track(tracked, filled)
+
+    def _on_update(self, tracked):
+        cid = tracked.client_order_id
+        # 执行引擎线程和下单线程都会调用，同一笔成交只能记一次
+        with self._lock:
+            previous = self._filled.get(cid)
+            if previous is None:
+                return
+            if tracked.done:
+                # 没有新成交就结束（撤单、拒单）的订单也要移出跟踪
+                self._filled.pop(cid, None)
+                self._orders.pop(cid, None)
+            elif tracked.filled > previous:
+                self._filled[cid] = tracked.filled
+            if tracked.filled <= previous:
+                return
+            amount = tracked.filled - previous
+            sign = 1.0 if tracked.side in ('long', 'buy') else -1.0
+            order = tracked.order or {}
+            price = order.get('average') or tracked.price
+            # 交易所返回的手续费是整笔订单累计值，按本次成交占比分摊
+            fee = (order.get('fee') or {}).get('cost') or 0.0
+            fee = fee * amount / tracked.filled
+            timestamp = time.time()
+            self.strategy.risk.on_fill(tracked.symbol, tracked.side, amount, price)
+            self._apply(tracked.symbol, sign * amount, price, fee, timestamp)
+        fill = {'symbol': tracked.symbol, 'side': tracked.side, 'amount': amount, 'price': price,
+                'fee': fee, 'timestamp': timestamp, 'client_order_id': cid}
+        if self.dispatcher is not None:
+            self.dispatcher.on_fill(fill)
+
+
+class EventDispatcher:
+    """把K线、行情和成交事件分发给所有插件
+
+    实盘时用 on_ohlcv 喂入最新K线列表（最后一根为未收盘K线），
+    每出现一根新收盘K线触发一次 on_bar；回测时用 replay 整段回放。
+    """
+
+    def __init__(self, plugins=(), broker=None, capacity=4096):
+        self.broker = broker or PaperBroker()
+        self.broker.dispatcher = self
+        self.capacity = capacity
+        self.buffers = {}
+        self.context = StrategyContext(self)
+        self.plugins = []
+        self.bars_dispatched = 0
+        for plugin in plugins:
+            self.add_plugin(plugin)
+
+    def add_plugin(self, plugin):
+        self.plugins.append(plugin)
+        plugin.on_start(self.context)
+
+    def remove_plugin(self, plugin):
+        self.plugins.remove(plugin)
+
+    def buffer(self, symbol):
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            buffer = self.buffers[symbol] = BarBuffer(self.capacity)
+        return buffer
+
+    def on_ohlcv(self, symbol, ohlcv):
+        """同步实盘K线，返回新收盘的K线数量；首次调用只做预热，不触发回调"""
+        if len(ohlcv) < 2:
+            return 0
+        buffer = self.buffers.get(symbol)
+        if buffer is None or buffer.n == 0:
+            self.buffer(symbol).load(ohlcv[:-1])
+            return 0
+        last_ts = buffer.data[buffer.n - 1, 0]
+        count = 0
+        for bar in ohlcv[:-1]:
+            if bar[0] > last_ts:
+                buffer.append(bar)
+                self._dispatch_bar(symbol, buffer)
+                count += 1
+        return count
+
+    def on_bar(self, symbol, bar):
+        """推送一根已收盘K线"""
+        buffer = self.buffer(symbol)
+        buffer.append(bar)
+        self._dispatch_bar(symbol, buffer)
+
+    def _dispatch_bar(self, symbol, buffer):
+        context = self.context
+        for plugin in self.plugins:
+            plugin.on_bar(context, symbol, buffer)
+        self.bars_dispatched += 1
+
+    def on_tick(self, symbol, ticker):
+        context = self.context
+        for plugin in self.plugins:
+            plugin.on_tick(context, symbol, ticker)
+
+    def on_fill(self, fill):
+        context = self.context
+        for plugin in self.plugins:
+            plugin.on_fill(context, fill)
+
+    def replay(self, symbol, ohlcv, warmup=1):
+        """整段回放历史K线：数据一次写入缓冲区，逐根推进可见长度并触发 on_bar"""
+        buffer = self.buffer(symbol)
+        buffer.load(ohlcv, closed=0)
+        plugins = self.plugins
+        context = self.context
+        for n in range(warmup, buffer.size + 1):
+            buffer.n = n
+            for plugin in plugins:
+                plugin.on_bar(context, symbol, buffer)
+        self.bars_dispatched += max(buffer.size - warmup + 1, 0)
+        return self.broker
+
+
+def run_plugins(plugins, symbol, ohlcv, initial_balance=None, fee_rate=0.0, warmup=1):
+    """用模拟撮合离线回测一组插件，每个插件独立的资金，返回 {插件名: 结果}"""
+    from analytics import PerformanceTracker
+    initial_balance = TRADE_PARAMS['initial_balance'] if initial_balance is None else initial_balance
+    results = {}
+    for plugin in plugins:
+        fund_manager = FundManager(initial_balance)
+        tracker = PerformanceTracker(initial_balance)
+
+        def on_close(pnl, entry_time, exit_time, trade=None, fund_manager=fund_manager, tracker=tracker):
+            fund_manager.update_balance(pnl)
+            tracker.update(pnl, entry_time, exit_time)
+
+        broker = PaperBroker(fund_manager, fee_rate, on_close)
+        EventDispatcher([plugin], broker).replay(symbol, ohlcv, warmup)
+        results[plugin.name] = dict(tracker.report(), fills=len(broker.fills))
+    return results
+
+
+def benchmark(bars=500000, plugins=4, seed=0):
+    """回放合成K线，统计调度器每秒分发的K线数"""
+    rng = np.random.default_rng(seed)
+    close = 30000 + np.cumsum(rng.normal(0, 10, bars))
+    opens = close + rng.normal(0, 3, bars)
+    ohlcv = np.column_stack([np.arange(bars) * 60000.0, opens, np.maximum(opens, close) + 5,
+                             np.minimum(opens, close) - 5, close, rng.uniform(1, 10, bars)])
+
+    idle = EventDispatcher([StrategyPlugin() for _ in range(plugins)])
+    start = time.perf_counter()
+    idle.replay('BTC/USDT', ohlcv)
+    idle_elapsed = time.perf_counter() - start
+
+    trend = EventDispatcher([TrendPlugin()])
+    start = time.perf_counter()
+    broker = trend.replay('BTC/USDT', ohlcv)
+    trend_elapsed = time.perf_counter() - start
+
+    return {
+        'bars': bars,
+        'plugins': plugins,
+        'dispatch_bars_per_sec': bars / idle_elapsed,
+        'dispatch_calls_per_sec': bars * plugins / idle_elapsed,
+        'trend_bars_per_sec': bars / trend_elapsed,
+        'trend_fills': len(broker.fills),
+        'trend_balance': broker.fund_manager.balance
+    }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
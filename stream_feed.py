@@ -0,0 +1,408 @@
+import asyncio
+import json
+import logging
+import aiohttp
+from aiohttp import web
+from order_book import LocalOrderBook
+
+# 各交易所WebSocket地址，OKX的K线频道和行情/深度频道不在同一个地址
+WS_URLS = {
+    'okx': {
+        'live': {'business': 'wss://ws.okx.com:8443/ws/v5/business',
+                 'public': 'wss://ws.okx.com:8443/ws/v5/public'},
+        'sandbox': {'business': 'wss://wspap.okx.com:8443/ws/v5/business?brokerId=9999',
+                    'public': 'wss://wspap.okx.com:8443/ws/v5/public?brokerId=9999'}
+    },
+    'binance': {
+        'live': {'stream': 'wss://stream.binance.com:9443/stream'},
+        'sandbox': {'stream': 'wss://testnet.binance.vision/stream'}
+    }
+}
+
+
+class OkxProtocol:
+    """OKX v5 WebSocket 订阅和消息解析"""
+
+    def __init__(self, timeframe):
+        self.timeframe = timeframe
+
+    def market_id(self, symbol):
+        return symbol.replace('/', '-')
+
+    def endpoint(self, channel):
+        return 'business' if channel == 'kline' else 'public'
+
+    def subscribe_message(self, channels, market_ids):
+        names = {'kline': f'candle{self.timeframe}', 'ticker': 'tickers', 'book': 'books'}
+        args = [{'channel': names[c], 'instId': m} for c in channels for m in market_ids]
+        return json.dumps({'op': 'subscribe', 'args': args})
+
+    def ping_message(self):
+        return 'ping'
+
+    def parse(self, raw):
+        """返回 (类型, 交易所交易对ID, 数据) 列表"""
+        if raw == 'pong':
+            return []
+        msg = json.loads(raw)
+        arg = msg.get('arg', {})
+        channel = arg.get('channel', '')
+        market_id = arg.get('instId')
+        events = []
+        for item in msg.get('data', []):
+            if channel.startswith('candle'):
+                bar = [int(item[0])] + [float(x) for x in item[1:6]]
+                events.append(('kline', market_id, {'bar': bar, 'closed': item[8] == '1'}))
+            elif channel == 'tickers':
+                events.append(('ticker', market_id, {
+                    'last': float(item['last']), 'open': float(item['open24h']),
+                    'high': float(item['high24h']), 'low': float(item['low24h']),
+                    'volume': float(item['vol24h']), 'timestamp': int(item['ts'])
+                }))
+            elif channel.startswith('books'):
+                # 第一条为全量快照，之后为增量，按 seqId / prevSeqId 衔接
+                events.append(('book', market_id, {
+                    'bids': [[float(p), float(s)] for p, s, *_ in item['bids']],
+                    'asks': [[float(p), float(s)] for p, s, *_ in item['asks']],
+                    'timestamp': int(item['ts']),
+                    'seq': item.get('seqId'),
+                    'prev_seq': item.get('prevSeqId'),
+                    'snapshot': msg.get('action') == 'snapshot'
+                }))
+        return events
+
+
+class BinanceProtocol:
+    """币安组合流订阅和消息解析"""
+
+    def __init__(self, timeframe):
+        self.timeframe = timeframe
+
+    def market_id(self, symbol):
+        return symbol.replace('/', '').lower()
+
+    def endpoint(self, channel):
+        return 'stream'
+
+    def subscribe_message(self, channels, market_ids):
+        names = {'kline': f'kline_{self.timeframe}', 'ticker': 'ticker', 'book': 'depth@100ms'}
+        params = [f'{m}@{names[c]}' for c in channels for m in market_ids]
+        return json.dumps({'method': 'SUBSCRIBE', 'params': params, 'id': 1})
+
+    def ping_message(self):
+        return None
+
+    def parse(self, raw):
+        msg = json.loads(raw)
+        stream = msg.get('stream')
+        data = msg.get('data')
+        if not stream or data is None:
+            return []
+        market_id = stream.split('@')[0]
+        if '@kline' in stream:
+            k = data['k']
+            bar = [int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])]
+            return [('kline', market_id, {'bar': bar, 'closed': k['x']})]
+        if stream.endswith('@ticker'):
+            return [('ticker', market_id, {
+                'last': float(data['c']), 'open': float(data['o']), 'high': float(data['h']),
+                'low': float(data['l']), 'volume': float(data['v']), 'timestamp': int(data['E'])
+            })]
+        if '@depth' in stream:
+            # 增量深度：U / u 为本条的首末序号，合约另有 pu，需先用REST快照初始化
+            return [('book', market_id, {
+                'bids': [[float(p), float(s)] for p, s in data['b']],
+                'asks': [[float(p), float(s)] for p, s in data['a']],
+                'timestamp': data.get('E'),
+                'seq': data['u'],
+                'first_seq': data['U'],
+                'prev_seq': data.get('pu'),
+                'snapshot': False
+            })]
+        return []
+
+
+PROTOCOLS = {'okx': OkxProtocol, 'binance': BinanceProtocol}
+
+
+class StreamFeed:
+    """WebSocket行情订阅，在内存中增量维护K线，只把变化部分推送给回调
+
+    断线后按指数退避自动重连并重新订阅。url 参数可指向本地 ReplayServer 用于测试。
+    深度频道订阅增量数据，每个交易对维护一个 LocalOrderBook；book_snapshot(symbol)
+    返回REST快照，用于首次同步（币安）和发现序号缺口后的重新同步。快照请求在线程池中执行，
+    不阻塞事件循环，期间收到的增量先缓存，快照到达后按序号重放。
+    backfill(symbol, since) 返回 since 之后的REST K线，重连后用它补齐断线期间错过的K线。
+    """
+
+    def __init__(self, exchange_name, symbols, timeframe='1m', channels=('kline', 'ticker', 'book'),
+                 simulated=True, url=None, proxy=None, max_candles=500, on_update=None,
+                 record_path=None, idle_timeout=25, book_snapshot=None, book_depth=None, backfill=None):
+        self.exchange_name = exchange_name
+        self.symbols = list(symbols)
+        self.timeframe = timeframe
+        self.channels = list(channels)
+        self.protocol = PROTOCOLS[exchange_name](timeframe)
+        self.proxy = proxy
+        self.max_candles = max_candles
+        self.on_update = on_update
+        self.record_path = record_path
+        self.idle_timeout = idle_timeout
+        self.book_snapshot = book_snapshot
+        self.book_depth = book_depth
+        self.backfill = backfill
+        self.logger = logging.getLogger('行情推送')
+
+        self.symbol_by_id = {self.protocol.market_id(s): s for s in self.symbols}
+        urls = WS_URLS[exchange_name]['sandbox' if simulated else 'live']
+        # 按地址分组订阅，指定url时所有频道都连到同一个地址
+        self.groups = {}
+        for channel in self.channels:
+            endpoint = self.protocol.endpoint(channel)
+            self.groups.setdefault(url or urls[endpoint], []).append(channel)
+
+        self.candles = {s: [] for s in self.symbols}
+        self.tickers = {}
+        self.books = {}  # symbol -> LocalOrderBook
+        self.resyncs = 0
+        self._resyncing = {}  # symbol -> 快照请求期间缓存的增量
+        self.reconnects = 0
+        self.backfilled = 0
+        self.running = False
+        self._tasks = []
+        self._record_file = None
+
+    def seed(self, symbol, ohlcv):
+        """用REST获取的K线初始化，之后由推送增量更新"""
+        self.candles[symbol] = [list(bar) for bar in ohlcv[-self.max_candles:]]
+
+    async def run(self):
+        self.running = True
+        if self.record_path:
+            self._record_file = open(self.record_path, 'a', encoding='utf-8')
+        try:
+            async with aiohttp.ClientSession() as session:
+                self._tasks = [asyncio.ensure_future(self._connection_loop(session, url, channels))
+                               for url, channels in self.groups.items()]
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            if self._record_file:
+                self._record_file.close()
+                self._record_file = None
+
+    def stop(self):
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+
+    async def _connection_loop(self, session, url, channels):
+        backoff = 1
+        market_ids = list(self.symbol_by_id)
+        connected = False
+        while self.running:
+            try:
+                async with session.ws_connect(url, proxy=self.proxy) as ws:
+                    # 断线期间的深度增量已丢失，重连后重新同步
+                    for book in self.books.values():
+                        book.synced = False
+                    await ws.send_str(self.protocol.subscribe_message(channels, market_ids))
+                    self.logger.info(f'已订阅 {url} {channels}')
+                    backoff = 1
+                    # 先订阅再补K线，补齐期间的推送留在连接缓冲里，读取时按时间戳去重
+                    if connected and 'kline' in channels:
+                        await self._backfill()
+                    connected = True
+                    await self._read_loop(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f'行情连接异常: {e}')
+            if not self.running:
+                break
+            self.reconnects += 1
+            self.logger.info(f'{backoff}秒后重连')
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def _backfill(self):
+        """用REST补齐断线期间错过的K线，逐根按推送同样的增量回调"""
+        if self.backfill is None:
+            return
+        loop = asyncio.get_running_loop()
+        for symbol in self.symbols:
+            candles = self.candles[symbol]
+            if not candles:
+                continue
+            try:
+                bars = await loop.run_in_executor(None, self.backfill, symbol, int(candles[-1][0]))
+            except Exception as e:
+                self.logger.error(f'{symbol} 断线补K线失败: {e}')
+                continue
+            for i, bar in enumerate(bars):
+                # 只有最后一根可能还未收盘
+                delta = self._apply_bar(symbol, [int(bar[0])] + [float(x) for x in bar[1:6]], i < len(bars) - 1)
+                if delta is None:
+                    continue
+                self.backfilled += delta['appended']
+                if self.on_update:
+                    self.on_update(delta)
+
+    async def _read_loop(self, ws):
+        waiting_pong = False
+        while self.running:
+            try:
+                msg = await ws.receive(timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                # 空闲超时先发心跳，再次超时则认为连接已失效
+                ping = self.protocol.ping_message()
+                if waiting_pong or ping is None:
+                    return
+                await ws.send_str(ping)
+                waiting_pong = True
+                continue
+            waiting_pong = False
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                return
+            if self._record_file:
+                self._record_file.write(msg.data + '\n')
+            self.handle_message(msg.data)
+
+    def handle_message(self, raw):
+        for kind, market_id, data in self.protocol.parse(raw):
+            symbol = self.symbol_by_id.get(market_id)
+            if symbol is None:
+                continue
+            if kind == 'kline':
+                delta = self._apply_bar(symbol, data['bar'], data['closed'])
+            elif kind == 'ticker':
+                self.tickers[symbol] = data
+                delta = {'type': 'ticker', 'symbol': symbol, 'ticker': data}
+            else:
+                delta = self._apply_book(symbol, data)
+            if delta is not None and self.on_update:
+                self.on_update(delta)
+
+    def _apply_book(self, symbol, data):
+        book = self.books.get(symbol)
+        if book is None:
+            # 不给订单簿传 resync，缺口由这里异步取快照，避免在事件循环里发起REST请求
+            book = self.books[symbol] = LocalOrderBook(symbol, self.book_depth)
+        if data['snapshot']:
+            # 推送的全量快照比正在请求的REST快照更新，放弃缓存
+            self._resyncing.pop(symbol, None)
+            book.apply_snapshot(data, data['seq'])
+        elif symbol in self._resyncing:
+            self._resyncing[symbol].append(data)
+            return None
+        elif not self._update_book(book, data):
+            if not book.synced and self.book_snapshot is not None:
+                self._resync(symbol, [data])
+            return None
+        return {'type': 'book', 'symbol': symbol, 'book': book}
+
+    def _update_book(self, book, data):
+        return book.apply_update(data['bids'], data['asks'], data['seq'], data.get('prev_seq'),
+                                 data['timestamp'], data.get('first_seq'))
+
+    def _resync(self, symbol, buffered):
+        """在线程池中请求快照，完成前到达的增量追加到 buffered"""
+        self._resyncing[symbol] = buffered
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中（例如离线回放录制的消息），直接同步请求
+            self._on_snapshot(symbol, None)
+            return
+        future = loop.run_in_executor(None, self.book_snapshot, symbol)
+        future.add_done_callback(lambda future: self._on_snapshot(symbol, future))
+
+    def _on_snapshot(self, symbol, future):
+        buffered = self._resyncing.pop(symbol, None)
+        if buffered is None:
+            return  # 请求期间收到了推送快照
+        try:
+            snapshot = self.book_snapshot(symbol) if future is None else future.result()
+        except Exception as e:
+            # 订单簿保持未同步，下一条增量再重试
+            self.logger.error(f'{symbol} 订单簿快照获取失败: {e}')
+            return
+        book = self.books[symbol]
+        book.apply_snapshot(snapshot)
+        self.resyncs += 1
+        for i, data in enumerate(buffered):
+            if not self._update_book(book, data) and not book.synced:
+                # 快照早于缓存的第一条增量，衔接不上：事件循环中再取一次，同步调用时留给下一条增量
+                if future is not None:
+                    self._resync(symbol, buffered[i:])
+                return
+        if self.on_update:
+            self.on_update({'type': 'book', 'symbol': symbol, 'book': book})
+
+    def _apply_bar(self, symbol, bar, closed):
+        candles = self.candles[symbol]
+        if candles and bar[0] < candles[-1][0]:
+            return None  # 过期推送
+        if candles and bar[0] == candles[-1][0]:
+            if candles[-1] == bar:
+                return None
+            candles[-1] = bar
+            appended = False
+        else:
+            candles.append(bar)
+            if len(candles) > self.max_candles:
+                del candles[0]
+            appended = True
+        return {'type': 'kline', 'symbol': symbol, 'bar': bar, 'appended': appended, 'closed': closed}
+
+
+class ReplayServer:
+    """本地WebSocket替身服务器，按顺序回放录制的消息，用于离线测试 StreamFeed"""
+
+    def __init__(self, messages, interval=0.0, close_after_replay=False, host='127.0.0.1', port=0):
+        self.messages = list(messages)
+        self.interval = interval
+        self.close_after_replay = close_after_replay
+        self.host = host
+        self.port = port
+        self.subscriptions = []
+        self.connections = 0
+        self._runner = None
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, encoding='utf-8') as f:
+            return cls([line.rstrip('\n') for line in f if line.strip()], **kwargs)
+
+    async def _handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        # 先等客户端订阅，再开始回放
+        msg = await ws.receive()
+        self.subscriptions.append(msg.data)
+        for message in self.messages:
+            await ws.send_str(message)
+            if self.interval:
+                await asyncio.sleep(self.interval)
+        if self.close_after_replay:
+            await ws.close()
+        else:
+            async for _ in ws:
+                pass
+        return ws
+
+    async def start(self):
+        """启动服务器，返回连接地址"""
+        app = web.Application()
+        app.router.add_get('/', self._handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port=0 时由系统分配端口，从已监听的地址里取回
+        self.port = self._runner.addresses[0][1]
+        return f'ws://{self.host}:{self.port}/'
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from analytics import PerformanceTracker, RunningStats, compute_metrics
+
+
+def test_tracker_matches_batch_metrics():
+    rng = np.random.default_rng(0)
+    pnls = rng.normal(5, 100, 300)
+    entry_times = np.cumsum(rng.integers(60, 600, 300)).astype(np.float64)
+    exit_times = entry_times + rng.integers(30, 3000, 300)
+    tracker = PerformanceTracker(10000, window=50, periods_per_year=365)
+    for pnl, entry, exit_ in zip(pnls, entry_times, exit_times):
+        tracker.update(pnl, entry, exit_)
+    report = tracker.report()
+    expected = compute_metrics(pnls, 10000, entry_times, exit_times, window=50, periods_per_year=365)
+    assert report.keys() == expected.keys()
+    for key, value in expected.items():
+        assert report[key] == pytest.approx(value, rel=1e-9, abs=1e-12), key
+
+
+def test_running_stats_sliding_window_matches_numpy():
+    values = np.random.default_rng(1).normal(100, 15, 500)
+    stats = RunningStats()
+    window = 30
+    for k, x in enumerate(values):
+        stats.add(x)
+        if k >= window:
+            stats.remove(values[k - window])
+        recent = values[max(k - window + 1, 0):k + 1]
+        assert stats.n == len(recent)
+        assert stats.mean == pytest.approx(recent.mean(), rel=1e-9)
+        if len(recent) > 1:
+            assert stats.variance == pytest.approx(np.var(recent, ddof=1), rel=1e-6)
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import pytest
+from candle_store import COLUMNS, CandleStore
+from fake_exchange import generate_ohlcv
+
+
+def _series(store):
+    return store.read_array('okx', 'BTC/USDT', '1m')
+
+
+def test_gap_fill_switches_to_new_generation(tmp_path):
+    store = CandleStore(str(tmp_path))
+    ohlcv = generate_ohlcv(100)
+    store.write('okx', 'BTC/USDT', '1m', np.delete(ohlcv, np.s_[40:50], axis=0))
+    assert store.write('okx', 'BTC/USDT', '1m', ohlcv[40:50]) == 10
+    np.testing.assert_array_equal(_series(store), ohlcv)
+    path = store._path('okx', 'BTC/USDT', '1m')
+    assert sorted(os.listdir(path)) == ['CURRENT', 'g1']
+    # 新一代上继续追加和再次重写
+    store.write('okx', 'BTC/USDT', '1m', generate_ohlcv(120)[100:])
+    store.write('okx', 'BTC/USDT', '1m', ohlcv[:1])
+    assert len(_series(store)) == 120 and sorted(os.listdir(path)) == ['CURRENT', 'g1']
+
+
+def test_crash_during_rewrite_keeps_previous_generation(tmp_path, monkeypatch):
+    store = CandleStore(str(tmp_path))
+    ohlcv = generate_ohlcv(100)
+    before = np.delete(ohlcv, np.s_[40:50], axis=0)
+    store.write('okx', 'BTC/USDT', '1m', before)
+
+    def crash(src, dst):
+        raise OSError('断电')
+
+    monkeypatch.setattr(os, 'replace', crash)
+    with pytest.raises(OSError):
+        store.write('okx', 'BTC/USDT', '1m', ohlcv[40:50])
+    monkeypatch.undo()
+    # 新一代已经写了一半，但 CURRENT 没有切换，读到的仍是完整对齐的旧数据
+    path = store._path('okx', 'BTC/USDT', '1m')
+    assert os.path.exists(os.path.join(path, 'g1', f'{COLUMNS[0]}.bin'))
+    np.testing.assert_array_equal(_series(store), before)
+    assert store.write('okx', 'BTC/USDT', '1m', ohlcv[40:50]) == 10
+    np.testing.assert_array_equal(_series(store), ohlcv)
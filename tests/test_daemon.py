@@ -0,0 +1,35 @@
+import json
+import socket
+import time
+from daemon import ViewerServer
+
+
+def test_slow_viewer_does_not_block_publish():
+    server = ViewerServer('127.0.0.1', 0, queue_size=4)
+    port = server.start()
+    try:
+        slow = socket.create_connection(('127.0.0.1', port))
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        fast = socket.create_connection(('127.0.0.1', port))
+        deadline = time.monotonic() + 5
+        while len(server.clients) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # 慢界面从不读取，它的发送线程很快阻塞；发布方不受影响
+        blob = 'x' * 100000
+        started = time.monotonic()
+        for i in range(200):
+            server.publish({'type': 'update', 'seq': i, 'blob': blob})
+        assert time.monotonic() - started < 2.0
+
+        reader = fast.makefile('r', encoding='utf-8')
+        seqs = []
+        while not seqs or seqs[-1] != 199:
+            seqs.append(json.loads(reader.readline())['seq'])
+        assert seqs == sorted(seqs)
+        slow_viewer = next(v for v in server.clients if v.addr[1] == slow.getsockname()[1])
+        assert slow_viewer.dropped > 0
+    finally:
+        server.stop()
+        slow.close()
+        fast.close()
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from fake_exchange import FakeExchange, generate_ohlcv
+from history_downloader import HistoryDownloader, load_columns
+from order_executor import RetryPolicy
+
+MINUTE = 60000
+NO_WAIT = RetryPolicy(max_retries=10, base_delay=0.0, max_delay=0.0, jitter=0.0)
+
+
+def make_data(bars=5000):
+    ohlcv = generate_ohlcv(bars, start=1700000040000)
+    return ohlcv, int(ohlcv[0, 0]), int(ohlcv[-1, 0]) + MINUTE
+
+
+def downloader(exchange, root, **kwargs):
+    kwargs.setdefault('retry_policy', NO_WAIT)
+    return HistoryDownloader(exchange, str(root), page_limit=100, chunk_pages=5, **kwargs)
+
+
+def test_resume_after_crash_skips_finished_chunks(tmp_path):
+    ohlcv, start, end = make_data()
+    crash = FakeExchange(ohlcv)
+    original = crash.get_ohlcv
+    calls = {'n': 0}
+
+    def crashing(*args, **kwargs):
+        calls['n'] += 1
+        if calls['n'] > 22:
+            raise KeyboardInterrupt
+        return original(*args, **kwargs)
+
+    crash.get_ohlcv = crashing
+    with pytest.raises(KeyboardInterrupt):
+        downloader(crash, tmp_path, max_workers=1).download('BTC/USDT', '1m', start, end)
+
+    fake = FakeExchange(ohlcv)
+    path, stats = downloader(fake, tmp_path, max_workers=2).download('BTC/USDT', '1m', start, end)
+    # 每段 5 页，崩溃前完成了 4 段，续传只下载剩下的 6 段
+    assert stats['chunks'] == 10 and stats['resumed_chunks'] == 4
+    assert stats['downloaded'] == 3000 and fake.calls['get_ohlcv'] == 30
+    assert np.array_equal(load_columns(path), ohlcv)
+
+
+def test_duplicate_rows_keep_latest(tmp_path):
+    ohlcv, start, end = make_data(1000)
+    fake = FakeExchange(ohlcv)
+    original = fake.get_ohlcv
+
+    def duplicated(*args, **kwargs):
+        # 交易所在页尾重复返回同一根K线，后一条是修正后的数据
+        page = original(*args, **kwargs)
+        return page + [page[-1][:4] + [page[-1][4] + 1.0, page[-1][5]]] if page else page
+
+    fake.get_ohlcv = duplicated
+    path, stats = downloader(fake, tmp_path).download('BTC/USDT', '1m', start, end)
+    data = load_columns(path)
+    assert np.array_equal(data[:, 0], ohlcv[:, 0])
+    last_of_page = np.arange(99, 1000, 100)
+    assert np.array_equal(data[last_of_page, 4], ohlcv[last_of_page, 4] + 1.0)
+    assert stats['gaps'] == []
+
+
+def test_gaps_recorded_with_injected_errors(tmp_path):
+    ohlcv, start, end = make_data()
+    fake = FakeExchange(ohlcv, failure_rate=0.2, gap_rate=0.01, seed=3)
+    path, stats = downloader(fake, tmp_path).download('BTC/USDT', '1m', start, end)
+    data = load_columns(path)
+    assert np.array_equal(data, fake.ohlcv)
+    assert stats['retries'] == fake.failures > 0
+    # 缺口与替身交易所删掉的K线逐一对应
+    present = set(data[:, 0].astype(np.int64).tolist())
+    missing = [t for t in range(start, end, MINUTE) if t not in present]
+    covered = [t for a, b in stats['gaps'] for t in range(a, b, MINUTE)]
+    assert covered == missing and len(missing) == len(ohlcv) - len(fake.ohlcv) > 0
@@ -0,0 +1,13 @@
+import numpy as np
+import pytest
+from indicators import EMA, _recursive_smooth
+
+
+@pytest.mark.parametrize('alpha', [1.0, 0.999, 0.9, 0.5, 2 / 15, 0.01])
+def test_recursive_smooth_matches_streaming(alpha):
+    values = np.random.default_rng(0).normal(30000, 100, 1000)
+    stream = EMA(alpha=alpha)
+    expected = np.array([stream.update(x) for x in values])
+    result = _recursive_smooth(values, alpha)
+    assert np.isfinite(result).all()
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
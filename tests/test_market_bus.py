@@ -0,0 +1,85 @@
+import itertools
+import os
+import time
+import numpy as np
+import pytest
+from fake_exchange import FakeExchange, generate_ohlcv
+from market_bus import BusExchange, BusStale, MarketBusReader, MarketBusWriter, MarketDataPublisher
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def name():
+    return f'ouyi_test_{os.getpid()}_{next(_names)}'
+
+
+def test_reader_sees_published_data(name):
+    exchange = FakeExchange(generate_ohlcv(3000), cursor=2000)
+    publisher = MarketDataPublisher(exchange, ['BTC/USDT'], ['1m', '5m', '1h'], name=name,
+                                    capacity=200)
+    try:
+        publisher.run_once()
+        reader = MarketBusReader(name)
+        assert reader.alive()
+        bus = BusExchange(reader)
+        for timeframe in ('1m', '5m', '1h'):
+            expected = exchange.get_ohlcv('BTC/USDT', timeframe, limit=50)
+            np.testing.assert_allclose(bus.get_ohlcv('BTC/USDT', timeframe, 50), expected)
+        assert bus.get_ticker('BTC/USDT')['last'] == exchange.get_ticker('BTC/USDT')['last']
+        reader.close()
+    finally:
+        publisher.close()
+
+
+def test_stale_bus_falls_back_or_raises(name):
+    writer = MarketBusWriter(name, ['BTC/USDT'], ['1m'], capacity=10)
+    try:
+        writer.publish_ticker('BTC/USDT', {'timestamp': 1, 'last': 100.0})
+        exchange = FakeExchange(generate_ohlcv(100))
+        reader = MarketBusReader(name)
+        bus = BusExchange(reader, exchange, max_age=60)
+        assert bus.get_ticker('BTC/USDT')['last'] == 100.0 and bus.fallbacks == 0
+        # 发布进程停止更新：转给交易所；没有交易所时报错
+        writer.counters[2] = time.time_ns() - 120 * 10 ** 9
+        assert bus.get_ticker('BTC/USDT')['last'] == exchange.get_ticker('BTC/USDT')['last']
+        assert bus.fallbacks == 1
+        with pytest.raises(BusStale):
+            BusExchange(reader, max_age=60).get_ticker('BTC/USDT')
+        reader.close()
+    finally:
+        writer.close()
+
+
+def test_reader_reattaches_after_publisher_restart(name):
+    writer = MarketBusWriter(name, ['BTC/USDT'], ['1m'], capacity=10)
+    writer.publish_ticker('BTC/USDT', {'timestamp': 1, 'last': 100.0})
+    bus = BusExchange(MarketBusReader(name), max_age=0.05)
+    assert bus.get_ticker('BTC/USDT')['last'] == 100.0
+    # 发布进程重启：旧内存被删除，同名新建一段
+    writer.close()
+    time.sleep(0.1)
+    writer = MarketBusWriter(name, ['BTC/USDT'], ['1m'], capacity=10)
+    try:
+        writer.publish_ticker('BTC/USDT', {'timestamp': 2, 'last': 200.0})
+        assert bus.get_ticker('BTC/USDT')['last'] == 200.0
+        assert bus.reattached == 1
+        bus.reader.close()
+    finally:
+        writer.close()
+
+
+def test_dead_publisher_is_not_alive(name):
+    writer = MarketBusWriter(name, ['BTC/USDT'], ['1m'], capacity=10)
+    try:
+        writer.publish_ticker('BTC/USDT', {'timestamp': 1, 'last': 100.0})
+        reader = MarketBusReader(name)
+        assert reader.alive()
+        if os.name == 'posix':
+            # 找一个不存在的进程号
+            pid = next(p for p in range(2 ** 22 - 1, 1, -1) if not os.path.exists(f'/proc/{p}'))
+            writer.counters[1] = pid
+            assert not reader.alive()
+        reader.close()
+    finally:
+        writer.close()
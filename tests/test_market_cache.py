@@ -0,0 +1,36 @@
+import ccxt
+import market_cache
+from fake_exchange import FakeExchange
+from market_cache import CachedExchange
+
+
+def test_expired_ohlcv_pages_are_evicted(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(market_cache.time, 'monotonic', lambda: now[0])
+    fake = FakeExchange()
+    cached = CachedExchange(fake)
+    first = int(fake.ohlcv[0, 0])
+    for page in range(50):
+        cached.get_ohlcv('BTC/USDT', since=first + page * 6000000)
+        now[0] += 1.0
+    # 有效期 2 秒，分页拉取留下的旧键随后续写入清理掉
+    assert len(cached._cache) <= 3
+    cached.get_ohlcv('BTC/USDT', since=first + 49 * 6000000)
+    assert cached.stats()['ohlcv']['hits'] == 1
+
+
+def test_order_calls_invalidate_balance():
+    fake = FakeExchange()
+    cached = CachedExchange(fake)
+    calls = [lambda: cached.submit_order('BTC/USDT', 'buy', 1.0, 100.0, 'oy1'),
+             lambda: cached.fetch_order_by_client_id('BTC/USDT', 'oy1'),
+             lambda: cached.cancel_order_by_client_id('BTC/USDT', 'oy1')]
+    for call in calls:
+        cached.get_balance()
+        try:
+            call()
+        except ccxt.InvalidOrder:
+            pass  # 已成交的订单不能撤销，但请求已经发出
+        cached.get_balance()
+    # 每次下单相关调用之后都重新查询余额，其余查询命中缓存
+    assert fake.calls['get_balance'] == 1 + len(calls)
@@ -0,0 +1,48 @@
+import numpy as np
+from ohlcv_buffer import OHLCVBuffer
+
+
+def _bars(start, count):
+    t = (start + np.arange(count)) * 60000.0
+    price = 100.0 + start + np.arange(count)
+    return np.column_stack((t, price, price + 1, price - 1, price, np.ones(count)))
+
+
+def test_update_append_and_reset():
+    buffer = OHLCVBuffer(window=5)
+    assert buffer.update([]) is None
+    assert buffer.update(_bars(0, 3), key='BTC/USDT 1m') == 'reset'
+    changed = _bars(0, 3)
+    changed[-1, 4] = 123.0
+    assert buffer.update(changed, key='BTC/USDT 1m') == 'update'
+    assert len(buffer) == 3 and buffer.array()[-1, 4] == 123.0
+    assert buffer.update(_bars(1, 4), key='BTC/USDT 1m') == 'append'
+    assert len(buffer) == 5 and buffer.last_timestamp == 4 * 60000.0
+    # 交易对或周期变化、数据不重叠时整体重置
+    assert buffer.update(_bars(1, 4), key='ETH/USDT 1m') == 'reset'
+    assert buffer.update(_bars(10, 2), key='ETH/USDT 1m') == 'reset'
+    assert np.array_equal(buffer.array(), _bars(10, 2))
+    assert (buffer.resets, buffer.updates, buffer.appends) == (3, 1, 1)
+
+
+def test_window_compaction_keeps_latest_bars():
+    buffer = OHLCVBuffer(window=5)
+    for start in range(40):
+        buffer.update(_bars(start, 3))
+        expected = _bars(max(start - 2, 0), min(start + 3, 5))
+        assert np.array_equal(buffer.array(), expected)
+        assert np.array_equal(buffer.index[buffer.start:buffer.end].astype('int64') // 10 ** 6,
+                              expected[:, 0].astype('int64'))
+    assert buffer.resets == 1
+
+
+def test_views_share_buffer_memory():
+    buffer = OHLCVBuffer(window=5)
+    for start in range(8):
+        buffer.update(_bars(start, 3))
+    assert np.shares_memory(buffer.array(), buffer.values)
+    assert np.shares_memory(buffer.column('close'), buffer.values)
+    df = buffer.dataframe(last=3)
+    assert np.shares_memory(df.to_numpy(), buffer.values)
+    assert np.shares_memory(df.index.to_numpy(), buffer.index)
+    assert np.array_equal(df['close'].to_numpy(), buffer.array(last=3)[:, 4])
@@ -0,0 +1,40 @@
+from multiprocessing import shared_memory
+import numpy as np
+import optimizer
+from fake_exchange import generate_ohlcv
+from fund_manager import FundManager
+
+
+def test_signal_cache_does_not_leak_between_datasets():
+    first, second = generate_ohlcv(5000, seed=1), generate_ohlcv(5000, seed=2)
+    params = {'hold_bars': 60}
+    optimizer._run_backtest(params, 100.0, first)
+    cached = optimizer._run_backtest(params, 100.0, second)
+    optimizer._signal_cache.clear()
+    fresh = optimizer._run_backtest(params, 100.0, second)
+    assert cached == fresh
+
+
+def test_saved_results_do_not_overwrite_live_balance(tmp_path):
+    results = [{'params': {'risk_percent': 3.0, 'hold_bars': 30, 'win_threshold': 0.8}}]
+    filename = optimizer.ParameterOptimizer(generate_ohlcv(100), initial_balance=100.0).save(
+        results, str(tmp_path / 'results.json'))
+    fund_manager = FundManager(5000.0)
+    fund_manager.leverage = 5
+    fund_manager.load_params(filename)
+    assert fund_manager.balance == 5000.0 and fund_manager.leverage == 5
+    assert fund_manager.risk_percent == 3.0 and fund_manager.params['win_threshold'] == 0.8
+
+
+def test_worker_closes_shared_candles():
+    ohlcv = generate_ohlcv(100)
+    shm = shared_memory.SharedMemory(create=True, size=ohlcv.nbytes)
+    try:
+        np.ndarray(ohlcv.shape, dtype=np.float64, buffer=shm.buf)[:] = ohlcv
+        optimizer._init_worker(shm.name, ohlcv.shape)
+        optimizer._run_backtest({'hold_bars': 15}, 100.0)
+        optimizer._close_candles()
+        assert optimizer._candles is None and optimizer._candles_shm is None
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,68 @@
+import threading
+from order_book import LocalOrderBook
+
+SNAPSHOT = {'bids': [[99.0, 1.0], [98.0, 2.0]], 'asks': [[101.0, 1.0], [102.0, 3.0]], 'nonce': 100}
+
+
+def make_book():
+    resyncs = []
+    book = LocalOrderBook('BTC/USDT', resync=lambda: resyncs.append(1) or SNAPSHOT)
+    book.apply_snapshot(SNAPSHOT)
+    return book, resyncs
+
+
+def test_binance_bridging_and_pu_chain():
+    book, resyncs = make_book()
+    # u <= lastUpdateId 的更新丢弃；第一条满足 U <= L+1 <= u；之后按 pu 衔接
+    assert not book.apply_update([[99.0, 5.0]], [], seq=95, first_seq=90, prev_seq=89)
+    assert book.apply_update([[99.0, 6.0]], [], seq=105, first_seq=98, prev_seq=97)
+    assert book.apply_update([[99.0, 7.0]], [], seq=110, first_seq=106, prev_seq=105)
+    assert book.apply_update([], [[101.0, 0.0]], seq=115, first_seq=111, prev_seq=110)
+    assert resyncs == [] and book.gaps == 0
+    assert book.depth_at('bid', 99.0) == 7.0
+    assert book.best_ask() == 102.0
+
+
+def test_gap_resyncs_once_then_recovers():
+    book, resyncs = make_book()
+    assert book.apply_update([[99.0, 6.0]], [], seq=105, first_seq=98, prev_seq=97)
+    assert not book.apply_update([[99.0, 8.0]], [], seq=130, first_seq=120, prev_seq=119)
+    assert resyncs == [1] and book.gaps == 1
+    # 重新同步后按新快照衔接，不会每条都再同步
+    assert book.apply_update([[99.0, 9.0]], [], seq=102, first_seq=100, prev_seq=99)
+    assert book.apply_update([[99.0, 10.0]], [], seq=103, first_seq=103, prev_seq=102)
+    assert resyncs == [1]
+    assert book.depth_at('bid', 99.0) == 10.0
+
+
+def test_vwap_non_positive_size():
+    book, _ = make_book()
+    assert book.vwap('buy', 0) == 101.0
+    assert book.vwap('sell', -1) == 99.0
+    assert book.vwap('buy', 2.0) == (101.0 + 102.0) / 2
+
+
+def test_concurrent_reads_see_consistent_book():
+    book = LocalOrderBook('BTC/USDT')
+    errors = []
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            spread = book.spread()
+            if spread is not None and spread <= 0:
+                errors.append(spread)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    # 整个盘口在 99/100 和 101/102 之间来回跳：先改买盘再改卖盘，不加锁时会读到买一高于卖一
+    up = ([[101.0, 1.0], [99.0, 0.0]], [[102.0, 1.0], [100.0, 0.0]])
+    down = ([[99.0, 1.0], [101.0, 0.0]], [[100.0, 1.0], [102.0, 0.0]])
+    try:
+        book.apply_snapshot({'bids': [[99.0, 1.0]], 'asks': [[100.0, 1.0]], 'nonce': 0})
+        for seq in range(1, 20001):
+            book.apply_update(*(up if seq % 2 else down), seq=seq)
+    finally:
+        done.set()
+        thread.join()
+    assert book.best_bid() == 99.0 and errors == []
@@ -0,0 +1,65 @@
+import asyncio
+import ccxt
+from order_executor import (MockOrderExchange, OrderExecutor, RetryPolicy, place_order,
+                            place_order_async)
+
+NO_WAIT = RetryPolicy(max_retries=3, base_delay=0.0, max_delay=0.0, jitter=0.0)
+
+
+class FlakyExchange(MockOrderExchange):
+    """下单响应丢失，随后两次查询也失败"""
+
+    def __init__(self):
+        super().__init__(latency=0.0, fill_delay=60.0)
+        self.lost = 1
+        self.fetch_failures = 2
+
+    def submit_order(self, symbol, side, amount, price, client_order_id=None):
+        order = super().submit_order(symbol, side, amount, price, client_order_id)
+        if self.lost:
+            self.lost -= 1
+            raise ccxt.RequestTimeout('响应丢失')
+        return order
+
+    def fetch_order_by_client_id(self, symbol, client_order_id):
+        if self.fetch_failures:
+            self.fetch_failures -= 1
+            raise ccxt.NetworkError('查询失败')
+        return super().fetch_order_by_client_id(symbol, client_order_id)
+
+
+def test_failed_existence_check_does_not_resubmit():
+    exchange = FlakyExchange()
+    order = place_order(exchange, 'BTC/USDT', 'buy', 1.0, 100.0, 'oy1', NO_WAIT, sleep=lambda s: None)
+    assert order['clientOrderId'] == 'oy1'
+    assert exchange.submit_calls == 1
+
+
+def test_async_create_order_uses_same_retry_logic():
+    exchange = FlakyExchange()
+
+    class AsyncWrapper:
+        async def submit_order(self, *args):
+            return exchange.submit_order(*args)
+
+        async def fetch_order_by_client_id(self, *args):
+            return exchange.fetch_order_by_client_id(*args)
+
+    async def no_sleep(seconds):
+        pass
+
+    order = asyncio.run(place_order_async(AsyncWrapper(), 'BTC/USDT', 'buy', 1.0, 100.0, 'oy2',
+                                          NO_WAIT, sleep=no_sleep))
+    assert order['clientOrderId'] == 'oy2' and exchange.submit_calls == 1
+
+
+def test_poll_timeout_cancels_on_exchange():
+    exchange = MockOrderExchange(latency=0.0, fill_delay=60.0)
+    executor = OrderExecutor(exchange, poll_interval=0.01, poll_timeout=0.05, retry_policy=NO_WAIT)
+    try:
+        tracked = executor.submit('BTC/USDT', 'buy', 1.0, 100.0)
+        tracked.future.result(timeout=5)
+    finally:
+        executor.shutdown()
+    assert tracked.status == 'canceled'
+    assert exchange.orders[tracked.client_order_id]['status'] == 'canceled'
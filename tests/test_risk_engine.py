@@ -0,0 +1,62 @@
+import pytest
+from fund_manager import FundManager
+from risk_engine import RiskEngine, RiskRejected
+
+SYMBOL = 'BTC/USDT'
+
+
+def test_rejects_order_notional_and_leverage():
+    engine = RiskEngine(FundManager(10000))
+    assert engine.check(SYMBOL, 'long', 0.5, 10000) is None
+    assert '单笔名义价值' in engine.check(SYMBOL, 'long', 2, 10000)
+
+    engine = RiskEngine(FundManager(10000), {'max_order_notional': 1e9})
+    assert SYMBOL in engine.check(SYMBOL, 'long', 6, 10000)  # 6 倍 > 5 倍
+    engine.on_fill('ETH/USDT', 'long', 4, 10000)
+    engine.on_fill('SOL/USDT', 'short', 4, 10000)
+    assert '总杠杆' in engine.check(SYMBOL, 'long', 3, 10000)  # 合计 11 倍 > 10 倍
+    assert engine.rejections == 2
+    with pytest.raises(RiskRejected) as info:
+        engine.enforce(SYMBOL, 'long', 3, 10000)
+    assert info.value.symbol == SYMBOL
+
+
+def test_rejects_when_liquidation_too_close():
+    engine = RiskEngine(FundManager(10000), {'max_order_notional': 1e9, 'max_symbol_leverage': 1000,
+                                             'max_total_leverage': 1000})
+    # 90 倍杠杆：强平价 10000 - (10000 - 4500) / 90 ≈ 9938.9，距现价不到 1%
+    assert '强平价' in engine.check(SYMBOL, 'long', 90, 10000)
+    assert engine.check(SYMBOL, 'long', 50, 10000) is None
+
+
+def test_kill_switch_blocks_new_risk_but_allows_reducing():
+    engine = RiskEngine(FundManager(10000))
+    engine.on_fill(SYMBOL, 'long', 0.8, 10000)
+    engine.update_mark(SYMBOL, 3000)  # 浮亏 5600，权益回撤 56%
+    assert '回撤' in engine.check(SYMBOL, 'long', 0.01, 3000)
+    assert engine.killed
+    assert engine.check('ETH/USDT', 'short', 0.01, 3000) is not None
+    # 减仓不受回撤止损和单笔名义价值限制
+    assert engine.check(SYMBOL, 'short', 0.8, 30000) is None
+    engine.reset_kill_switch()
+    assert engine.check('ETH/USDT', 'short', 0.01, 3000) is None
+
+
+def test_liquidation_price_matches_cross_margin_formula():
+    engine = RiskEngine(FundManager(10000))
+    engine.on_fill(SYMBOL, 'long', 1, 20000)
+    engine.on_fill('ETH/USDT', 'short', 10, 1500)
+    engine.update_mark(SYMBOL, 21000)
+    engine.update_mark('ETH/USDT', 1400)
+    rate = engine.limits['maintenance_margin_rate']
+    equity = 10000 + 1 * (21000 - 20000) + -10 * (1400 - 1500)
+    assert engine.equity() == pytest.approx(equity)
+    gross = 21000 + 10 * 1400
+    assert engine.liquidation_price(SYMBOL) == pytest.approx(21000 - (equity - rate * gross) / 1)
+    short_liquidation = engine.liquidation_price('ETH/USDT')
+    assert short_liquidation == pytest.approx(1400 - (equity - rate * gross) / -10)
+    assert short_liquidation > 1400
+    # 单独把该交易对推到强平价时，权益正好降到按当前标记价计算的维持保证金
+    engine.update_mark('ETH/USDT', short_liquidation)
+    assert engine.equity() == pytest.approx(rate * gross)
+    assert engine.liquidation_price('XRP/USDT') is None
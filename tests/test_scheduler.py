@@ -0,0 +1,55 @@
+import threading
+import time
+import pytest
+from scheduler import StrategyScheduler, TokenBucket
+
+
+def test_token_bucket_rejects_request_larger_than_capacity():
+    bucket = TokenBucket(2)
+    with pytest.raises(ValueError):
+        bucket.acquire(3)
+    assert bucket.acquire(2, timeout=0.0)
+    assert not bucket.acquire(1, timeout=0.0)
+
+
+def test_low_rate_limit_still_fits_request_cost(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    scheduler = StrategyScheduler({'okx': ['BTC/USDT']}, rate_limits={'okx': 2}, request_cost=3,
+                                  evaluate=lambda strategy, symbol: calls.append(symbol))
+    try:
+        assert scheduler.buckets['okx'].capacity >= 3
+        scheduler.run_once()
+        assert calls == ['BTC/USDT']
+    finally:
+        scheduler.pool.shutdown()
+
+
+def test_evaluations_on_same_exchange_do_not_overlap(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    active = {'okx': 0, 'binance': 0}
+    overlap = {'okx': 0, 'binance': 0}
+    concurrent = []
+    lock = threading.Lock()
+
+    def evaluate(strategy, symbol):
+        name = strategy.exchange.exchange_name
+        with lock:
+            active[name] += 1
+            overlap[name] = max(overlap[name], active[name])
+            concurrent.append(sum(active.values()))
+        time.sleep(0.02)
+        with lock:
+            active[name] -= 1
+
+    pairs = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+    scheduler = StrategyScheduler({'okx': pairs, 'binance': pairs}, max_workers=6,
+                                  rate_limits={'okx': 1000, 'binance': 1000}, evaluate=evaluate)
+    try:
+        scheduler.run_once()
+    finally:
+        scheduler.pool.shutdown()
+    assert overlap == {'okx': 1, 'binance': 1}
+    # 不同交易所之间仍然并发
+    assert max(concurrent) == 2
+    assert all(m['evaluations'] == 1 and m['errors'] == 0 for m in scheduler.report().values())
@@ -0,0 +1,71 @@
+import ccxt
+import numpy as np
+import pytest
+from session_recorder import RecordingExchange, ReplayExchange, ReplayExhausted, read_session
+
+
+class Source:
+    exchange_name = 'fake'
+    simulated = True
+
+    def get_ohlcv(self, symbol, timeframe='1m', limit=100, since=None):
+        return [[1700000000000 + i * 60000, 1.5, 2.0, 1.0, 1.25, np.float64(3.0)] for i in range(limit)]
+
+    def get_order_book(self, symbol):
+        return {'symbol': symbol, 'nonce': None, 'bids': [[99.5, 1], [99.0, 2]], 'asks': [],
+                'info': {'rows': [['99.5', '1']], 'mixed': [[1, None]]}}
+
+    def get_ticker(self, symbol):
+        raise ccxt.NetworkError('超时')
+
+    def get_balance(self):
+        return {('USDT', 'free'): 100.0}
+
+
+def test_round_trip_without_pickle(tmp_path):
+    source = Source()
+    recorder = RecordingExchange(source, str(tmp_path / 'session.rec'))
+    ohlcv = recorder.get_ohlcv('BTC/USDT', limit=5)
+    book = recorder.get_order_book('BTC/USDT')
+    with pytest.raises(Exception):
+        recorder.get_ticker('BTC/USDT')
+    recorder.close()
+
+    meta, records = read_session(recorder.path)
+    assert meta['exchange_name'] == 'fake'
+    assert [r['method'] for r in records] == ['get_ohlcv', 'get_order_book', 'get_ticker']
+    assert records[0]['result'] == ohlcv and type(records[0]['result'][0][0]) is int
+    assert records[1]['result'] == book
+    assert records[2]['result'] == ['NetworkError', '超时']
+
+    player = ReplayExchange(recorder.path)
+    assert player.get_ohlcv('BTC/USDT', limit=5) == ohlcv
+    with pytest.raises(ccxt.NetworkError):
+        player.get_ticker('BTC/USDT')
+
+
+def test_old_pickle_recording_rejected(tmp_path):
+    path = tmp_path / 'old.rec'
+    path.write_bytes(b'OYREC\x01' + b'\x00' * 16)
+    with pytest.raises(ValueError):
+        read_session(str(path))
+
+
+def test_unencodable_payload_recorded_as_marker(tmp_path):
+    recorder = RecordingExchange(Source(), str(tmp_path / 'session.rec'))
+    # 元组作键的 dict 无法编码为 JSON，调用方仍然拿到原始返回值
+    assert recorder.get_balance() == {('USDT', 'free'): 100.0}
+    ohlcv = recorder.get_ohlcv('BTC/USDT', limit=2)
+    recorder.close()
+    assert recorder.encode_errors == 1 and recorder.records == 2
+
+    _, records = read_session(recorder.path)
+    marker, after = records
+    assert marker['method'] == 'get_balance' and not marker['recorded'] and not marker['ok']
+    assert marker['result'][0] == 'TypeError'
+    assert after['recorded'] and after['result'] == ohlcv
+
+    player = ReplayExchange(recorder.path)
+    with pytest.raises(ReplayExhausted):
+        player.get_balance()
+    assert player.get_ohlcv('BTC/USDT', limit=2) == ohlcv
@@ -0,0 +1,79 @@
+import pickle
+import time
+import zlib
+import numpy as np
+import pytest
+from fake_exchange import FakeExchange, generate_ohlcv
+from indicators import IndicatorSet
+from order_executor import TrackedOrder
+from state_snapshot import HEADER, MAGIC, SnapshotError, SnapshotManager, decode, encode
+from strategy import TradingStrategy
+from strategy_api import StrategyPlugin
+
+
+def test_indicators_round_trip_without_pickle():
+    ohlcv = generate_ohlcv(300)
+    live = IndicatorSet()
+    live.update_ohlcv(ohlcv[:250])
+    header, state = decode(encode({'indicators': {'BTC/USDT': live}, 'n': np.int64(3)}, sequence=7))
+    restored = state['indicators']['BTC/USDT']
+    assert header['sequence'] == 7 and state['n'] == 3
+    # 恢复后的流式状态与原对象继续增量计算，结果逐位一致
+    for end in range(251, 300):
+        live.update_ohlcv(ohlcv[:end])
+        restored.update_ohlcv(ohlcv[:end])
+    for name in live.values:
+        np.testing.assert_array_equal(live.series(name), restored.series(name))
+
+
+def test_pickle_payload_rejected():
+    payload = pickle.dumps({'balance': 1.0})
+    data = HEADER.pack(MAGIC, 1, 0, time.time(), zlib.crc32(payload)) + payload
+    with pytest.raises(SnapshotError):
+        decode(data)
+    data = HEADER.pack(MAGIC, 2, 0, time.time(), zlib.crc32(payload)) + payload
+    with pytest.raises(SnapshotError):
+        decode(data)
+
+
+def _pending(strategy, fake, cid, amount, price, quantity=None, plugin=False):
+    """快照时还未成交的订单：执行引擎和交易所各有一份"""
+    tracked = TrackedOrder('BTC/USDT', 'long', amount, price, cid, quantity)
+    strategy.executor.orders[cid] = tracked
+    if plugin:
+        strategy.dispatcher.broker.adopt(tracked, 0.0)
+    fake.orders[cid] = {'clientOrderId': cid, 'symbol': 'BTC/USDT', 'side': 'long', 'amount': amount,
+                        'price': price, 'filled': 0.0, 'status': 'open'}
+
+
+def test_warm_start_reconciles_strategy_and_plugin_orders(tmp_path):
+    fake = FakeExchange(generate_ohlcv(200), cursor=150)
+    price = float(fake.current_bar[4])
+    strategy = TradingStrategy(fake)
+    strategy.add_plugin(StrategyPlugin())
+    strategy.dispatcher.broker.positions['BTC/USDT'] = [0.2, price, 0.0, 0.0]
+    # 策略单的 amount 是 100 USDT，插件单的 amount 是 0.5 BTC
+    _pending(strategy, fake, 'strategy1', 100.0, price, quantity=100.0 / price)
+    _pending(strategy, fake, 'plugin1', 0.5, price, plugin=True)
+    _pending(strategy, fake, 'plugin2', 0.3, price, plugin=True)
+    SnapshotManager(strategy, str(tmp_path / 'state.snap')).save()
+    strategy.executor.shutdown()
+
+    # 停机期间：两笔全部成交，一笔部分成交
+    fake.orders['strategy1'].update(filled=100.0, status='closed')
+    fake.orders['plugin1'].update(filled=0.5, status='closed')
+    fake.orders['plugin2'].update(filled=0.1)
+
+    warm = TradingStrategy(fake)
+    warm.add_plugin(StrategyPlugin())
+    report = SnapshotManager(warm, str(tmp_path / 'state.snap')).warm_start()
+    try:
+        assert report['filled_orders'] == 3 and report['open_orders'] == 1
+        row = warm.risk._row('BTC/USDT')
+        assert warm.risk.qty[row] == pytest.approx(100.0 / price + 0.6)
+        broker = warm.dispatcher.broker
+        assert broker.position('BTC/USDT') == pytest.approx(0.2 + 0.6)
+        assert broker.owns('plugin2') and not broker.owns('plugin1')
+        assert broker.pending('BTC/USDT') == pytest.approx(0.2)
+    finally:
+        warm.executor.shutdown()
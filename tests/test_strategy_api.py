@@ -0,0 +1,56 @@
+import pytest
+from fake_exchange import FakeExchange, generate_ohlcv
+from strategy import TradingStrategy
+from strategy_api import TrendPlugin
+
+SYMBOL = 'BTC/USDT'
+
+
+def _live(latency=0.0):
+    fake = FakeExchange(generate_ohlcv(300), cursor=200, latency=latency)
+    strategy = TradingStrategy(fake)
+    plugin = TrendPlugin(hold_bars=1)
+    strategy.add_plugin(plugin)
+    dispatcher = strategy.dispatcher
+    dispatcher.on_ohlcv(SYMBOL, fake.ohlcv[:100].tolist())
+    return fake, strategy, dispatcher
+
+
+def _wait(strategy):
+    for tracked in list(strategy.executor.orders.values()):
+        tracked.future.result(timeout=5)
+
+
+def test_trend_plugin_waits_while_live_order_in_flight():
+    fake, strategy, dispatcher = _live(latency=0.2)
+    try:
+        dispatcher.on_bar(SYMBOL, fake.ohlcv[100])
+        broker = dispatcher.broker
+        assert broker.pending(SYMBOL) != 0 and broker.position(SYMBOL) == 0
+        # 订单在途时不再开新仓，也不会重复平仓
+        dispatcher.on_bar(SYMBOL, fake.ohlcv[101])
+        dispatcher.on_bar(SYMBOL, fake.ohlcv[102])
+        assert len(strategy.executor.orders) == 1
+        _wait(strategy)
+        assert broker.pending(SYMBOL) == 0 and broker.position(SYMBOL) != 0
+        assert not broker._filled and not broker._orders
+    finally:
+        strategy.executor.shutdown()
+
+
+def test_live_round_trip_updates_balance_and_analytics():
+    fake, strategy, dispatcher = _live()
+    broker = dispatcher.broker
+    try:
+        dispatcher.on_bar(SYMBOL, fake.ohlcv[100])
+        _wait(strategy)
+        size, entry = broker.positions[SYMBOL][:2]
+        dispatcher.on_bar(SYMBOL, fake.ohlcv[101])
+        _wait(strategy)
+        exit_price = float(fake.ohlcv[101][4])
+        pnl = abs(size) * (exit_price - entry) * (1.0 if size > 0 else -1.0)
+        assert broker.position(SYMBOL) == 0 and broker.realized == [pytest.approx(pnl)]
+        assert strategy.fund_manager.balance == pytest.approx(strategy.analytics.initial_balance + pnl)
+        assert strategy.analytics.report()['trades'] == 1
+    finally:
+        strategy.executor.shutdown()
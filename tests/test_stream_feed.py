@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+from stream_feed import ReplayServer, StreamFeed
+
+MINUTE = 60000
+
+
+def kline(t, close, closed):
+    return json.dumps({'stream': 'btcusdt@kline_1m', 'data': {'k': {
+        't': t, 'o': '100', 'h': '110', 'l': '90', 'c': str(close), 'v': '1', 'x': closed}}})
+
+
+def depth(first, last, prev, bids):
+    return json.dumps({'stream': 'btcusdt@depth@100ms', 'data': {
+        'E': last, 'U': first, 'u': last, 'pu': prev, 'b': bids, 'a': [['101', '1']]}})
+
+
+def run_feed(feed, until, timeout=10):
+    async def main():
+        task = asyncio.ensure_future(feed.run())
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not until() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+        feed.stop()
+        await asyncio.gather(task, return_exceptions=True)
+    return main
+
+
+def test_feed_against_replay_server_backfills_after_reconnect():
+    messages = [kline(0, 100, True), kline(MINUTE, 101, False),
+                depth(90, 105, 89, [['99', '6']]), depth(106, 110, 105, [['99', '7']])]
+    rest_bars = [[MINUTE, 100, 110, 90, 102, 1], [2 * MINUTE, 100, 110, 90, 103, 1],
+                 [3 * MINUTE, 100, 110, 90, 104, 1]]
+    snapshot = {'bids': [[99.0, 1.0]], 'asks': [[101.0, 1.0]], 'nonce': 100}
+    requests = []
+    updates = []
+
+    async def main():
+        server = ReplayServer(messages, close_after_replay=True)
+        url = await server.start()
+        feed = StreamFeed('binance', ['BTC/USDT'], channels=('kline', 'book'), url=url,
+                          on_update=updates.append, book_snapshot=lambda symbol: snapshot,
+                          backfill=lambda symbol, since: requests.append(since) or rest_bars)
+        await run_feed(feed, lambda: feed.backfilled >= 2)()
+        await server.stop()
+        return server, feed
+
+    server, feed = asyncio.run(main())
+    assert server.connections >= 2
+    assert json.loads(server.subscriptions[0])['params'] == ['btcusdt@kline_1m', 'btcusdt@depth@100ms']
+    # 重连后从最后一根K线开始补，补到的新K线按增量推送，第二次回放的旧K线被丢弃
+    assert requests[0] == MINUTE
+    assert [bar[0] for bar in feed.candles['BTC/USDT']] == [0, MINUTE, 2 * MINUTE, 3 * MINUTE]
+    assert feed.candles['BTC/USDT'][1][4] == 102
+    appended = [u['bar'][0] for u in updates if u['type'] == 'kline' and u['appended']]
+    assert appended == [0, MINUTE, 2 * MINUTE, 3 * MINUTE]
+    book = feed.books['BTC/USDT']
+    assert book.depth_at('bid', 99.0) == 7.0
+
+
+def test_book_resync_runs_off_the_event_loop():
+    snapshot = {'bids': [[99.0, 1.0]], 'asks': [[101.0, 1.0]], 'nonce': 100}
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_snapshot(symbol):
+        started.set()
+        release.wait(5)
+        return snapshot
+
+    updates = []
+    feed = StreamFeed('binance', ['BTC/USDT'], channels=('book',), url='ws://unused',
+                      on_update=updates.append, book_snapshot=slow_snapshot)
+
+    async def main():
+        feed.handle_message(depth(90, 105, 89, [['99', '6']]))
+        # 快照请求还没返回，事件循环照常处理后续消息，增量先缓存
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        feed.handle_message(depth(106, 110, 105, [['99', '7']]))
+        assert not feed.books['BTC/USDT'].synced and updates == []
+        release.set()
+        while not updates:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    book = feed.books['BTC/USDT']
+    assert book.synced and feed.resyncs == 1
+    assert book.depth_at('bid', 99.0) == 7.0 and book.seq == 110
@@ -0,0 +1,48 @@
+import pytest
+from fund_manager import FundManager
+from tick_simulator import TickSimulator, merge_events
+
+
+def _simulator():
+    simulator = TickSimulator(FundManager(10000), params={'latency_ms': 10})
+    simulator.run(merge_events(quotes=[(0, 99.0, 101.0, 2.0, 3.0)]))
+    return simulator
+
+
+def test_maker_order_waits_for_queue_then_fills_partially():
+    simulator = _simulator()
+    order = simulator.submit('buy', 1.0, 99.0)
+    simulator.run(merge_events(trades=[(20, 99.0, 1.5, -1), (25, 99.0, 5.0, 1)]))
+    # 到达时排在买一 2.0 之后，卖方主动成交 1.5 只消耗排队量；买方主动成交不影响挂单
+    assert order.status == 'open' and order.filled == 0 and order.queue_ahead == pytest.approx(0.5)
+
+    simulator.run(merge_events(trades=[(30, 99.0, 1.0, -1)]))
+    assert order.status == 'open' and order.filled == pytest.approx(0.5)
+    assert simulator.fills[-1]['maker'] and simulator.position() == pytest.approx(0.5)
+    assert order.fee == pytest.approx(0.5 * 99.0 * simulator.params['maker_fee'])
+
+    # 价格穿过挂单价时剩余部分全部成交
+    simulator.run(merge_events(trades=[(40, 98.5, 0.1, -1)]))
+    assert order.status == 'closed' and order.filled == pytest.approx(1.0)
+    assert simulator.resting == [] and simulator.position() == pytest.approx(1.0)
+
+
+def test_crossing_limit_takes_depth_and_rests_remainder():
+    simulator = _simulator()
+    order = simulator.submit('buy', 5.0, 101.0)
+    simulator.run(merge_events(trades=[(20, 100.5, 0.1, 1)]))
+    # 吃掉卖一的 3.0，剩余 2.0 成为新的买一，前面没有排队
+    assert order.filled == pytest.approx(3.0) and not simulator.fills[0]['maker']
+    assert order.status == 'open' and order.queue_ahead == 0.0
+    simulator.run(merge_events(trades=[(30, 101.0, 1.0, -1)]))
+    assert order.filled == pytest.approx(4.0) and simulator.fills[-1]['maker']
+
+
+def test_order_arrives_after_latency():
+    simulator = _simulator()
+    order = simulator.submit('buy', 1.0)
+    simulator.run(merge_events(quotes=[(5, 99.0, 102.0, 2.0, 3.0)]))
+    assert order.status == 'pending'
+    simulator.run(merge_events(quotes=[(15, 99.0, 103.0, 2.0, 3.0)]))
+    # 10ms 到达时按当时的卖一 102 加滑点成交
+    assert order.status == 'closed' and order.cost / order.filled > 102.0
@@ -0,0 +1,59 @@
+import time
+import pytest
+from trade_ledger import LedgerInUse, TradeLedger
+
+
+def entry(symbol, direction, timestamp=None):
+    return {'timestamp': timestamp or time.time(), 'symbol': symbol, 'direction': direction,
+            'size': 10.0, 'entry_price': 100.0, 'liquidation_price': 98.0}
+
+
+def test_memory_only_without_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ledger = TradeLedger()
+    ledger.append(entry('BTC/USDT', 'long'))
+    ledger.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_second_writer_is_rejected(tmp_path):
+    path = str(tmp_path / 'ledger.bin')
+    ledger = TradeLedger(path)
+    with pytest.raises(LedgerInUse):
+        TradeLedger(path)
+    ledger.close()
+    TradeLedger(path).close()
+
+
+def test_realized_pnl_feeds_queries_and_persists(tmp_path):
+    path = str(tmp_path / 'ledger.bin')
+    ledger = TradeLedger(path)
+    ledger.append(entry('BTC/USDT', 'long', 7200.0))
+    ledger.append(entry('ETH/USDT', 'short', 3600.0))
+    assert ledger.record_pnl('BTC/USDT', 2.5) == 0
+    assert ledger.record_pnl('ETH/USDT', -1.0, dict(entry('ETH/USDT', 'short'), size=5.0)) == 1
+    # 没有未平仓的开仓记录时追加一条带盈亏的记录
+    assert ledger.record_pnl('BTC/USDT', 0.5, entry('BTC/USDT', 'long', 7200.0)) == 2
+    ledger.close()
+
+    reloaded = TradeLedger(path)
+    assert reloaded.pnl_by_symbol() == {'BTC/USDT': 3.0, 'ETH/USDT': -1.0}
+    assert reloaded.pnl_by_direction() == {'long': 3.0, 'short': -1.0}
+    hours = reloaded.pnl_by_hour()
+    assert hours[2] == 3.0 and hours[1] == -1.0
+    reloaded.close()
+
+
+def test_strategy_closes_write_pnl():
+    from fake_exchange import generate_ohlcv
+    from strategy import TradingStrategy
+    from strategy_api import TrendPlugin
+    strategy = TradingStrategy()
+    strategy.add_plugin(TrendPlugin(hold_bars=5), paper=True)
+    data = generate_ohlcv(300)
+    for i in range(100, 300):
+        strategy.on_market_data('BTC/USDT', data[i - 100:i + 1].tolist())
+    total = strategy.trade_history.pnl_by_symbol()['BTC/USDT']
+    assert total != 0.0
+    assert total == pytest.approx(strategy.fund_manager.balance - 100.0)
+    assert sum(strategy.trade_history.pnl_by_direction().values()) == pytest.approx(total)
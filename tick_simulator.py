@@ -0,0 +1,397 @@
+import heapq
+import itertools
+import time
+import ccxt
+import numpy as np
+from fund_manager import FundManager
+from strategy_api import PaperBroker
+from config import TRADE_PARAMS
+
+# 逐笔事件：kind 为 TRADE 时 price/size/side 为成交价、成交量和主动方向（1 买 -1 卖），
+# kind 为 QUOTE 时 bid/ask/bid_size/ask_size 为最新的买一卖一。时间戳单位毫秒。
+TRADE = 0
+QUOTE = 1
+EVENT_DTYPE = np.dtype([
+    ('timestamp', '<i8'), ('kind', 'i1'), ('price', '<f8'), ('size', '<f8'), ('side', 'i1'),
+    ('bid', '<f8'), ('ask', '<f8'), ('bid_size', '<f8'), ('ask_size', '<f8')
+])
+
+SIM_PARAMS = {
+    'maker_fee': 0.0002,  # 挂单手续费率
+    'taker_fee': 0.0005,  # 吃单手续费率
+    'slippage_bps': 1.0,  # 市价单在对手价基础上的滑点（万分之）
+    'latency_ms': 50  # 下单到达交易所的延迟
+}
+
+
+def merge_events(trades=None, quotes=None):
+    """把成交和报价合并为按时间排序的事件数组
+
+    trades 为 (timestamp, price, size, side) 的序列，quotes 为
+    (timestamp, bid, ask, bid_size, ask_size) 的序列；同一时刻报价排在成交前面。
+    """
+    parts = []
+    if trades is not None and len(trades):
+        t = np.asarray(trades, dtype=np.float64).reshape(-1, 4)
+        events = np.zeros(len(t), dtype=EVENT_DTYPE)
+        events['timestamp'], events['kind'] = t[:, 0], TRADE
+        events['price'], events['size'], events['side'] = t[:, 1], t[:, 2], t[:, 3]
+        parts.append(events)
+    if quotes is not None and len(quotes):
+        q = np.asarray(quotes, dtype=np.float64).reshape(-1, 5)
+        events = np.zeros(len(q), dtype=EVENT_DTYPE)
+        events['timestamp'], events['kind'] = q[:, 0], QUOTE
+        events['bid'], events['ask'], events['bid_size'], events['ask_size'] = q[:, 1], q[:, 2], q[:, 3], q[:, 4]
+        parts.append(events)
+    if not parts:
+        return np.zeros(0, dtype=EVENT_DTYPE)
+    events = np.concatenate(parts)
+    return events[np.lexsort((-events['kind'], events['timestamp']))]
+
+
+def synthetic_events(count=1000000, start=1700000000000, price=30000.0, tick=0.1, seed=0):
+    """生成确定性的报价和成交交替的事件流，用于测试和基准"""
+    rng = np.random.default_rng(seed)
+    events = np.zeros(count, dtype=EVENT_DTYPE)
+    events['timestamp'] = start + np.cumsum(rng.integers(1, 20, count))
+    mid = np.round(price + np.cumsum(rng.choice([-tick, 0.0, 0.0, tick], count)), 1)
+    events['bid'], events['ask'] = mid - tick / 2, mid + tick / 2
+    events['bid_size'] = rng.uniform(0.5, 5, count)
+    events['ask_size'] = rng.uniform(0.5, 5, count)
+    is_trade = rng.random(count) < 0.4
+    events['kind'] = np.where(is_trade, TRADE, QUOTE)
+    side = np.where(rng.random(count) < 0.5, 1, -1)
+    events['side'] = side
+    events['price'] = np.where(side > 0, events['ask'], events['bid'])
+    events['size'] = rng.exponential(0.5, count)
+    return events
+
+
+class SimOrder:
+    __slots__ = ('id', 'client_order_id', 'symbol', 'side', 'price', 'amount', 'filled', 'cost',
+                 'queue_ahead', 'status', 'submitted', 'arrival', 'fee')
+
+    def __init__(self, order_id, client_order_id, symbol, side, price, amount, submitted, arrival):
+        self.id = order_id
+        self.client_order_id = client_order_id
+        self.symbol = symbol
+        self.side = side  # 1 买 -1 卖
+        self.price = price  # None 为市价单
+        self.amount = amount
+        self.filled = 0.0
+        self.cost = 0.0
+        self.queue_ahead = None  # 排在前面的挂单量，None 表示尚不在最优价
+        self.status = 'pending'
+        self.submitted = submitted
+        self.arrival = arrival
+        self.fee = 0.0
+
+    @property
+    def remaining(self):
+        return self.amount - self.filled
+
+    def to_dict(self):
+        return {'id': self.id, 'clientOrderId': self.client_order_id, 'symbol': self.symbol,
+                'side': 'buy' if self.side > 0 else 'sell', 'price': self.price,
+                'amount': self.amount, 'filled': self.filled,
+                'average': self.cost / self.filled if self.filled else None,
+                'status': 'open' if self.status == 'pending' else self.status,
+                'fee': {'cost': self.fee}, 'timestamp': self.submitted}
+
+
+class TickSimulator:
+    """逐笔撮合模拟器
+
+    下单经过 latency_ms 后到达交易所：穿价部分按对手盘挂单量吃单成交（吃单费率），
+    剩余部分挂在限价上并记录前方排队量。之后在该价位的成交先消耗排队量，
+    再成交本单（可部分成交，挂单费率）；价格穿过挂单价时全部成交。
+    市价单按对手价加滑点成交，超出对手盘挂单量的部分滑点按比例放大。
+    成交通过 PaperBroker 计入持仓，平仓盈亏回写 FundManager.update_balance。
+    """
+
+    def __init__(self, fund_manager=None, params=None, symbol='BTC/USDT', on_close=None, on_fill=None,
+                 bar_ms=None):
+        self.params = dict(SIM_PARAMS, **(params or {}))
+        self.fund_manager = fund_manager or FundManager(TRADE_PARAMS['initial_balance'])
+        self.broker = PaperBroker(self.fund_manager, on_close=on_close)
+        self.symbol = symbol
+        self.on_fill = on_fill
+        self.timestamp = 0
+        self.bid = self.ask = self.last = None
+        self.bid_size = self.ask_size = 0.0
+        self.orders = {}
+        self.resting = []
+        self.fills = []
+        self.events = 0
+        # bar_ms 不为空时把成交聚合成K线，供 SimulatedExchange.get_ohlcv 使用
+        self.bar_ms = bar_ms
+        self.candles = []
+        self._arrivals = []
+        self._ids = itertools.count(1)
+
+    # ---------- 下单接口 ----------
+
+    def submit(self, side, amount, price=None, client_order_id=None):
+        """side 为 'buy'/'long' 或 'sell'/'short'，price 为空时是市价单"""
+        order_id = str(next(self._ids))
+        order = SimOrder(order_id, client_order_id or order_id, self.symbol,
+                         1 if side in ('buy', 'long') else -1, price, amount,
+                         self.timestamp, self.timestamp + self.params['latency_ms'])
+        self.orders[order.client_order_id] = order
+        heapq.heappush(self._arrivals, (order.arrival, order_id, order))
+        return order
+
+    def cancel(self, client_order_id):
+        order = self.orders.get(client_order_id)
+        if order is not None and order.status in ('pending', 'open'):
+            order.status = 'canceled'
+            if order in self.resting:
+                self.resting.remove(order)
+        return order
+
+    def position(self, symbol=None):
+        return self.broker.position(symbol or self.symbol)
+
+    # ---------- 撮合 ----------
+
+    def _fill(self, order, amount, price, maker):
+        if amount <= 0:
+            return
+        fee = amount * price * self.params['maker_fee' if maker else 'taker_fee']
+        order.filled += amount
+        order.cost += amount * price
+        order.fee += fee
+        if order.remaining <= 1e-12:
+            order.status = 'closed'
+        fill = self.broker.submit(order.symbol, 'long' if order.side > 0 else 'short',
+                                  amount, price, self.timestamp / 1000, fee=fee)
+        fill.update(client_order_id=order.client_order_id, maker=maker)
+        self.fills.append(fill)
+        if self.on_fill is not None:
+            self.on_fill(fill)
+
+    def _arrive(self, order):
+        if order.status != 'pending':
+            return
+        if order.side > 0:
+            best, depth = self.ask, self.ask_size
+            crosses = best is not None and (order.price is None or order.price >= best)
+        else:
+            best, depth = self.bid, self.bid_size
+            crosses = best is not None and (order.price is None or order.price <= best)
+
+        if order.price is None:
+            if best is None:
+                order.status = 'rejected'
+                return
+            # 市价单：超过对手盘挂单量的部分按比例放大滑点
+            impact = 1 + max(order.amount / depth - 1, 0) if depth > 0 else 2
+            slip = self.params['slippage_bps'] * 1e-4 * impact
+            self._fill(order, order.remaining, best * (1 + order.side * slip), False)
+            return
+
+        if crosses:
+            self._fill(order, min(order.remaining, depth), best, False)
+            if order.status == 'closed':
+                return
+            order.queue_ahead = 0.0  # 剩余部分成为新的最优价
+        else:
+            same_best = self.bid if order.side > 0 else self.ask
+            if same_best is not None and order.price == same_best:
+                order.queue_ahead = self.bid_size if order.side > 0 else self.ask_size
+            elif same_best is not None and order.side * (order.price - same_best) > 0:
+                order.queue_ahead = 0.0  # 改善了最优价
+        order.status = 'open'
+        self.resting.append(order)
+
+    def _on_trade(self, price, size, side):
+        for order in list(self.resting):
+            # 只有对手方向的主动成交才会成交挂单
+            if side == order.side:
+                continue
+            through = (price < order.price) if order.side > 0 else (price > order.price)
+            if through:
+                self._fill(order, order.remaining, order.price, True)
+            elif price == order.price:
+                volume = size
+                if order.queue_ahead:
+                    consumed = min(order.queue_ahead, volume)
+                    order.queue_ahead -= consumed
+                    volume -= consumed
+                elif order.queue_ahead is None:
+                    continue
+                self._fill(order, min(volume, order.remaining), order.price, True)
+            if order.status != 'open':
+                self.resting.remove(order)
+
+    def _on_quote(self):
+        for order in list(self.resting):
+            if order.side > 0:
+                if self.ask <= order.price:
+                    self._fill(order, order.remaining, order.price, True)
+                elif order.price == self.bid:
+                    order.queue_ahead = self.bid_size if order.queue_ahead is None \
+                        else min(order.queue_ahead, self.bid_size)
+            else:
+                if self.bid >= order.price:
+                    self._fill(order, order.remaining, order.price, True)
+                elif order.price == self.ask:
+                    order.queue_ahead = self.ask_size if order.queue_ahead is None \
+                        else min(order.queue_ahead, self.ask_size)
+            if order.status != 'open':
+                self.resting.remove(order)
+
+    def run(self, events, on_interval=None, interval_ms=60000, hold_ms=None):
+        """回放事件；每隔 interval_ms 模拟时间调用一次 on_interval(simulator)
+
+        hold_ms 不为空时，持仓超过该时间后用市价单平仓。返回处理的事件数。
+        """
+        next_call = None
+        position_opened = None
+        arrivals = self._arrivals
+        bar_ms = self.bar_ms
+        candles = self.candles
+        for ts, kind, price, size, side, bid, ask, bid_size, ask_size in events.tolist():
+            while arrivals and arrivals[0][0] <= ts:
+                arrival, _, order = heapq.heappop(arrivals)
+                self.timestamp = arrival
+                self._arrive(order)
+            self.timestamp = ts
+            if kind == TRADE:
+                self.last = price
+                if bar_ms:
+                    bucket = ts // bar_ms * bar_ms
+                    if candles and candles[-1][0] == bucket:
+                        bar = candles[-1]
+                        if price > bar[2]:
+                            bar[2] = price
+                        elif price < bar[3]:
+                            bar[3] = price
+                        bar[4] = price
+                        bar[5] += size
+                    else:
+                        candles.append([bucket, price, price, price, price, size])
+                if self.resting:
+                    self._on_trade(price, size, side)
+            else:
+                self.bid, self.ask, self.bid_size, self.ask_size = bid, ask, bid_size, ask_size
+                if self.resting:
+                    self._on_quote()
+
+            if on_interval is not None and self.last is not None and self.bid is not None:
+                if next_call is None:
+                    next_call = ts
+                if ts >= next_call:
+                    next_call += interval_ms
+                    on_interval(self)
+            if hold_ms is not None:
+                size_now = self.broker.position(self.symbol)
+                if not size_now:
+                    position_opened = None
+                elif position_opened is None:
+                    position_opened = ts
+                elif ts - position_opened >= hold_ms and not arrivals:
+                    self.submit('sell' if size_now > 0 else 'buy', abs(size_now))
+                    position_opened = ts
+        self.events += len(events)
+        return len(events)
+
+
+class SimulatedExchange:
+    """把 TickSimulator 包装成 ExchangeInterface 的接口，让 TradingStrategy 离线运行
+
+    TradingStrategy 传入的下单数量是 FundManager 的仓位金额（计价货币），
+    quote_amounts 为True时按价格换算成基础货币数量。成交聚合成 bar_ms 周期的K线。
+    """
+
+    def __init__(self, simulator, exchange_name='sim', quote_amounts=True, bar_ms=60000):
+        self.sim = simulator
+        self.exchange_name = exchange_name
+        self.simulated = True
+        self.proxy = None
+        self.use_proxy = False
+        self.quote_amounts = quote_amounts
+        self.bar_ms = bar_ms
+        if simulator.bar_ms is None:
+            simulator.bar_ms = bar_ms
+
+    def set_proxy(self, proxy_settings):
+        self.proxy = proxy_settings
+
+    def get_ticker(self, symbol):
+        sim = self.sim
+        open_price = sim.candles[-1][1] if sim.candles else sim.last
+        return {'symbol': symbol, 'timestamp': sim.timestamp, 'last': sim.last, 'open': open_price,
+                'bid': sim.bid, 'ask': sim.ask}
+
+    def get_order_book(self, symbol):
+        sim = self.sim
+        return {'symbol': symbol, 'timestamp': sim.timestamp,
+                'bids': [[sim.bid, sim.bid_size]], 'asks': [[sim.ask, sim.ask_size]]}
+
+    def get_market_data(self, symbol):
+        return {'ticker': self.get_ticker(symbol), 'orderbook': self.get_order_book(symbol)}
+
+    def get_ohlcv(self, symbol, timeframe='1m', limit=100, since=None):
+        candles = self.sim.candles
+        if since is not None:
+            candles = [bar for bar in candles if bar[0] >= since]
+            return [list(bar) for bar in candles[:limit]]
+        return [list(bar) for bar in candles[-limit:]]
+
+    def get_balance(self):
+        return self.sim.fund_manager.balance
+
+    def create_order(self, symbol, side, amount, price, client_order_id=None):
+        if self.quote_amounts and price:
+            amount = amount / price
+        return self.sim.submit(side, amount, price, client_order_id).to_dict()
+
+    submit_order = create_order
+
+    def fetch_order_by_client_id(self, symbol, client_order_id):
+        order = self.sim.orders.get(client_order_id)
+        return order.to_dict() if order else None
+
+    def cancel_order_by_client_id(self, symbol, client_order_id):
+        order = self.sim.orders.get(client_order_id)
+        if order is None:
+            raise ccxt.OrderNotFound(client_order_id)
+        if order.status not in ('pending', 'open'):
+            raise ccxt.InvalidOrder(f'订单 {client_order_id} 已结束')
+        return self.sim.cancel(client_order_id).to_dict()
+
+
+def benchmark(count=2000000, seed=0):
+    """回放合成事件流，统计每分钟处理的事件数；带持续挂单和周期下单两种负载"""
+    events = synthetic_events(count, seed=seed)
+    idle = TickSimulator(FundManager(1e6))
+    start = time.perf_counter()
+    idle.run(events)
+    idle_elapsed = time.perf_counter() - start
+
+    sim = TickSimulator(FundManager(1e6))
+
+    def quote_both_sides(simulator):
+        # 简单做市：每秒在买一卖一各挂一张单
+        simulator.submit('buy', 0.1, simulator.bid)
+        simulator.submit('sell', 0.1, simulator.ask)
+
+    start = time.perf_counter()
+    sim.run(events, quote_both_sides, interval_ms=1000)
+    active_elapsed = time.perf_counter() - start
+    return {
+        'events': count,
+        'idle_events_per_min': count / idle_elapsed * 60,
+        'active_events_per_min': count / active_elapsed * 60,
+        'orders': len(sim.orders),
+        'fills': len(sim.fills),
+        'maker_fills': sum(1 for f in sim.fills if f['maker']),
+        'resting': len(sim.resting),
+        'balance': sim.fund_manager.balance
+    }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+import numpy as np
+from config import LEDGER_CONFIG
+
+# 每笔交易定长43字节，交易对和方向用整数编码
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('symbol', '<u2'),
+    ('direction', 'i1'),
+    ('size', '<f8'),
+    ('entry_price', '<f8'),
+    ('liquidation_price', '<f8'),
+    ('pnl', '<f8')
+])
+DIRECTION_CODES = {'long': 1, 'short': -1}
+DIRECTION_NAMES = {1: 'long', -1: 'short'}
+PNL_OFFSET = RECORD_DTYPE.fields['pnl'][1]
+
+
+class LedgerInUse(Exception):
+    """交易记录文件已被另一个进程打开；多个进程追加同一个文件会弄乱交易对编码"""
+
+
+def ledger_path(name):
+    """按交易所或进程名得到交易记录文件路径，每个写入方一个文件"""
+    path = LEDGER_CONFIG['path'].format(name=name.replace('/', '-'))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return path
+
+
+def _lock_exclusive(f):
+    """对锁文件加非阻塞的独占锁，进程退出时由系统释放"""
+    if os.name == 'nt':
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class TradeLedger:
+    """列式交易记录，替代字典列表
+
+    数据保存在预分配的结构化数组中，按需倍增容量。path 为空时只保存在内存中；
+    指定 path 时以追加方式写入磁盘，每 fsync_every 笔或每 fsync_interval 秒执行一次 fsync；
+    重启时自动加载，崩溃留下的半条记录会被截掉。同一个文件同时只能由一个进程打开，
+    否则抛出 LedgerInUse。
+    """
+
+    def __init__(self, path=None, capacity=1024, fsync_every=32, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.symbols = []
+        self.symbol_codes = {}
+        self._records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self.n = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._symbol_file = None
+        self._lock_file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        if path:
+            self._lock_file = open(path + '.lock', 'a+b')
+            try:
+                _lock_exclusive(self._lock_file)
+            except OSError:
+                self._lock_file.close()
+                raise LedgerInUse(f'{path} 已被其他进程使用')
+            self._load()
+            # 平仓时要回写开仓记录的盈亏，用读写方式打开，追加前移到文件末尾
+            self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+            self._file.seek(0, os.SEEK_END)
+            self._symbol_file = open(path + '.symbols', 'a', encoding='utf-8')
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        symbol_path = self.path + '.symbols'
+        if os.path.exists(symbol_path):
+            with open(symbol_path, encoding='utf-8') as f:
+                for line in f:
+                    # 最后一行可能没写完整，以换行结尾的才算有效
+                    if line.endswith('\n'):
+                        self._intern(line[:-1], persist=False)
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        valid = size - size % RECORD_DTYPE.itemsize
+        if valid != size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid)
+        records = np.fromfile(self.path, dtype=RECORD_DTYPE)
+        records = records[records['symbol'] < len(self.symbols)]
+        self._reserve(len(records))
+        self._records[:len(records)] = records
+        self.n = len(records)
+
+    def _intern(self, symbol, persist=True):
+        code = self.symbol_codes.get(symbol)
+        if code is None:
+            code = len(self.symbols)
+            self.symbols.append(symbol)
+            self.symbol_codes[symbol] = code
+            if persist and self._symbol_file:
+                # 交易对表先落盘，保证记录引用的编码一定存在
+                self._symbol_file.write(symbol + '\n')
+                self._symbol_file.flush()
+                os.fsync(self._symbol_file.fileno())
+        return code
+
+    def _reserve(self, n):
+        if n <= len(self._records):
+            return
+        records = np.zeros(max(n, len(self._records) * 2), dtype=RECORD_DTYPE)
+        records[:self.n] = self._records[:self.n]
+        self._records = records
+
+    def append(self, trade):
+        """追加一笔交易，trade 为 execute_strategy 记录的字典"""
+        with self._lock:
+            self._reserve(self.n + 1)
+            record = self._records[self.n:self.n + 1]
+            record['timestamp'] = trade['timestamp']
+            record['symbol'] = self._intern(trade['symbol'])
+            record['direction'] = DIRECTION_CODES[trade['direction']]
+            record['size'] = trade['size']
+            record['entry_price'] = trade['entry_price']
+            record['liquidation_price'] = trade.get('liquidation_price', np.nan)
+            record['pnl'] = trade.get('pnl', np.nan)
+            self.n += 1
+            if self._file:
+                self._file.write(record.tobytes())
+                self._file.flush()
+                self._unsynced += 1
+                if (self._unsynced >= self.fsync_every
+                        or time.monotonic() - self._last_sync >= self.fsync_interval):
+                    self._sync()
+
+    def record_pnl(self, symbol, pnl, trade=None):
+        """平仓盈亏写入该交易对、同方向最近一笔还没有盈亏的开仓记录，返回记录下标
+
+        找不到时（例如插件的模拟成交没有开仓记录，或者同一持仓分批平仓）按 trade 中的
+        方向、数量和价格追加一条带盈亏的记录，汇总查询的合计不受影响。
+        """
+        with self._lock:
+            code = self.symbol_codes.get(symbol)
+            if code is not None:
+                records = self._records[:self.n]
+                candidates = (records['symbol'] == code) & np.isnan(records['pnl'])
+                if trade is not None:
+                    candidates &= records['direction'] == DIRECTION_CODES[trade['direction']]
+                matches = np.flatnonzero(candidates)
+                if len(matches):
+                    index = int(matches[-1])
+                    self._records[index]['pnl'] = pnl
+                    if self._file:
+                        self._file.seek(index * RECORD_DTYPE.itemsize + PNL_OFFSET)
+                        self._file.write(np.float64(pnl).tobytes())
+                        self._file.seek(0, os.SEEK_END)
+                        self._file.flush()
+                    return index
+        if trade is None:
+            return None
+        self.append(dict(trade, symbol=symbol, pnl=pnl))
+        return self.n - 1
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._file and self._unsynced:
+                self._sync()
+
+    def close(self):
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._symbol_file.close()
+            self._file = self._symbol_file = None
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # ---------- 访问 ----------
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, index):
+        record = self.records[index]
+        return {
+            'timestamp': float(record['timestamp']),
+            'symbol': self.symbols[record['symbol']],
+            'direction': DIRECTION_NAMES[int(record['direction'])],
+            'size': float(record['size']),
+            'entry_price': float(record['entry_price']),
+            'liquidation_price': float(record['liquidation_price']),
+            'pnl': float(record['pnl'])
+        }
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    @property
+    def records(self):
+        """当前所有记录的只读视图"""
+        view = self._records[:self.n]
+        view.flags.writeable = False
+        return view
+
+    def memory_per_trade(self):
+        return RECORD_DTYPE.itemsize
+
+    # ---------- 向量化查询 ----------
+
+    def _pnl(self):
+        return np.nan_to_num(self.records['pnl'])
+
+    def pnl_by_symbol(self):
+        totals = np.bincount(self.records['symbol'], weights=self._pnl(), minlength=len(self.symbols))
+        return dict(zip(self.symbols, totals.tolist()))
+
+    def pnl_by_hour(self):
+        """按UTC小时（0-23）汇总盈亏"""
+        hours = (self.records['timestamp'] // 3600 % 24).astype(np.int64)
+        return np.bincount(hours, weights=self._pnl(), minlength=24)
+
+    def pnl_by_direction(self):
+        directions = self.records['direction']
+        pnl = self._pnl()
+        return {name: float(pnl[directions == code].sum()) for code, name in DIRECTION_NAMES.items()}
+
+    def count_by_symbol(self):
+        counts = np.bincount(self.records['symbol'], minlength=len(self.symbols))
+        return dict(zip(self.symbols, counts.tolist()))